@@ -0,0 +1,263 @@
+"""Benchmarks for the message ingest hot path.
+
+Every benchmark processes one kind of message from the recorded corpus and
+reports the time and the peak of traced memory allocations per message.
+Run from the repository root::
+
+    python -m benchmarks.bench_ingest
+    python -m benchmarks.bench_ingest --save benchmarks/baseline.json
+    python -m benchmarks.bench_ingest --compare benchmarks/baseline.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import platform
+import sys
+import timeit
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import orjson
+import paho.mqtt.client as mqtt
+
+from roombapy import Roomba, RoombaFactory
+from roombapy.roomba import _decode_payload, _pose_delta
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+CORPUS_PATH = Path(__file__).with_name("corpus.json")
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+KINDS = ("full_state", "pose", "mission")
+REPEAT = 5
+# allowed slowdown against the baseline before a benchmark is reported
+DEFAULT_THRESHOLD = 0.25
+
+
+@dataclass
+class Corpus:
+    """Recorded messages of one robot."""
+
+    topic: str
+    payloads: dict[str, list[bytes]]
+
+    @classmethod
+    def load(cls, path: Path = CORPUS_PATH) -> Corpus:
+        """Load the corpus and serialize the messages like the robot does."""
+        raw = orjson.loads(path.read_bytes())
+        return cls(
+            topic=raw["topic"],
+            payloads={
+                kind: [orjson.dumps(message) for message in raw[kind]]
+                for kind in KINDS
+            },
+        )
+
+    def decoded(self, kind: str) -> list[dict[str, Any]]:
+        """Return the decoded messages of a kind."""
+        return [orjson.loads(payload) for payload in self.payloads[kind]]
+
+    def mqtt_messages(self, kind: str) -> list[mqtt.MQTTMessage]:
+        """Return the messages of a kind as received from paho."""
+        messages = []
+        for payload in self.payloads[kind]:
+            message = mqtt.MQTTMessage(topic=self.topic.encode())
+            message.payload = payload
+            messages.append(message)
+        return messages
+
+
+@dataclass
+class Result:
+    """Result of a single benchmark."""
+
+    name: str
+    ns_per_message: float
+    peak_bytes_per_message: float
+
+
+def primed_roomba(corpus: Corpus) -> Roomba:
+    """Return a Roomba which already received every message once."""
+    roomba = RoombaFactory.create_roomba("127.0.0.1", "bench", "bench")
+    client = roomba.remote_client.mqtt_client
+    for kind in KINDS:
+        for message in corpus.mqtt_messages(kind):
+            roomba.on_message(client, None, message)
+    return roomba
+
+
+def measure(name: str, func: Callable[[], object], messages: int) -> Result:
+    """Time ``func`` and trace its peak allocations."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=REPEAT, number=number))
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return Result(
+        name=name,
+        ns_per_message=best / number / messages * 1e9,
+        peak_bytes_per_message=peak / messages,
+    )
+
+
+def run(corpus: Corpus) -> list[Result]:
+    """Run all benchmarks."""
+    results = []
+    for kind in KINDS:
+        payloads = corpus.payloads[kind]
+        decoded = corpus.decoded(kind)
+        mqtt_messages = corpus.mqtt_messages(kind)
+        roomba = primed_roomba(corpus)
+        client = roomba.remote_client.mqtt_client
+        state = copy.deepcopy(roomba.master_state)
+
+        def decode(payloads: list[bytes] = payloads) -> None:
+            for payload in payloads:
+                _decode_payload(payload)
+
+        def merge(
+            roomba: Roomba = roomba,
+            state: dict[str, Any] = state,
+            decoded: list[dict[str, Any]] = decoded,
+        ) -> None:
+            for message in decoded:
+                roomba.dict_merge(state, message)
+
+        def decode_topics(
+            roomba: Roomba = roomba, decoded: list[dict[str, Any]] = decoded
+        ) -> None:
+            for message in decoded:
+                roomba.decode_topics(message)
+
+        def on_message(
+            roomba: Roomba = roomba,
+            client: mqtt.Client = client,
+            messages: list[mqtt.MQTTMessage] = mqtt_messages,
+        ) -> None:
+            for message in messages:
+                roomba.on_message(client, None, message)
+
+        count = len(payloads)
+        results += [
+            measure(f"decode_payload[{kind}]", decode, count),
+            measure(f"dict_merge[{kind}]", merge, count),
+            measure(f"decode_topics[{kind}]", decode_topics, count),
+            measure(f"on_message[{kind}]", on_message, count),
+        ]
+
+    poses = corpus.payloads["pose"]
+
+    def decode_pose(payloads: list[bytes] = poses) -> None:
+        for payload in payloads:
+            if (message := _decode_payload(payload)) is not None:
+                _pose_delta(message)
+
+    results.append(measure("decode_pose[pose]", decode_pose, len(poses)))
+
+    roomba = primed_roomba(corpus)
+    results.append(measure("decode_topics[index]", roomba.decode_topics, 1))
+
+    phases = [
+        message["state"]["reported"]["cleanMissionStatus"]["phase"]
+        for message in corpus.decoded("mission")
+        if "cleanMissionStatus" in message["state"]["reported"]
+    ]
+
+    def update_state_machine(
+        roomba: Roomba = roomba, phases: list[str] = phases
+    ) -> None:
+        for phase in phases:
+            roomba.cleanMissionStatus_phase = phase
+            roomba.update_state_machine()
+
+    results.append(
+        measure("update_state_machine", update_state_machine, len(phases))
+    )
+    return results
+
+
+def save(results: list[Result], path: Path) -> None:
+    """Save results as a baseline."""
+    path.write_bytes(
+        orjson.dumps(
+            {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": [asdict(result) for result in results],
+            },
+            option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE,
+        )
+    )
+
+
+def compare(results: list[Result], path: Path, threshold: float) -> bool:
+    """Compare results with a baseline and report regressions."""
+    baseline = {
+        result["name"]: result
+        for result in orjson.loads(path.read_bytes())["results"]
+    }
+    ok = True
+    for result in results:
+        if (previous := baseline.get(result.name)) is None:
+            continue
+        ratio = result.ns_per_message / previous["ns_per_message"]
+        if ratio > 1 + threshold:
+            ok = False
+            sys.stdout.write(
+                f"REGRESSION {result.name}: {ratio:.2f}x slower than "
+                "baseline\n"
+            )
+    return ok
+
+
+def report(results: list[Result]) -> None:
+    """Write the results as a table."""
+    width = max(len(result.name) for result in results)
+    sys.stdout.write(
+        f"{'benchmark':<{width}} {'ns/msg':>12} {'peak B/msg':>12}\n"
+    )
+    for result in results:
+        sys.stdout.write(
+            f"{result.name:<{width}} {result.ns_per_message:>12.0f} "
+            f"{result.peak_bytes_per_message:>12.0f}\n"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--save", type=Path, help="save results as baseline")
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        nargs="?",
+        const=BASELINE_PATH,
+        help="compare results with a baseline",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="allowed slowdown against the baseline, 0.25 = 25%%",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(Corpus.load())
+    report(results)
+    if args.save is not None:
+        save(results, args.save)
+    if args.compare is not None:
+        return 0 if compare(results, args.compare, args.threshold) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
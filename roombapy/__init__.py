@@ -1,16 +1,20 @@
 """Import to public all required modules."""
 
+from .async_roomba import AsyncRoomba
 from .discovery import RoombaDiscovery
+from .fleet import RoombaFleet
 from .getpassword import RoombaPassword
 from .roomba import Roomba, RoombaConnectionError, RoombaMessage
 from .roomba_factory import RoombaFactory
 from .roomba_info import RoombaInfo
 
 __all__ = [
+    "AsyncRoomba",
     "Roomba",
     "RoombaConnectionError",
     "RoombaDiscovery",
     "RoombaFactory",
+    "RoombaFleet",
     "RoombaInfo",
     "RoombaMessage",
     "RoombaPassword",
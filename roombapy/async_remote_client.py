@@ -0,0 +1,173 @@
+"""Roomba remote client driven by an asyncio event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from typing import TYPE_CHECKING, Any
+
+import paho.mqtt.client as mqtt
+
+from roombapy.remote_client import (
+    MAX_CONNECTION_RETRIES,
+    RoombaRemoteClient,
+    UserData,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from roombapy.reconnect import ReconnectScheduler
+
+# paho needs loop_misc() to be called regularly to handle keepalives
+MISC_INTERVAL = 1
+
+
+class AsyncRoombaRemoteClient(RoombaRemoteClient):
+    """Roomba remote client running on an existing asyncio event loop.
+
+    Instead of starting a paho network thread per robot, the MQTT socket is
+    registered with the event loop, so any number of robots can share one
+    thread. Only the blocking TCP connect and TLS handshake run in the
+    default executor, everything else (including all callbacks) runs on the
+    event loop.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        blid: str,
+        password: str,
+        port: int = 8883,
+        scheduler: ReconnectScheduler | None = None,
+    ) -> None:
+        """Initialize the Roomba remote client."""
+        super().__init__(address, blid, password, port, scheduler)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._fd: int | None = None
+        self._misc_task: asyncio.Task[None] | None = None
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self.mqtt_client.on_socket_open = self._on_socket_open
+        self.mqtt_client.on_socket_close = self._on_socket_close
+        self.mqtt_client.on_socket_register_write = (
+            self._on_socket_register_write
+        )
+        self.mqtt_client.on_socket_unregister_write = (
+            self._on_socket_unregister_write
+        )
+
+    async def async_connect(self) -> bool:
+        """Connect to the Roomba."""
+        self._loop = asyncio.get_running_loop()
+        for attempt in range(1, MAX_CONNECTION_RETRIES + 1):
+            delay = self.scheduler.reserve(self.blid)
+            if delay is None:
+                self.log.debug("Reconnections of %s are paused", self.address)
+                return False
+            await asyncio.sleep(delay)
+            self.log.info(
+                "Connecting to %s, attempt %s of %s",
+                self.address,
+                attempt,
+                MAX_CONNECTION_RETRIES,
+            )
+            self.metrics.record_connect_attempt()
+            try:
+                await self._loop.run_in_executor(
+                    None, self._open_socket_connection
+                )
+            except OSError as error:
+                self.log.exception("Can't connect to %s", self.address)
+                self.metrics.record_connect_failure()
+                self.scheduler.record_failure(self.blid, str(error))
+            else:
+                self._record_handshake()
+                if self._misc_task is None or self._misc_task.done():
+                    self._misc_task = self._loop.create_task(self._misc())
+                return True
+
+        self.log.debug("Unable to connect to %s", self.address)
+        return False
+
+    async def async_disconnect(self) -> None:
+        """Disconnect from the Roomba."""
+        self.mqtt_client.disconnect()
+        await self.async_drain()
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+            self._misc_task = None
+
+    async def async_drain(self) -> None:
+        """Wait until all queued packets have been written to the socket."""
+        await self._drained.wait()
+
+    def _open_socket_connection(self) -> None:
+        # runs in the executor, socket callbacks are passed on to the loop
+        if not self.was_connected:
+            self.mqtt_client.connect(self.address, self.port)
+            self.was_connected = True
+        else:
+            self.mqtt_client.reconnect()
+
+    async def _misc(self) -> None:
+        while True:
+            if self.mqtt_client.loop_misc() == mqtt.MQTT_ERR_NO_CONN:
+                return
+            await asyncio.sleep(MISC_INTERVAL)
+
+    def _call_in_loop(self, callback: Callable[..., Any], *args: Any) -> None:
+        if self._loop is None:
+            return
+        with contextlib.suppress(RuntimeError):
+            if asyncio.get_running_loop() is self._loop:
+                callback(*args)
+                return
+        self._loop.call_soon_threadsafe(callback, *args)
+
+    def _on_socket_open(
+        self, _client: mqtt.Client, _userdata: UserData, sock: Any
+    ) -> None:
+        self._fd = sock.fileno()
+        self._call_in_loop(self._add_reader, self._fd)
+
+    def _on_socket_close(
+        self, _client: mqtt.Client, _userdata: UserData, _sock: Any
+    ) -> None:
+        if self._fd is not None:
+            self._call_in_loop(self._remove_reader, self._fd)
+            self._fd = None
+
+    def _on_socket_register_write(
+        self, _client: mqtt.Client, _userdata: UserData, _sock: Any
+    ) -> None:
+        if self._fd is not None:
+            self._call_in_loop(self._add_writer, self._fd)
+
+    def _on_socket_unregister_write(
+        self, _client: mqtt.Client, _userdata: UserData, _sock: Any
+    ) -> None:
+        if self._fd is not None:
+            self._call_in_loop(self._remove_writer, self._fd)
+        else:
+            self._call_in_loop(self._drained.set)
+
+    def _add_reader(self, fd: int) -> None:
+        if self._loop is not None:
+            self._loop.add_reader(fd, self.mqtt_client.loop_read)
+
+    def _remove_reader(self, fd: int) -> None:
+        if self._loop is not None:
+            self._loop.remove_reader(fd)
+            self._loop.remove_writer(fd)
+        self._drained.set()
+
+    def _add_writer(self, fd: int) -> None:
+        if self._loop is not None:
+            self._drained.clear()
+            self._loop.add_writer(fd, self.mqtt_client.loop_write)
+
+    def _remove_writer(self, fd: int) -> None:
+        if self._loop is not None:
+            self._loop.remove_writer(fd)
+        self._drained.set()
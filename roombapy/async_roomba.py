@@ -0,0 +1,121 @@
+"""Roomba client running on an asyncio event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any
+
+from roombapy.roomba import (
+    RobotPreference,
+    Roomba,
+    RoombaConnectionError,
+    RoombaMessage,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Callable
+
+    from roombapy.async_remote_client import AsyncRoombaRemoteClient
+    from roombapy.command_queue import CommandHandle
+    from roombapy.const import TransportErrorMessage
+
+
+class AsyncRoomba(Roomba):
+    """Roomba client for asyncio applications.
+
+    Messages are decoded and merged exactly like :class:`Roomba` does, but
+    the connection is handled by an :class:`AsyncRoombaRemoteClient` on the
+    running event loop instead of a paho network thread, and all callbacks
+    are called from the event loop.
+    """
+
+    remote_client: AsyncRoombaRemoteClient
+
+    def __init__(self, remote_client: AsyncRoombaRemoteClient) -> None:
+        """Roomba client initialization."""
+        super().__init__(remote_client)
+        self._message_queues: list[asyncio.Queue[RoombaMessage | None]] = []
+        self._messages_loop: asyncio.AbstractEventLoop | None = None
+        self.register_on_message_callback(self._queue_message)
+
+    async def async_connect(self) -> None:
+        """Connect to the Roomba."""
+        if self.roomba_connected:
+            return
+
+        if not await self.remote_client.async_connect():
+            msg = (
+                f"Unable to connect to Roomba at {self.remote_client.address}"
+            )
+            raise RoombaConnectionError(msg)
+        self.time = time.time()  # save connection time
+
+    async def async_disconnect(self) -> None:
+        """Disconnect from the Roomba."""
+        await self.remote_client.async_disconnect()
+
+    async def async_send_command(
+        self, command: str, params: dict[str, Any] | None = None
+    ) -> CommandHandle:
+        """Send a command and wait until it was written to the socket.
+
+        Commands waiting for a connection or the rate limit aren't waited
+        for, await the returned handle for them.
+        """
+        handle = self.send_command(command, params)
+        await self.remote_client.async_drain()
+        return handle
+
+    async def async_set_preference(
+        self, preference: str, setting: RobotPreference
+    ) -> CommandHandle:
+        """Set a preference and wait until it was written to the socket."""
+        handle = self.set_preference(preference, setting)
+        await self.remote_client.async_drain()
+        return handle
+
+    async def messages(self) -> AsyncIterator[RoombaMessage]:
+        """Iterate over the decoded messages until the connection is closed.
+
+        Every iterator gets all messages received while it is running.
+        """
+        queue: asyncio.Queue[RoombaMessage | None] = asyncio.Queue()
+        self._messages_loop = asyncio.get_running_loop()
+        self._message_queues.append(queue)
+        try:
+            while (message := await queue.get()) is not None:
+                yield message
+        finally:
+            self._message_queues.remove(queue)
+
+    def on_disconnect(self, error: TransportErrorMessage) -> None:
+        """On disconnect callback."""
+        super().on_disconnect(error)
+        for queue in self._message_queues:
+            queue.put_nowait(None)
+
+    def _call_later(self, delay: float, callback: Callable[[], None]) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            super()._call_later(delay, callback)
+        else:
+            loop.call_later(delay, callback)
+
+    def _queue_message(self, message: RoombaMessage) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if (
+            self._messages_loop is not None
+            and running is not self._messages_loop
+        ):
+            # called by a dispatcher from another thread
+            self._messages_loop.call_soon_threadsafe(
+                self._queue_message, message
+            )
+            return
+        for queue in self._message_queues:
+            queue.put_nowait(message)
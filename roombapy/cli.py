@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import sys
 import time
 from collections import deque
@@ -20,6 +22,7 @@ from roombapy import (
     RoombaMessage,
     RoombaPassword,
 )
+from roombapy.getpassword import get_passwords
 
 try:
     import click
@@ -87,11 +90,9 @@ def discover(ip: str | None, *, raw: bool) -> None:
     else:
         discovered = list(roomba_discovery.get_all())
 
+    passwords = get_passwords([bot.ip for bot in discovered])
     for bot in discovered:
-        if password := RoombaPassword(bot.ip).get_password():
-            bot.password = password
-        else:
-            bot.password = PLACEHOLDER
+        bot.password = passwords[bot.ip].password or PLACEHOLDER
 
     if discovered:
         click.echo("Discovered robots:")
@@ -197,5 +198,84 @@ def connect(
         sys.exit(0)
 
 
+@cli.command()
+@click.option(
+    "-n",
+    "--count",
+    type=int,
+    default=1,
+    help="Number of simulated robots",
+)
+@click.option(
+    "-a",
+    "--address",
+    type=str,
+    default="127.0.1.1",
+    help="Address of the first robot, the others use the following ones",
+)
+@click.option(
+    "--port",
+    type=int,
+    default=8883,
+    help="MQTT port of the robots",
+)
+@click.option(
+    "--password",
+    type=str,
+    default="password",
+    help="Password of the robots",
+)
+@click.option(
+    "--certfile",
+    type=click.Path(exists=True, dir_okay=False),
+    required=True,
+    help="TLS certificate of the robots",
+)
+@click.option(
+    "--keyfile",
+    type=click.Path(exists=True, dir_okay=False),
+    required=True,
+    help="TLS key of the robots",
+)
+@click.option(
+    "--pose-rate",
+    type=float,
+    default=2.0,
+    help="Pose updates per second while cleaning",
+)
+def simulate(  # noqa: PLR0913
+    *,
+    count: int,
+    address: str,
+    port: int,
+    password: str,
+    certfile: str,
+    keyfile: str,
+    pose_rate: float,
+) -> None:
+    """Simulate Roomba devices for testing without real robots."""
+    # the simulator is only needed by this command
+    from roombapy.simulator import RoombaSimulator  # noqa: PLC0415
+
+    simulator = RoombaSimulator.fleet(
+        count,
+        first_address=address,
+        port=port,
+        password=password,
+        certfile=certfile,
+        keyfile=keyfile,
+    )
+    for robot in simulator.robots:
+        robot.pose_rate = pose_rate
+        click.echo(f"{robot.ip}:{robot.port} {robot.blid} {robot.password}")
+
+    async def run() -> None:
+        async with simulator:
+            await asyncio.Event().wait()
+
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(run())
+
+
 if __name__ == "__main__":
     cli()
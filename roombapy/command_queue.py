@@ -0,0 +1,456 @@
+"""Outgoing command queue of a robot.
+
+Commands and preferences are buffered while the robot is offline and sent
+when it reconnects. Consecutive preference updates are merged into a
+single ``delta`` document, and documents are published no faster than a
+configurable rate, so bursts don't overwhelm the firmware of the robot.
+
+Every command and preference gets a :class:`CommandHandle`, which
+completes when it was published and when the robot reported it. Handles
+which the robot doesn't report fail after a timeout, even if no further
+message arrives from the robot.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Mapping
+from concurrent.futures import Future, InvalidStateError
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+import orjson
+import paho.mqtt.client as mqtt
+
+from roombapy.timer import shared_timer
+
+if TYPE_CHECKING:
+    from paho.mqtt.client import MQTTMessageInfo
+
+# documents published per second
+MAX_RATE = 2.0
+# documents buffered while offline, the oldest ones are dropped first
+MAX_SIZE = 100
+# seconds after publishing a robot has to report a command
+CONFIRM_TIMEOUT = 60.0
+
+# publishes a document, or its payload when it was serialized before
+PublishCallback = Callable[[str, dict[str, Any] | bytes], "MQTTMessageInfo"]
+# calls a function after a delay in seconds
+CallLater = Callable[[float, Callable[[], None]], None]
+
+
+class CommandError(Exception):
+    """Command couldn't be sent to the robot."""
+
+
+class CommandHandle:
+    """Outcome of a command or preference sent to a robot.
+
+    ``published`` completes when the document was written to the robot,
+    ``confirmed`` when the reported state of the robot reflects it, or
+    fails after ``timeout`` seconds. Without a ``confirm`` function the
+    handle is confirmed once it is published.
+    """
+
+    def __init__(
+        self,
+        confirm: Callable[[], bool] | None = None,
+        *,
+        timeout: float = CONFIRM_TIMEOUT,
+    ) -> None:
+        """Initialize a pending handle."""
+        self.published: Future[None] = Future()
+        self.confirmed: Future[None] = Future()
+        self.timeout = timeout
+        self.deadline: float | None = None
+        self._confirm = confirm
+
+    def wait_published(self, timeout: float | None = None) -> None:
+        """Block until the document was published."""
+        self.published.result(timeout)
+
+    def wait_confirmed(self, timeout: float | None = None) -> None:
+        """Block until the robot reported the change."""
+        self.confirmed.result(timeout)
+
+    async def async_wait_published(self) -> None:
+        """Wait until the document was published."""
+        await _wait(self.published)
+
+    async def async_wait_confirmed(self) -> None:
+        """Wait until the robot reported the change."""
+        await _wait(self.confirmed)
+
+    def set_published(self, now: float) -> None:
+        """Complete ``published`` and start waiting for the robot."""
+        self.deadline = now + self.timeout
+        _complete(self.published)
+        if self._confirm is None:
+            _complete(self.confirmed)
+
+    def fail(self, error: BaseException) -> None:
+        """Fail whatever didn't complete yet."""
+        _complete(self.published, error)
+        _complete(self.confirmed, error)
+
+    def check(self, now: float) -> bool:
+        """Check the reported state, return whether the handle is done."""
+        if self.confirmed.done():
+            return True
+        if self.deadline is None or self._confirm is None:
+            return False
+        if self._confirm():
+            _complete(self.confirmed)
+            return True
+        if now >= self.deadline:
+            _complete(
+                self.confirmed,
+                TimeoutError("The robot didn't report the change"),
+            )
+            return True
+        return False
+
+
+@dataclass
+class QueuedDocument:
+    """Document waiting to be published to a topic."""
+
+    topic: str
+    document: dict[str, Any]
+    handles: list[CommandHandle] = field(default_factory=list)
+    # the serialized document, if it was serialized before
+    payload: bytes | None = None
+
+
+@dataclass(frozen=True)
+class PreparedCommand:
+    """Command serialized once, to be sent to any number of robots."""
+
+    command: str
+    time: int
+    document: dict[str, Any]
+    payload: bytes
+
+    def with_params(self, params: Mapping[str, Any]) -> PreparedCommand:
+        """Return the command with more parameters.
+
+        Only the new parameters are serialized, they are appended to the
+        payload of the command.
+        """
+        if not params:
+            return self
+        if overlap := self.document.keys() & params.keys():
+            msg = f"Parameters already set: {sorted(map(str, overlap))}"
+            raise ValueError(msg)
+        extra = orjson.dumps(params, option=orjson.OPT_NON_STR_KEYS)
+        return PreparedCommand(
+            self.command,
+            self.time,
+            {**self.document, **params},
+            self.payload[:-1] + b"," + extra[1:],
+        )
+
+
+def prepare_command(
+    command: str,
+    params: Mapping[str, Any] | None = None,
+    *,
+    sent: int | None = None,
+) -> PreparedCommand:
+    """Build and serialize a command document.
+
+    ``sent`` is the time of the command, by default now.
+    """
+    if sent is None:
+        sent = int(time.time())
+    document = {"command": command, "time": sent, "initiator": "localApp"}
+    document.update(params or {})
+    # params may contain non-string keys, so we need to use the orjson
+    # OPT_NON_STR_KEYS option
+    return PreparedCommand(
+        command,
+        sent,
+        document,
+        orjson.dumps(document, option=orjson.OPT_NON_STR_KEYS),
+    )
+
+
+def call_later_shared(delay: float, callback: Callable[[], None]) -> None:
+    """Call a function from the shared timer after a delay."""
+    shared_timer().call_later(delay, callback)
+
+
+class CommandQueue:
+    """Buffer, merge and rate limit the documents sent to a robot.
+
+    The queue starts offline; :meth:`resume` sends the buffered documents
+    and :meth:`pause` buffers new ones until the next :meth:`resume`.
+    """
+
+    def __init__(
+        self,
+        publish: PublishCallback,
+        *,
+        max_rate: float = MAX_RATE,
+        max_size: int = MAX_SIZE,
+        clock: Callable[[], float] = time.monotonic,
+        call_later: CallLater = call_later_shared,
+    ) -> None:
+        """Initialize the queue."""
+        self.log = logging.getLogger(__name__)
+        self.publish = publish
+        self.max_rate = max_rate
+        self.max_size = max_size
+        self.clock = clock
+        self.call_later = call_later
+        self.online = False
+        self.pending: deque[QueuedDocument] = deque()
+        self._next_publish = 0.0
+        self._flush_scheduled = False
+        self._flushing = False
+        # handles of published documents by message ID
+        self._in_flight: dict[int, list[CommandHandle]] = {}
+        # message IDs reported published before they were tracked
+        self._early: dict[int, None] = {}
+        # published handles waiting for the robot to report their change
+        self.confirming: list[CommandHandle] = []
+        # when the next timeout check is scheduled
+        self._expiry_at: float | None = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of waiting documents."""
+        return len(self.pending)
+
+    def put_command(
+        self,
+        command: dict[str, Any] | PreparedCommand,
+        handle: CommandHandle | None = None,
+    ) -> CommandHandle:
+        """Queue a command document, or a command serialized before."""
+        handle = handle or CommandHandle()
+        if isinstance(command, PreparedCommand):
+            queued = QueuedDocument(
+                "cmd", command.document, [handle], command.payload
+            )
+        else:
+            queued = QueuedDocument("cmd", command, [handle])
+        with self._lock:
+            self._append(queued)
+        self.flush()
+        return handle
+
+    def put_preference(
+        self,
+        preference: str,
+        setting: Any,
+        handle: CommandHandle | None = None,
+    ) -> CommandHandle:
+        """Queue a preference, merged with preferences still waiting.
+
+        Only preferences at the end of the queue are merged, so commands
+        and preferences keep their order. Nested settings aren't merged
+        with each other, since the robot applies every delta on its own.
+        """
+        handle = handle or CommandHandle()
+        with self._lock:
+            if not self._merged(preference, setting, handle):
+                self._append(
+                    QueuedDocument(
+                        "delta", {"state": {preference: setting}}, [handle]
+                    )
+                )
+        self.flush()
+        return handle
+
+    def resume(self) -> None:
+        """Start sending, beginning with the buffered documents."""
+        with self._lock:
+            self.online = True
+        self.flush()
+
+    def pause(self) -> None:
+        """Buffer documents until the queue is resumed."""
+        with self._lock:
+            self.online = False
+
+    def clear(self) -> None:
+        """Drop all waiting documents."""
+        with self._lock:
+            dropped = list(self.pending)
+            self.pending.clear()
+        for queued in dropped:
+            for handle in queued.handles:
+                handle.fail(CommandError("The command was cleared"))
+
+    def on_publish(self, mid: int) -> None:
+        """Complete the handles of a published message."""
+        with self._lock:
+            handles = self._in_flight.pop(mid, None)
+            if handles is None:
+                # paho may report a message before publish() returned
+                self._early[mid] = None
+                if len(self._early) > self.max_size:
+                    del self._early[next(iter(self._early))]
+                return
+        self._published(handles)
+
+    def check_confirmations(self) -> None:
+        """Complete the published handles the robot reported or timed out.
+
+        The handles are checked outside of the lock of the queue, since
+        their confirm functions read the state of the robot.
+        """
+        now = self.clock()
+        with self._lock:
+            confirming = self.confirming
+            self.confirming = []
+        waiting = [handle for handle in confirming if not handle.check(now)]
+        with self._lock:
+            self.confirming.extend(waiting)
+            self._schedule_expiry(now)
+
+    def flush(self) -> None:
+        """Publish the documents the rate limit allows right now.
+
+        A flush is scheduled for the documents which have to wait.
+        Documents are published outside of the lock of the queue, by one
+        thread at a time.
+        """
+        with self._lock:
+            if self._flushing:
+                # the flushing thread picks up the new documents
+                return
+            self._flushing = True
+        try:
+            while (queued := self._next()) is not None:
+                self._track(
+                    self.publish(
+                        queued.topic,
+                        queued.document
+                        if queued.payload is None
+                        else queued.payload,
+                    ),
+                    queued.handles,
+                )
+        except BaseException:
+            # _next() ends the flush when the queue is done, a finally
+            # clause could end a flush another thread started since
+            with self._lock:
+                self._flushing = False
+            raise
+
+    def _next(self) -> QueuedDocument | None:
+        with self._lock:
+            if self.online and self.pending:
+                now = self.clock()
+                if now >= self._next_publish:
+                    self._next_publish = now + 1 / self.max_rate
+                    return self.pending.popleft()
+                self._schedule_flush(self._next_publish - now)
+            self._flushing = False
+            return None
+
+    def _track(
+        self, info: MQTTMessageInfo, handles: list[CommandHandle]
+    ) -> None:
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            error = CommandError(mqtt.error_string(info.rc))
+            for handle in handles:
+                handle.fail(error)
+            return
+        with self._lock:
+            if self._early.pop(info.mid, False) is False:
+                self._in_flight[info.mid] = handles
+                return
+        self._published(handles)
+
+    def _published(self, handles: list[CommandHandle]) -> None:
+        now = self.clock()
+        for handle in handles:
+            handle.set_published(now)
+        with self._lock:
+            self.confirming.extend(
+                handle for handle in handles if not handle.confirmed.done()
+            )
+            self._schedule_expiry(now)
+
+    def _merged(
+        self, preference: str, setting: Any, handle: CommandHandle
+    ) -> bool:
+        if not self.pending or self.pending[-1].topic != "delta":
+            return False
+        state = self.pending[-1].document["state"]
+        if preference in state and (
+            isinstance(setting, Mapping)
+            or isinstance(state[preference], Mapping)
+        ):
+            return False
+        state[preference] = setting
+        self.pending[-1].handles.append(handle)
+        return True
+
+    def _append(self, queued: QueuedDocument) -> None:
+        if len(self.pending) >= self.max_size:
+            dropped = self.pending.popleft()
+            self.log.warning(
+                "Dropping %s document %s, too many are waiting",
+                dropped.topic,
+                dropped.document,
+            )
+            for handle in dropped.handles:
+                handle.fail(CommandError("Too many commands are waiting"))
+        self.pending.append(queued)
+
+    def _schedule_flush(self, delay: float) -> None:
+        if self._flush_scheduled:
+            return
+        self._flush_scheduled = True
+        self.call_later(delay, self._scheduled_flush)
+
+    def _schedule_expiry(self, now: float) -> None:
+        """Check the handles again when the first one times out."""
+        deadlines = [
+            handle.deadline
+            for handle in self.confirming
+            if handle.deadline is not None
+        ]
+        if not deadlines:
+            return
+        expiry = min(deadlines)
+        if self._expiry_at is not None and self._expiry_at <= expiry:
+            return
+        self._expiry_at = expiry
+        self.call_later(max(expiry - now, 0), self._scheduled_expiry)
+
+    def _scheduled_expiry(self) -> None:
+        with self._lock:
+            self._expiry_at = None
+        self.check_confirmations()
+
+    def _scheduled_flush(self) -> None:
+        with self._lock:
+            self._flush_scheduled = False
+        self.flush()
+
+
+def _complete(
+    future: Future[None], error: BaseException | None = None
+) -> None:
+    try:
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+    except InvalidStateError:
+        pass  # completed before
+
+
+async def _wait(future: Future[None]) -> None:
+    # shielded, cancelling a waiter doesn't cancel the future for others
+    await asyncio.shield(asyncio.wrap_future(future))
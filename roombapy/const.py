@@ -156,3 +156,19 @@ ROOMBA_STATES: dict[str, State] = {
     "refill": "Refilling",
     "": None,
 }
+
+# phases which confirm that the robot followed a command
+COMMAND_PHASES: dict[str, frozenset[str]] = {
+    "start": frozenset({"run"}),
+    "clean": frozenset({"run"}),
+    "resume": frozenset({"run"}),
+    "pause": frozenset({"stop"}),
+    "stop": frozenset({"stop"}),
+    "dock": frozenset({"hmUsrDock", "charge"}),
+    "evac": frozenset({"evac"}),
+}
+
+# phases of a mission, periodic robots are polled more often in them
+MISSION_PHASES = frozenset(
+    {"run", "hmMidMsn", "hmPostMsn", "hmUsrDock", "stuck", "evac"}
+)
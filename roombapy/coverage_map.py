@@ -0,0 +1,297 @@
+"""Coverage maps of cleaning missions.
+
+Poses are rasterized in batches with NumPy: the path between consecutive
+poses is interpolated and stamped with the footprint of the robot into a
+grid counting how often every cell was passed. The grid grows as the robot
+moves, so no map size has to be known in advance.
+"""
+
+from __future__ import annotations
+
+import struct
+import threading
+import zlib
+from typing import TYPE_CHECKING, BinaryIO
+
+try:
+    import numpy as np
+except ImportError as err:
+    msg = "Coverage maps require 'numpy', install it to use them"
+    raise ImportError(msg) from err
+
+from roombapy.const import ROOMBA_STATES
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from pathlib import Path
+
+    from numpy.typing import ArrayLike, NDArray
+
+    from roombapy.const import State
+    from roombapy.mission_recorder import MissionLog
+    from roombapy.roomba import Roomba
+    from roombapy.state import StateChange
+
+# pose units per grid cell
+RESOLUTION = 5.0
+# radius of the robot footprint in pose units
+BRUSH_RADIUS = 17.0
+# poses buffered before they are rasterized
+BATCH_SIZE = 64
+# the grid grows in steps of this many cells
+GROW_STEP = 64
+# numpy view of the records of mission files, see mission_recorder.RECORD
+RECORD_DTYPE = np.dtype(
+    [
+        ("time", "<f8"),
+        ("x", "<i4"),
+        ("y", "<i4"),
+        ("theta", "<i2"),
+        ("battery", "u1"),
+        ("phase", "u1"),
+    ]
+)
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class CoverageMap:
+    """Grid of how long the robot covered every cell.
+
+    The path is stepped cell by cell, and every step into another cell
+    adds one to the cells under the footprint of the robot, no matter how
+    the poses were batched. Rows of the grid are the y axis and
+    columns the x axis of the poses, ``origin`` is the cell (x, y) of the
+    first row and column.
+    """
+
+    def __init__(
+        self,
+        *,
+        resolution: float = RESOLUTION,
+        brush_radius: float = BRUSH_RADIUS,
+        batch_size: int = BATCH_SIZE,
+    ) -> None:
+        """Initialize an empty map."""
+        self.resolution = resolution
+        self.batch_size = batch_size
+        self.grid: NDArray[np.uint32] = np.zeros((0, 0), dtype=np.uint32)
+        self.origin = (0, 0)  # cell (x, y) of grid[0, 0]
+        self._brush = _brush(brush_radius / resolution)
+        self._pending_x: list[float] = []
+        self._pending_y: list[float] = []
+        self._last: tuple[float, float] | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_mission(
+        cls,
+        log: MissionLog,
+        *,
+        resolution: float = RESOLUTION,
+        brush_radius: float = BRUSH_RADIUS,
+    ) -> CoverageMap:
+        """Rasterize all poses of a recorded mission at once."""
+        records = np.frombuffer(log.raw_records(), dtype=RECORD_DTYPE)
+        coverage_map = cls(resolution=resolution, brush_radius=brush_radius)
+        coverage_map.add_poses(records["x"], records["y"])
+        return coverage_map
+
+    def attach(self, roomba: Roomba) -> None:
+        """Follow the poses of a Roomba, starting over on new missions."""
+
+        def on_state(_previous: State, state: State) -> None:
+            if state == ROOMBA_STATES["new"]:
+                self.clear()
+
+        def on_pose(_changes: list[StateChange]) -> None:
+            pose = roomba.state.pose
+            if pose.x is not None and pose.y is not None:
+                self.add_pose(pose.x, pose.y)
+
+        roomba.register_on_state_callback(on_state)
+        roomba.register_on_change_callback("pose_point_*", on_pose)
+
+    def add_pose(self, x: float, y: float) -> None:
+        """Add a single pose, rasterized with the next batch."""
+        with self._lock:
+            self._pending_x.append(x)
+            self._pending_y.append(y)
+            if len(self._pending_x) >= self.batch_size:
+                self._flush()
+
+    def add_poses(self, xs: ArrayLike, ys: ArrayLike) -> None:
+        """Rasterize a batch of poses, continuing the path of the map."""
+        with self._lock:
+            self._flush()
+            self._rasterize(
+                np.asarray(xs, dtype=np.float64),
+                np.asarray(ys, dtype=np.float64),
+            )
+
+    def clear(self) -> None:
+        """Remove all poses."""
+        with self._lock:
+            self.grid = np.zeros((0, 0), dtype=np.uint32)
+            self.origin = (0, 0)
+            self._pending_x.clear()
+            self._pending_y.clear()
+            self._last = None
+
+    @property
+    def covered_area(self) -> float:
+        """Return the covered area in square pose units."""
+        with self._lock:
+            self._flush()
+            return float(np.count_nonzero(self.grid)) * self.resolution**2
+
+    def to_array(self) -> NDArray[np.uint32]:
+        """Return a copy of the grid."""
+        with self._lock:
+            self._flush()
+            return self.grid.copy()
+
+    def to_image(self) -> NDArray[np.uint8]:
+        """Return a grayscale image, brighter cells were covered longer.
+
+        Uncovered cells are black. The image is flipped, so that y grows
+        upwards like in the poses.
+        """
+        grid = self.to_array()
+        image = np.zeros(grid.shape, dtype=np.uint8)
+        if grid.size and (longest := int(grid.max())):
+            covered = grid > 0
+            image[covered] = 64 + grid[covered] * 191 // longest
+        return np.flipud(image)
+
+    def save_png(self, target: Path | BinaryIO) -> None:
+        """Save the map as a grayscale PNG image."""
+        data = _png(self.to_image())
+        if hasattr(target, "write"):
+            target.write(data)
+        else:
+            target.write_bytes(data)
+
+    def _flush(self) -> None:
+        if not self._pending_x:
+            return
+        xs = np.array(self._pending_x, dtype=np.float64)
+        ys = np.array(self._pending_y, dtype=np.float64)
+        self._pending_x.clear()
+        self._pending_y.clear()
+        self._rasterize(xs, ys)
+
+    def _rasterize(
+        self, xs: NDArray[np.float64], ys: NDArray[np.float64]
+    ) -> None:
+        if not xs.size:
+            return
+        continued = self._last is not None
+        if self._last is not None:
+            xs = np.concatenate(([self._last[0]], xs))
+            ys = np.concatenate(([self._last[1]], ys))
+        self._last = (float(xs[-1]), float(ys[-1]))
+
+        px, py = _interpolate(xs, ys, self.resolution)
+        cells = np.stack(
+            (
+                np.floor(px / self.resolution).astype(np.int64),
+                np.floor(py / self.resolution).astype(np.int64),
+            ),
+            axis=1,
+        )
+        # count a cell once per visit, the cell of the last pose was
+        # counted by the batch before
+        entered = np.empty(len(cells), dtype=bool)
+        entered[0] = not continued
+        entered[1:] = (cells[1:] != cells[:-1]).any(axis=1)
+        cells = cells[entered]
+        if not cells.size:
+            return
+        # stamp the footprint of the robot on every point of the path
+        stamped = (cells[:, None, :] + self._brush[None, :, :]).reshape(-1, 2)
+        self._grow(stamped.min(axis=0), stamped.max(axis=0))
+        np.add.at(
+            self.grid,
+            (stamped[:, 1] - self.origin[1], stamped[:, 0] - self.origin[0]),
+            1,
+        )
+
+    def _grow(self, low: Sequence[int], high: Sequence[int]) -> None:
+        rows, columns = self.grid.shape
+        if not self.grid.size:
+            low_x, low_y = int(low[0]), int(low[1])
+            self.origin = (low_x, low_y)
+            self.grid = np.zeros(
+                (
+                    _round_up(int(high[1]) - low_y + 1),
+                    _round_up(int(high[0]) - low_x + 1),
+                ),
+                dtype=np.uint32,
+            )
+            return
+        origin_x, origin_y = self.origin
+        before_x = _round_up(max(0, origin_x - int(low[0])))
+        before_y = _round_up(max(0, origin_y - int(low[1])))
+        after_x = _round_up(max(0, int(high[0]) - origin_x - columns + 1))
+        after_y = _round_up(max(0, int(high[1]) - origin_y - rows + 1))
+        if before_x or before_y or after_x or after_y:
+            self.grid = np.pad(
+                self.grid, ((before_y, after_y), (before_x, after_x))
+            )
+            self.origin = (origin_x - before_x, origin_y - before_y)
+
+
+def _brush(radius: float) -> NDArray[np.int64]:
+    """Return the cell offsets (x, y) covered by a disk."""
+    reach = int(np.ceil(radius))
+    offsets = np.arange(-reach, reach + 1)
+    dx, dy = np.meshgrid(offsets, offsets)
+    inside = dx**2 + dy**2 <= radius**2
+    return np.stack((dx[inside], dy[inside]), axis=1)
+
+
+def _interpolate(
+    xs: NDArray[np.float64], ys: NDArray[np.float64], step: float
+) -> tuple[NDArray[np.float64], NDArray[np.float64]]:
+    """Return points at most ``step`` apart on the path through the poses."""
+    dx = np.diff(xs)
+    dy = np.diff(ys)
+    counts = np.maximum(
+        np.ceil(np.maximum(np.abs(dx), np.abs(dy)) / step).astype(np.int64),
+        1,
+    )
+    segments = np.repeat(np.arange(dx.size), counts)
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    fractions = (np.arange(segments.size) - starts) / counts[segments]
+    px = np.append(xs[segments] + dx[segments] * fractions, xs[-1])
+    py = np.append(ys[segments] + dy[segments] * fractions, ys[-1])
+    return px, py
+
+
+def _round_up(cells: int) -> int:
+    return -(-cells // GROW_STEP) * GROW_STEP
+
+
+def _png(image: NDArray[np.uint8]) -> bytes:
+    """Encode a grayscale image as PNG."""
+    height, width = image.shape
+    # every row starts with filter type 0
+    rows = np.zeros((height, width + 1), dtype=np.uint8)
+    rows[:, 1:] = image
+    return (
+        PNG_SIGNATURE
+        + _png_chunk(
+            b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+        )
+        + _png_chunk(b"IDAT", zlib.compress(rows.tobytes()))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data))
+    )
@@ -2,43 +2,116 @@
 
 from __future__ import annotations
 
+import asyncio
+import ipaddress
 import logging
 import socket
+import time
+from typing import TYPE_CHECKING
 
 from mashumaro import exceptions as merr
 from orjson import JSONDecodeError
 
 from roombapy.roomba_info import RoombaInfo, validate_hostname
 
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Collection, Iterable, Iterator
+
+DISCOVERY_TIMEOUT = 5
+
 
 class RoombaDiscovery:
     """Class for discovering Roomba devices on the local network."""
 
     udp_bind_address = ""
     udp_address = "<broadcast>"
+    broadcast_addresses: list[str]
     udp_port = 5678
     roomba_message = "irobotmcs"
     amount_of_broadcasted_messages = 5
     server_socket: socket.socket
     log: logging.Logger
 
-    def __init__(self) -> None:
-        """Initialize the discovery class."""
+    def __init__(
+        self, broadcast_addresses: Iterable[str] | None = None
+    ) -> None:
+        """Initialize the discovery class.
+
+        ``broadcast_addresses`` can contain broadcast addresses or networks
+        like ``192.168.1.0/24`` to discover robots on several interfaces or
+        subnets at once. By default the limited broadcast address is used.
+        """
         self.server_socket = _get_socket()
         self.log = logging.getLogger(__name__)
+        if broadcast_addresses is None:
+            self.broadcast_addresses = [self.udp_address]
+        else:
+            self.broadcast_addresses = [
+                _broadcast_address(address) for address in broadcast_addresses
+            ]
 
     def get_all(self) -> set[RoombaInfo]:
         """Get all Roomba devices on the local network."""
+        return set(self.iter_all())
+
+    def iter_all(
+        self,
+        deadline: float = DISCOVERY_TIMEOUT,
+        *,
+        expected: int | None = None,
+        macs: Collection[str] | None = None,
+    ) -> Iterator[RoombaInfo]:
+        """Yield Roomba devices on the local network as soon as they answer.
+
+        Discovery stops after ``deadline`` seconds, or as soon as ``expected``
+        robots or all robots with the given ``macs`` have answered.
+        """
         self._start_server()
         self._broadcast_message(self.amount_of_broadcasted_messages)
-        robots = set()
-        while True:
-            response = self._get_response()
-            if response:
-                robots.add(response)
-            else:
-                break
-        return robots
+        found = _FoundRobots(expected, macs)
+        end = time.monotonic() + deadline
+        while not found.done:
+            response = self._get_response(end=end)
+            if response is None:
+                return
+            if found.add(response):
+                yield response
+
+    async def async_iter_all(
+        self,
+        deadline: float = DISCOVERY_TIMEOUT,
+        *,
+        expected: int | None = None,
+        macs: Collection[str] | None = None,
+    ) -> AsyncIterator[RoombaInfo]:
+        """Asynchronously yield Roomba devices as soon as they answer.
+
+        Works like :meth:`iter_all`, but waits for answers on the running
+        event loop.
+        """
+        loop = asyncio.get_running_loop()
+        self._start_server()
+        queue: asyncio.Queue[RoombaInfo] = asyncio.Queue()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DiscoveryProtocol(queue), sock=self.server_socket
+        )
+        try:
+            self._broadcast_message(self.amount_of_broadcasted_messages)
+            found = _FoundRobots(expected, macs)
+            end = loop.time() + deadline
+            while not found.done:
+                try:
+                    response = await asyncio.wait_for(
+                        queue.get(), end - loop.time()
+                    )
+                # asyncio.TimeoutError isn't TimeoutError before Python 3.11
+                except asyncio.TimeoutError:  # noqa: UP041
+                    self.log.info("Discovery timeout")
+                    return
+                if found.add(response):
+                    yield response
+        finally:
+            transport.close()
 
     def get(self, ip: str) -> RoombaInfo | None:
         """Get Roomba device with the specified IP address."""
@@ -46,10 +119,18 @@ class RoombaDiscovery:
         self._send_message(ip)
         return self._get_response(ip)
 
-    def _get_response(self, ip: str | None = None) -> RoombaInfo | None:
+    def _get_response(
+        self, ip: str | None = None, end: float | None = None
+    ) -> RoombaInfo | None:
         """Get a response from the Roomba device."""
         try:
             while True:
+                if end is not None:
+                    remaining = end - time.monotonic()
+                    if remaining <= 0:
+                        self.log.info("Discovery timeout")
+                        return None
+                    self.server_socket.settimeout(remaining)
                 raw_response, addr = self.server_socket.recvfrom(1024)
                 if ip is not None and addr[0] != ip:
                     continue
@@ -65,10 +146,10 @@ class RoombaDiscovery:
             return None
 
     def _broadcast_message(self, amount: int) -> None:
+        message = self.roomba_message.encode()
         for i in range(amount):
-            self.server_socket.sendto(
-                self.roomba_message.encode(), (self.udp_address, self.udp_port)
-            )
+            for address in self.broadcast_addresses:
+                self.server_socket.sendto(message, (address, self.udp_port))
             self.log.debug("Broadcast message sent: %s", i)
 
     def _send_message(self, udp_address: str) -> None:
@@ -82,6 +163,52 @@ class RoombaDiscovery:
         self.log.debug("Socket server started, port %s", self.udp_port)
 
 
+class _FoundRobots:
+    """Robots found so far, to skip repeated answers and stop early."""
+
+    def __init__(
+        self, expected: int | None, macs: Collection[str] | None
+    ) -> None:
+        self.robots: set[RoombaInfo] = set()
+        self.expected = expected
+        self.missing_macs = (
+            {mac.lower() for mac in macs} if macs is not None else None
+        )
+
+    @property
+    def done(self) -> bool:
+        if self.expected is not None and len(self.robots) >= self.expected:
+            return True
+        return self.missing_macs is not None and not self.missing_macs
+
+    def add(self, robot: RoombaInfo) -> bool:
+        """Add a robot and return whether it wasn't found before."""
+        if robot in self.robots:
+            return False
+        self.robots.add(robot)
+        if self.missing_macs is not None:
+            self.missing_macs.discard(robot.mac.lower())
+        return True
+
+
+class _DiscoveryProtocol(asyncio.DatagramProtocol):
+    """Queue decoded discovery answers."""
+
+    def __init__(self, queue: asyncio.Queue[RoombaInfo]) -> None:
+        self.queue = queue
+
+    def datagram_received(self, data: bytes, _addr: tuple[str, int]) -> None:
+        if response := _decode_data(data):
+            self.queue.put_nowait(response)
+
+
+def _broadcast_address(address: str) -> str:
+    if "/" not in address:
+        return address
+    network = ipaddress.ip_network(address, strict=False)
+    return str(network.broadcast_address)
+
+
 def _decode_data(raw_response: bytes) -> RoombaInfo | None:
     try:
         data = raw_response.decode()
@@ -0,0 +1,340 @@
+"""Call message callbacks away from the network thread.
+
+:class:`Dispatcher` calls callbacks right away on the thread receiving the
+messages, like roombapy always did. :class:`ThreadPoolDispatcher` and
+:class:`AsyncioDispatcher` queue the calls for worker threads or an event
+loop instead, so a slow callback can't stall the MQTT keepalives of the
+robot. Their queues are bounded, an :class:`OverflowPolicy` decides what
+happens when a callback can't keep up.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from functools import partial
+from typing import TYPE_CHECKING, Any
+
+from roombapy.state import merge
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+# calls waiting per queue
+MAX_QUEUE = 1000
+WORKERS = 4
+# calls an event loop handles before it runs other tasks
+ASYNCIO_BATCH = 100
+
+
+class OverflowPolicy(Enum):
+    """What happens to a call when the queue is full."""
+
+    DROP_OLDEST = "drop_oldest"  # the oldest waiting call is dropped
+    # the message is merged into a waiting call of the same callback and
+    # robot, the oldest call is dropped if there is none
+    COALESCE = "coalesce"
+    BLOCK = "block"  # the receiving thread waits for room in the queue
+
+
+@dataclass
+class CallbackStats:
+    """Latency statistics of a callback."""
+
+    # qualified name of the callback, for display
+    name: str = ""
+    calls: int = 0
+    dropped: int = 0
+    coalesced: int = 0
+    errors: int = 0
+    # seconds between receiving a message and calling the callback
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    # seconds the callback ran
+    total_run: float = 0.0
+    max_run: float = 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        """Return the mean seconds calls waited in the queue."""
+        return self.total_wait / self.calls if self.calls else 0.0
+
+    @property
+    def mean_run(self) -> float:
+        """Return the mean seconds the callback ran."""
+        return self.total_run / self.calls if self.calls else 0.0
+
+
+@dataclass
+class _Call:
+    callback: Callable[[dict[str, Any]], None]
+    message: dict[str, Any]
+    key: str
+    received: float
+
+
+class Dispatcher:
+    """Call callbacks right away on the receiving thread."""
+
+    def __init__(self) -> None:
+        """Initialize the dispatcher."""
+        self.log = logging.getLogger(__name__)
+        # by callback, the same method of different robots is counted apart
+        self.stats: dict[Callable[..., Any], CallbackStats] = {}
+        self._stats_lock = threading.Lock()
+
+    def dispatch(
+        self,
+        callback: Callable[[dict[str, Any]], None],
+        message: dict[str, Any],
+        key: str = "",
+    ) -> None:
+        """Call a callback with a message of the robot ``key``."""
+        self._run(_Call(callback, message, key, time.perf_counter()))
+
+    def close(self) -> None:
+        """Stop calling callbacks."""
+
+    def _run(self, call: _Call) -> None:
+        start = time.perf_counter()
+        failed = True
+        try:
+            call.callback(call.message)
+            failed = False
+        finally:
+            self._record(call, start, failed=failed)
+
+    def _run_logged(self, call: _Call) -> None:
+        try:
+            self._run(call)
+        except Exception:
+            self.log.exception("Message callback %r failed", call.callback)
+
+    def _record(self, call: _Call, start: float, *, failed: bool) -> None:
+        end = time.perf_counter()
+        with self._stats_lock:
+            stats = self._stats(call.callback)
+            stats.calls += 1
+            stats.errors += failed
+            wait = start - call.received
+            stats.total_wait += wait
+            stats.max_wait = max(stats.max_wait, wait)
+            stats.total_run += end - start
+            stats.max_run = max(stats.max_run, end - start)
+
+    def _call_queue(
+        self, max_size: int, overflow: OverflowPolicy
+    ) -> _CallQueue:
+        return _CallQueue(
+            max_size,
+            overflow,
+            on_overflow=partial(self._count_overflow, coalesced=False),
+            on_coalesce=partial(self._count_overflow, coalesced=True),
+        )
+
+    def _count_overflow(self, call: _Call, *, coalesced: bool) -> None:
+        with self._stats_lock:
+            stats = self._stats(call.callback)
+            if coalesced:
+                stats.coalesced += 1
+            else:
+                stats.dropped += 1
+
+    def _stats(self, callback: Callable[..., Any]) -> CallbackStats:
+        if (stats := self.stats.get(callback)) is None:
+            name = getattr(callback, "__qualname__", repr(callback))
+            stats = self.stats[callback] = CallbackStats(name)
+        return stats
+
+
+class _CallQueue:
+    """Bounded queue of calls applying an overflow policy."""
+
+    def __init__(
+        self,
+        max_size: int,
+        overflow: OverflowPolicy,
+        on_overflow: Callable[[_Call], None] | None = None,
+        on_coalesce: Callable[[_Call], None] | None = None,
+    ) -> None:
+        self.on_overflow = on_overflow
+        self.on_coalesce = on_coalesce
+        self.max_size = max_size
+        self.overflow = overflow
+        self.calls: deque[_Call] = deque()
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def put(self, call: _Call, *, may_block: bool = True) -> None:
+        with self.condition:
+            if self.closed:
+                return
+            if len(self.calls) >= self.max_size:
+                if self.overflow is OverflowPolicy.BLOCK and may_block:
+                    self.condition.wait_for(
+                        lambda: len(self.calls) < self.max_size or self.closed
+                    )
+                    if self.closed:
+                        return
+                elif self.overflow is OverflowPolicy.COALESCE and (
+                    self._coalesce(call)
+                ):
+                    return
+                else:
+                    dropped = self.calls.popleft()
+                    if self.on_overflow is not None:
+                        self.on_overflow(dropped)
+            self.calls.append(call)
+            self.condition.notify_all()
+
+    def get(self) -> _Call | None:
+        """Return the next call, None once the queue is closed."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.calls or self.closed)
+            return self.get_nowait()
+
+    def get_nowait(self) -> _Call | None:
+        with self.condition:
+            if not self.calls:
+                return None
+            call = self.calls.popleft()
+            self.condition.notify_all()
+            return call
+
+    def close(self) -> None:
+        with self.condition:
+            self.closed = True
+            self.calls.clear()
+            self.condition.notify_all()
+
+    def _coalesce(self, call: _Call) -> bool:
+        for waiting in reversed(self.calls):
+            if waiting.callback == call.callback and waiting.key == call.key:
+                # merge into a copy, other callbacks got the same message
+                combined: dict[str, Any] = {}
+                merge(combined, waiting.message)
+                merge(combined, call.message)
+                waiting.message = combined
+                if self.on_coalesce is not None:
+                    self.on_coalesce(call)
+                return True
+        return False
+
+
+class ThreadPoolDispatcher(Dispatcher):
+    """Call callbacks from a pool of worker threads.
+
+    The calls of a robot are always handled by the same worker, so every
+    callback gets the messages of a robot in order.
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: int = WORKERS,
+        max_queue: int = MAX_QUEUE,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+    ) -> None:
+        """Start the worker threads."""
+        super().__init__()
+        self._queues = [
+            self._call_queue(max_queue, overflow) for _ in range(workers)
+        ]
+        self._threads = [
+            threading.Thread(
+                target=self._work,
+                args=(queue,),
+                name=f"roombapy-dispatch-{index}",
+                daemon=True,
+            )
+            for index, queue in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def dispatch(
+        self,
+        callback: Callable[[dict[str, Any]], None],
+        message: dict[str, Any],
+        key: str = "",
+    ) -> None:
+        """Queue a call for the worker of the robot ``key``."""
+        queue = self._queues[hash(key) % len(self._queues)]
+        queue.put(_Call(callback, message, key, time.perf_counter()))
+
+    def close(self) -> None:
+        """Drop the waiting calls and stop the workers."""
+        for queue in self._queues:
+            queue.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def _work(self, queue: _CallQueue) -> None:
+        while (call := queue.get()) is not None:
+            self._run_logged(call)
+
+
+class AsyncioDispatcher(Dispatcher):
+    """Call callbacks from an asyncio event loop."""
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        *,
+        max_queue: int = MAX_QUEUE,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+    ) -> None:
+        """Initialize the dispatcher for an event loop."""
+        super().__init__()
+        self.loop = loop
+        self._queue = self._call_queue(max_queue, overflow)
+        self._scheduled = False
+        self._lock = threading.Lock()
+
+    def dispatch(
+        self,
+        callback: Callable[[dict[str, Any]], None],
+        message: dict[str, Any],
+        key: str = "",
+    ) -> None:
+        """Queue a call for the event loop."""
+        try:
+            in_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            in_loop = False
+        # the event loop would wait for itself
+        self._queue.put(
+            _Call(callback, message, key, time.perf_counter()),
+            may_block=not in_loop,
+        )
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.loop.call_soon_threadsafe(self._drain)
+
+    def close(self) -> None:
+        """Drop the waiting calls."""
+        self._queue.close()
+
+    def _drain(self) -> None:
+        for _ in range(ASYNCIO_BATCH):
+            if (call := self._queue.get_nowait()) is None:
+                break
+            self._run_logged(call)
+        else:
+            # let other tasks run before the next batch
+            self.loop.call_soon(self._drain)
+            return
+        with self._lock:
+            if not self._queue.calls:
+                self._scheduled = False
+                return
+        # calls were queued while the last one ran
+        self.loop.call_soon(self._drain)
@@ -0,0 +1,115 @@
+"""Send the same command to many robots at once.
+
+The command document is built and serialized once for all robots, only
+parameters which differ per robot are serialized per robot. Every robot
+publishes the command from its own network thread, so a whole fleet gets
+it in about the time one robot does. The outcome is collected per robot
+in a :class:`FanOut`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+from typing import TYPE_CHECKING, Any
+
+from roombapy.command_queue import prepare_command
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+    from roombapy.command_queue import CommandHandle
+    from roombapy.roomba import Roomba
+
+# outcome of a command per BLID, None if it succeeded
+FanOutResults = dict[str, BaseException | None]
+
+
+class FanOut:
+    """Handles of a command sent to many robots, by BLID."""
+
+    def __init__(self, handles: dict[str, CommandHandle]) -> None:
+        """Initialize the fan-out from the handles of the robots."""
+        self.handles = handles
+
+    def wait_published(self, timeout: float | None = None) -> FanOutResults:
+        """Wait until the command was published to all robots.
+
+        ``timeout`` limits the wait for all robots together; robots which
+        didn't publish the command in time get a :class:`TimeoutError`.
+        """
+        return _collect(
+            {blid: h.published for blid, h in self.handles.items()}, timeout
+        )
+
+    def wait_confirmed(self, timeout: float | None = None) -> FanOutResults:
+        """Wait until all robots reported the command.
+
+        ``timeout`` limits the wait like for :meth:`wait_published`.
+        """
+        return _collect(
+            {blid: h.confirmed for blid, h in self.handles.items()}, timeout
+        )
+
+    async def async_wait_published(self) -> FanOutResults:
+        """Wait until the command was published to all robots."""
+        return await _async_collect(
+            {blid: h.published for blid, h in self.handles.items()}
+        )
+
+    async def async_wait_confirmed(self) -> FanOutResults:
+        """Wait until all robots reported the command."""
+        return await _async_collect(
+            {blid: h.confirmed for blid, h in self.handles.items()}
+        )
+
+
+def fan_out(
+    roombas: Iterable[Roomba],
+    command: str,
+    params: Mapping[str, Any] | None = None,
+    *,
+    per_robot: Mapping[str, Mapping[str, Any]] | None = None,
+) -> FanOut:
+    """Send a command to many robots.
+
+    ``per_robot`` maps BLIDs to parameters added for that robot only,
+    they may not repeat ``params``. Offline robots get the command when
+    they reconnect, like with :meth:`~roombapy.roomba.Roomba.send_command`.
+    """
+    prepared = prepare_command(command, params)
+    per_robot = per_robot or {}
+    handles: dict[str, CommandHandle] = {}
+    for roomba in roombas:
+        blid = roomba.remote_client.blid
+        robot_command = prepared.with_params(per_robot.get(blid, {}))
+        handles[blid] = roomba.send_prepared(robot_command)
+    return FanOut(handles)
+
+
+def _collect(
+    futures: dict[str, concurrent.futures.Future[None]],
+    timeout: float | None,
+) -> FanOutResults:
+    concurrent.futures.wait(futures.values(), timeout)
+    return {blid: _outcome(future) for blid, future in futures.items()}
+
+
+async def _async_collect(
+    futures: dict[str, concurrent.futures.Future[None]],
+) -> FanOutResults:
+    if futures:
+        # wrapped without cancelling the futures of the handles
+        await asyncio.wait(
+            [
+                asyncio.shield(asyncio.wrap_future(future))
+                for future in futures.values()
+            ]
+        )
+    return {blid: _outcome(future) for blid, future in futures.items()}
+
+
+def _outcome(future: concurrent.futures.Future[None]) -> BaseException | None:
+    if not future.done():
+        return TimeoutError("The robot didn't answer in time")
+    return future.exception(0)
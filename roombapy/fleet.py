@@ -0,0 +1,290 @@
+"""Manage many Roombas from a single event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import partial
+from typing import TYPE_CHECKING, Any
+
+from roombapy.command_queue import prepare_command
+from roombapy.fanout import FanOut, fan_out
+from roombapy.reconnect import shared_scheduler
+from roombapy.roomba import RoombaConnectionError
+from roombapy.roomba_factory import RoombaFactory
+
+if TYPE_CHECKING:
+    from collections.abc import Collection, Iterable, Mapping
+
+    from roombapy.async_roomba import AsyncRoomba
+    from roombapy.const import TransportErrorMessage
+    from roombapy.reconnect import ReconnectScheduler, RetryState
+    from roombapy.roomba import RobotPreference, RoombaMessage
+
+# how long to wait for the robot to answer the MQTT connection
+CONNECT_TIMEOUT = 10
+
+RobotCredentials = tuple[str, str, str]  # address, blid, password
+FleetMessageCallback = Callable[[str, "RoombaMessage"], None]
+FleetErrorCallback = Callable[[str, "TransportErrorMessage"], None]
+
+
+@dataclass
+class RobotStatus:
+    """Connection status of a robot in the fleet."""
+
+    connected: bool = False
+    last_error: TransportErrorMessage = None
+
+
+class RoombaFleet:
+    """Fleet of Roombas sharing one event loop.
+
+    All MQTT sessions are multiplexed over a single asyncio event loop, so
+    the fleet needs one thread no matter how many robots it manages. Robots
+    are identified by their BLID. Every robot is kept connected by its own
+    task. Reconnections after failures or drops are scheduled by a
+    :class:`~roombapy.reconnect.ReconnectScheduler`, by default the one
+    shared by all clients of the process.
+
+    The fleet can either run on an existing event loop (``async_connect``)
+    or start a thread with its own event loop (``connect``).
+    """
+
+    def __init__(
+        self,
+        robots: Iterable[RobotCredentials],
+        *,
+        scheduler: ReconnectScheduler | None = None,
+    ) -> None:
+        """Initialize the fleet."""
+        self.log = logging.getLogger(__name__)
+        self.scheduler = scheduler or shared_scheduler()
+        self.roombas: dict[str, AsyncRoomba] = {}
+        self.status: dict[str, RobotStatus] = {}
+        self.on_message_callbacks: list[FleetMessageCallback] = []
+        self.on_disconnect_callbacks: list[FleetErrorCallback] = []
+        self._changed: dict[str, asyncio.Event] = {}
+        self._tasks: list[asyncio.Task[None]] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        for address, blid, password in robots:
+            self._add_robot(address, blid, password)
+
+    def _add_robot(self, address: str, blid: str, password: str) -> None:
+        roomba = RoombaFactory.create_async_roomba(
+            address, blid, password, scheduler=self.scheduler
+        )
+        roomba.register_on_message_callback(partial(self._on_message, blid))
+        roomba.register_on_connect_callback(partial(self._on_connect, blid))
+        roomba.register_on_disconnect_callback(
+            partial(self._on_disconnect, blid)
+        )
+        self.roombas[blid] = roomba
+        self.status[blid] = RobotStatus()
+        self._changed[blid] = asyncio.Event()
+
+    def register_on_message_callback(
+        self, callback: FleetMessageCallback
+    ) -> None:
+        """Register a function called with the BLID and every message."""
+        self.on_message_callbacks.append(callback)
+
+    def register_on_disconnect_callback(
+        self, callback: FleetErrorCallback
+    ) -> None:
+        """Register a function called with the BLID on unexpected drops."""
+        self.on_disconnect_callbacks.append(callback)
+
+    async def async_connect(self) -> None:
+        """Start keeping all robots connected on the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._tasks = [
+            self._loop.create_task(self._keep_connected(blid))
+            for blid in self.roombas
+        ]
+
+    async def async_disconnect(self) -> None:
+        """Disconnect all robots."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for status in self.status.values():
+            status.connected = False
+        await asyncio.gather(
+            *(
+                roomba.async_disconnect()
+                for roomba in self.roombas.values()
+                if roomba.roomba_connected
+            )
+        )
+
+    def connect(self) -> None:
+        """Start a thread running the fleet event loop."""
+        if self._thread is not None:
+            return
+        loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=loop.run_forever, name="roombapy-fleet", daemon=True
+        )
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.async_connect(), loop).result()
+
+    def disconnect(self) -> None:
+        """Disconnect all robots and stop the fleet thread."""
+        if self._thread is None or self._loop is None:
+            return
+        loop = self._loop
+        asyncio.run_coroutine_threadsafe(
+            self.async_disconnect(), loop
+        ).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        self._thread = None
+        loop.close()
+
+    def send_command(
+        self,
+        command: str,
+        params: dict[str, Any] | None = None,
+        blids: Collection[str] | None = None,
+    ) -> list[str]:
+        """Send a command to the connected robots.
+
+        Without ``blids`` the command is sent to the whole fleet. Returns the
+        BLIDs the command was sent to.
+        """
+        targets = self._connected(blids)
+        # serialized once for all robots
+        prepared = prepare_command(command, params)
+        for blid in targets:
+            self._call_in_loop(self.roombas[blid].send_prepared, prepared)
+        return targets
+
+    def fan_out(
+        self,
+        command: str,
+        params: dict[str, Any] | None = None,
+        blids: Collection[str] | None = None,
+        *,
+        per_robot: Mapping[str, Mapping[str, Any]] | None = None,
+    ) -> FanOut:
+        """Send a command to the connected robots and track it per robot.
+
+        Like :meth:`send_command`, but returns the handles of the robots
+        the command was sent to, see :func:`roombapy.fanout.fan_out`.
+        """
+        roombas = [self.roombas[blid] for blid in self._connected(blids)]
+
+        async def send() -> FanOut:
+            return fan_out(roombas, command, params, per_robot=per_robot)
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self._loop is None or running is self._loop:
+            return fan_out(roombas, command, params, per_robot=per_robot)
+        return asyncio.run_coroutine_threadsafe(send(), self._loop).result()
+
+    def set_preference(
+        self,
+        preference: str,
+        setting: RobotPreference,
+        blids: Collection[str] | None = None,
+    ) -> list[str]:
+        """Set a preference on the connected robots.
+
+        Without ``blids`` the preference is set on the whole fleet. Returns
+        the BLIDs the preference was sent to.
+        """
+        targets = self._connected(blids)
+        for blid in targets:
+            self._call_in_loop(
+                self.roombas[blid].set_preference, preference, setting
+            )
+        return targets
+
+    def retry_state(self, blid: str) -> RetryState:
+        """Return the reconnection state of a robot."""
+        return self.scheduler.state(blid)
+
+    def _connected(self, blids: Collection[str] | None) -> list[str]:
+        return [
+            blid
+            for blid, status in self.status.items()
+            if status.connected and (blids is None or blid in blids)
+        ]
+
+    def _call_in_loop(self, callback: Callable[..., Any], *args: Any) -> None:
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    async def _keep_connected(self, blid: str) -> None:
+        roomba = self.roombas[blid]
+        status = self.status[blid]
+        changed = self._changed[blid]
+        while True:
+            changed.clear()
+            if await self._try_connect(roomba, changed) and status.connected:
+                # wait until the connection drops
+                while status.connected:
+                    changed.clear()
+                    await changed.wait()
+            # the client waits for the scheduler before every attempt, a
+            # robot which is paused after repeated failures is waited for
+            # here
+            await asyncio.sleep(self.scheduler.delay(blid))
+
+    async def _try_connect(
+        self, roomba: AsyncRoomba, changed: asyncio.Event
+    ) -> bool:
+        try:
+            await roomba.async_connect()
+        except RoombaConnectionError as error:
+            self.log.debug("Fleet connection failed: %s", error)
+            return False
+        try:
+            await asyncio.wait_for(changed.wait(), CONNECT_TIMEOUT)
+        # asyncio.TimeoutError isn't TimeoutError before Python 3.11
+        except asyncio.TimeoutError:  # noqa: UP041
+            self.log.debug(
+                "Roomba %s didn't answer the connection",
+                roomba.remote_client.address,
+            )
+            await roomba.async_disconnect()
+            self.scheduler.record_failure(
+                roomba.remote_client.blid, "Connection timed out"
+            )
+            return False
+        return True
+
+    def _on_message(self, blid: str, message: RoombaMessage) -> None:
+        for callback in self.on_message_callbacks:
+            callback(blid, message)
+
+    def _on_connect(self, blid: str, error: TransportErrorMessage) -> None:
+        status = self.status[blid]
+        status.connected = error is None
+        status.last_error = error
+        self._changed[blid].set()
+
+    def _on_disconnect(self, blid: str, error: TransportErrorMessage) -> None:
+        status = self.status[blid]
+        status.connected = False
+        status.last_error = error
+        self._changed[blid].set()
+        for callback in self.on_disconnect_callbacks:
+            callback(blid, error)
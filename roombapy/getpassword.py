@@ -5,11 +5,26 @@ from __future__ import annotations
 import logging
 import socket
 import struct
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
 from roombapy.remote_client import generate_tls_context
 
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
 PASSWORD_REQUEST = bytes.fromhex("f005efcc3b2900")
 UNSUPPORTED_MAGIC = bytes.fromhex("f005efcc3b2903")
+DEFAULT_CONCURRENCY = 10
+
+
+@dataclass
+class PasswordResult:
+    """Result of a password request to one robot."""
+
+    password: str | None = None
+    error: OSError | None = None
 
 
 class RoombaPassword:
@@ -23,7 +38,7 @@ class RoombaPassword:
     def __init__(self, roomba_ip: str) -> None:
         """Init default values."""
         self.roomba_ip = roomba_ip
-        self.server_socket = _get_socket()
+        self.server_socket = _get_socket(roomba_ip)
         self.log = logging.getLogger(__name__)
 
     """
@@ -87,12 +102,41 @@ class RoombaPassword:
             return raw_data
 
 
+def get_passwords(
+    ips: Iterable[str], concurrency: int = DEFAULT_CONCURRENCY
+) -> dict[str, PasswordResult]:
+    """Get passwords for several robots at once.
+
+    Up to ``concurrency`` robots are asked in parallel, so one robot that
+    doesn't answer doesn't hold up the others. Connection errors are
+    returned per IP instead of being raised.
+    """
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="roombapy-password"
+    ) as executor:
+        futures = {
+            ip: executor.submit(_get_password, ip) for ip in dict.fromkeys(ips)
+        }
+    return {ip: future.result() for ip, future in futures.items()}
+
+
+def _get_password(ip: str) -> PasswordResult:
+    try:
+        return PasswordResult(password=RoombaPassword(ip).get_password())
+    except OSError as error:
+        logging.getLogger(__name__).debug(
+            "Can't get password from %s: %s", ip, error
+        )
+        return PasswordResult(error=error)
+
+
 def _decode_password(data: bytes) -> str:
     return str(data[7:].decode().rstrip("\x00"))
 
 
-def _get_socket() -> socket.socket:
+def _get_socket(roomba_ip: str) -> socket.socket:
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.settimeout(10)
     context = generate_tls_context()
-    return context.wrap_socket(server_socket)
+    # the MQTT connection to the robot can resume this session
+    return context.wrap_socket(server_socket, server_hostname=roomba_ip)
@@ -0,0 +1,372 @@
+"""Metrics of the connections and messages of robots.
+
+All clients of a process record into one :class:`Metrics` registry by
+default. It can be read as a snapshot of plain values, or served in the
+Prometheus text format by a :class:`MetricsExporter`.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from functools import cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, ClassVar
+
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.1,
+)
+# upper bounds in seconds of the TLS handshake histogram buckets
+HANDSHAKE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# seconds the message rate is averaged over
+RATE_WINDOW = 10
+EXPORTER_HOST = "127.0.0.1"
+EXPORTER_PORT = 9117
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# stages of handling a message
+STAGES = ("decode", "merge", "dispatch")
+
+
+class Histogram:
+    """Latency histogram with fixed buckets."""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        """Initialize an empty histogram."""
+        self.buckets = buckets
+        # the last count is for values above the largest bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Add a value."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        """Return the count of values up to every bucket, then in total."""
+        result = []
+        total = 0
+        for bound, count in zip(
+            (*self.buckets, float("inf")), self.counts, strict=True
+        ):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class RateMeter:
+    """Events per second averaged over the last seconds."""
+
+    def __init__(self, window: int = RATE_WINDOW) -> None:
+        """Initialize the meter."""
+        self.window = window
+        # (second, events) pairs of the window
+        self._seconds: deque[list[int]] = deque()
+
+    def add(self, now: float) -> None:
+        """Count an event."""
+        second = int(now)
+        if self._seconds and self._seconds[-1][0] == second:
+            self._seconds[-1][1] += 1
+        else:
+            self._seconds.append([second, 1])
+            self._expire(second)
+
+    def rate(self, now: float) -> float:
+        """Return the events per second."""
+        self._expire(int(now))
+        return sum(events for _, events in self._seconds) / self.window
+
+    def _expire(self, second: int) -> None:
+        while self._seconds and self._seconds[0][0] <= second - self.window:
+            self._seconds.popleft()
+
+
+class RobotMetrics:
+    """Metrics of a single robot."""
+
+    def __init__(self) -> None:
+        """Initialize empty metrics."""
+        self.messages = 0
+        self.malformed = 0
+        self.connect_attempts = 0
+        self.connect_failures = 0
+        self.disconnects: Counter[str] = Counter()
+        self.handshakes = Histogram(HANDSHAKE_BUCKETS)
+        self.resumed_handshakes = 0
+        self.latency = {stage: Histogram() for stage in STAGES}
+        self.message_rate = RateMeter()
+        self._lock = threading.Lock()
+
+    def record_message(
+        self, decode: float, merge: float, dispatch: float
+    ) -> None:
+        """Record a message and the seconds its stages took."""
+        with self._lock:
+            self.messages += 1
+            self.message_rate.add(time.monotonic())
+            self.latency["decode"].observe(decode)
+            self.latency["merge"].observe(merge)
+            self.latency["dispatch"].observe(dispatch)
+
+    def record_malformed(self) -> None:
+        """Record a payload which couldn't be decoded."""
+        with self._lock:
+            self.malformed += 1
+
+    def record_connect_attempt(self) -> None:
+        """Record a connection attempt."""
+        with self._lock:
+            self.connect_attempts += 1
+
+    def record_connect_failure(self) -> None:
+        """Record a failed connection attempt."""
+        with self._lock:
+            self.connect_failures += 1
+
+    def record_handshake(self, seconds: float, *, resumed: bool) -> None:
+        """Record the seconds a TLS handshake took."""
+        with self._lock:
+            self.handshakes.observe(seconds)
+            self.resumed_handshakes += resumed
+
+    def record_disconnect(self, reason: str | None) -> None:
+        """Record a disconnection, None for requested ones."""
+        with self._lock:
+            self.disconnects[reason or "requested"] += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return the current values."""
+        with self._lock:
+            return {
+                "messages": self.messages,
+                "messages_per_second": self.message_rate.rate(
+                    time.monotonic()
+                ),
+                "malformed": self.malformed,
+                "connect_attempts": self.connect_attempts,
+                "connect_failures": self.connect_failures,
+                "disconnects": dict(self.disconnects),
+                "handshakes": {
+                    "count": self.handshakes.count,
+                    "resumed": self.resumed_handshakes,
+                    "sum": self.handshakes.sum,
+                    "buckets": self.handshakes.cumulative(),
+                },
+                "latency": {
+                    stage: {
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "buckets": histogram.cumulative(),
+                    }
+                    for stage, histogram in self.latency.items()
+                },
+            }
+
+
+class Metrics:
+    """Registry of the metrics of robots by BLID."""
+
+    def __init__(self) -> None:
+        """Initialize an empty registry."""
+        self._robots: dict[str, RobotMetrics] = {}
+        self._lock = threading.Lock()
+
+    def robot(self, blid: str) -> RobotMetrics:
+        """Return the metrics of a robot, created on first use."""
+        with self._lock:
+            if (metrics := self._robots.get(blid)) is None:
+                metrics = self._robots[blid] = RobotMetrics()
+            return metrics
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Return the current values of all robots."""
+        with self._lock:
+            robots = dict(self._robots)
+        return {blid: metrics.snapshot() for blid, metrics in robots.items()}
+
+    def prometheus(self) -> str:
+        """Return all metrics in the Prometheus text format."""
+        snapshot = self.snapshot()
+        lines: list[str] = []
+
+        def family(name: str, kind: str, description: str) -> None:
+            lines.append(f"# HELP roombapy_{name} {description}")
+            lines.append(f"# TYPE roombapy_{name} {kind}")
+
+        def sample(name: str, labels: dict[str, str], value: float) -> None:
+            rendered = ",".join(
+                f'{key}="{_escape(label)}"' for key, label in labels.items()
+            )
+            lines.append(f"roombapy_{name}{{{rendered}}} {value!r}")
+
+        for name, kind, key, description in (
+            ("messages_total", "counter", "messages", "Messages received."),
+            (
+                "messages_per_second",
+                "gauge",
+                "messages_per_second",
+                f"Messages received per second over {RATE_WINDOW}s.",
+            ),
+            (
+                "malformed_messages_total",
+                "counter",
+                "malformed",
+                "Messages which couldn't be decoded.",
+            ),
+            (
+                "connect_attempts_total",
+                "counter",
+                "connect_attempts",
+                "Connection attempts.",
+            ),
+            (
+                "connect_failures_total",
+                "counter",
+                "connect_failures",
+                "Failed connection attempts.",
+            ),
+        ):
+            family(name, kind, description)
+            for blid, robot in snapshot.items():
+                sample(name, {"blid": blid}, robot[key])
+
+        family(
+            "tls_resumptions_total",
+            "counter",
+            "TLS handshakes resuming a session.",
+        )
+        for blid, robot in snapshot.items():
+            sample(
+                "tls_resumptions_total",
+                {"blid": blid},
+                robot["handshakes"]["resumed"],
+            )
+
+        family("disconnects_total", "counter", "Disconnections by reason.")
+        for blid, robot in snapshot.items():
+            for reason, count in robot["disconnects"].items():
+                sample(
+                    "disconnects_total",
+                    {"blid": blid, "reason": reason},
+                    count,
+                )
+
+        def histogram(
+            name: str, description: str, values: dict[str, dict[str, Any]]
+        ) -> None:
+            family(name, "histogram", description)
+            for blid, histogram in values.items():
+                for bound, count in histogram["buckets"]:
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    sample(f"{name}_bucket", {"blid": blid, "le": le}, count)
+                sample(f"{name}_sum", {"blid": blid}, histogram["sum"])
+                sample(f"{name}_count", {"blid": blid}, histogram["count"])
+
+        for stage in STAGES:
+            histogram(
+                f"{stage}_seconds",
+                f"Seconds to {stage} a message.",
+                {
+                    blid: robot["latency"][stage]
+                    for blid, robot in snapshot.items()
+                },
+            )
+        histogram(
+            "tls_handshake_seconds",
+            "Seconds TLS handshakes took.",
+            {blid: robot["handshakes"] for blid, robot in snapshot.items()},
+        )
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """Serve metrics to Prometheus over HTTP from a background thread."""
+
+    def __init__(
+        self,
+        metrics: Metrics | None = None,
+        host: str = EXPORTER_HOST,
+        port: int = EXPORTER_PORT,
+    ) -> None:
+        """Initialize the exporter, the default port is 9117."""
+        self.log = logging.getLogger(__name__)
+        self.metrics = metrics or shared_metrics()
+        self.host = host
+        self.port = port
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start serving, port 0 picks a free port."""
+        if self._server is not None:
+            return
+        metrics = self.metrics
+
+        class Handler(_MetricsHandler):
+            registry = metrics
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="roombapy-metrics",
+            daemon=True,
+        )
+        self._thread.start()
+        self.log.info("Serving metrics on %s:%s", self.host, self.port)
+
+    def stop(self) -> None:
+        """Stop serving."""
+        if self._server is None or self._thread is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: ClassVar[Metrics]
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        logging.getLogger(__name__).debug(format, *args)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+@cache
+def shared_metrics() -> Metrics:
+    """Return the metrics registry shared by all clients of the process."""
+    return Metrics()
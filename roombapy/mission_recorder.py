@@ -0,0 +1,299 @@
+"""Record the pose, phase and battery of robots per mission.
+
+Every mission is stored in its own append-only file of fixed-size binary
+samples, so thousands of missions can be kept and read back through a
+memory map without parsing JSON logs.
+"""
+
+from __future__ import annotations
+
+import logging
+import mmap
+import struct
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+# typing.Self needs Python 3.11
+from typing_extensions import Self  # noqa: UP035
+
+from roombapy.const import ROOMBA_STATES
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from io import BufferedWriter
+    from types import TracebackType
+
+    from roombapy.const import State
+    from roombapy.roomba import Roomba
+    from roombapy.state import StateChange
+
+SUFFIX = ".mission"
+MAGIC = b"RMBM"
+VERSION = 1
+# magic, version, mission start time
+HEADER = struct.Struct("<4sB3xd")
+# time, x, y, theta, battery percentage, phase
+RECORD = struct.Struct("<diihBB")
+UNKNOWN = 0xFF
+# phases are stored as their index, unknown ones as UNKNOWN
+PHASES: tuple[str, ...] = tuple(ROOMBA_STATES)
+_PHASE_CODES = {phase: code for code, phase in enumerate(PHASES)}
+# flattened keys which add a sample when they change
+SAMPLED_KEYS = frozenset(
+    {
+        "pose_theta",
+        "pose_point_x",
+        "pose_point_y",
+        "batPct",
+        "cleanMissionStatus_phase",
+    }
+)
+
+
+class Sample(NamedTuple):
+    """Single sample of a mission."""
+
+    # seconds since the epoch, samples of a mission are in ascending order
+    time: float
+    x: int
+    y: int
+    theta: int
+    battery: int | None
+    phase: str | None
+
+
+class MissionWriter:
+    """Append samples to a new mission file."""
+
+    def __init__(self, path: Path, start: float) -> None:
+        """Create the mission file, it must not exist yet."""
+        self.path = path
+        self.start = start
+        self._monotonic_start = time.monotonic()
+        self._file: BufferedWriter = path.open("xb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, start))
+
+    def now(self) -> float:
+        """Return the time of a sample taken now.
+
+        The time is the start of the mission plus the monotonic seconds
+        since, so it doesn't go backwards when the wall clock is set back.
+        """
+        return self.start + time.monotonic() - self._monotonic_start
+
+    def append(self, sample: Sample) -> None:
+        """Append a sample, samples have to be appended in time order."""
+        self._file.write(
+            RECORD.pack(
+                sample.time,
+                sample.x,
+                sample.y,
+                sample.theta,
+                UNKNOWN if sample.battery is None else sample.battery,
+                UNKNOWN
+                if sample.phase is None
+                else _PHASE_CODES.get(sample.phase, UNKNOWN),
+            )
+        )
+
+    def close(self) -> None:
+        """Write buffered samples and close the file."""
+        self._file.close()
+
+
+class MissionLog:
+    """Read-only, memory mapped view of a mission file.
+
+    Samples are only unpacked when they are accessed. A partially written
+    trailing sample is ignored.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Map the mission file."""
+        self.path = path
+        with path.open("rb") as file:
+            size = path.stat().st_size
+            if size < HEADER.size:
+                msg = f"Not a mission file: {path}"
+                raise ValueError(msg)
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, start = HEADER.unpack_from(self._map)
+        self.start = float(start)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            msg = f"Not a mission file: {path}"
+            raise ValueError(msg)
+        self._length = (size - HEADER.size) // RECORD.size
+
+    def close(self) -> None:
+        """Unmap the mission file."""
+        self._map.close()
+
+    def __enter__(self) -> Self:
+        """Return the log."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Unmap the mission file."""
+        self.close()
+
+    def __len__(self) -> int:
+        """Return the number of samples."""
+        return self._length
+
+    def __getitem__(self, index: int) -> Sample:
+        """Return a sample."""
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            msg = "sample index out of range"
+            raise IndexError(msg)
+        return self._sample(index)
+
+    def __iter__(self) -> Iterator[Sample]:
+        """Iterate over all samples."""
+        return map(self._sample, range(self._length))
+
+    @property
+    def duration(self) -> float:
+        """Return the seconds between the start and the last sample."""
+        if not self._length:
+            return 0.0
+        return self._time(self._length - 1) - self.start
+
+    def between(self, start: float, end: float) -> list[Sample]:
+        """Return the samples from ``start`` up to ``end`` (excluded)."""
+        first = bisect_left(range(self._length), start, key=self._time)
+        last = bisect_left(range(self._length), end, key=self._time)
+        return [self._sample(index) for index in range(first, last)]
+
+    def downsample(self, max_samples: int) -> list[Sample]:
+        """Return at most ``max_samples`` evenly spread samples.
+
+        The first and the last sample are always part of the result.
+        """
+        if max_samples <= 0 or not self._length:
+            return []
+        if self._length <= max_samples:
+            return list(self)
+        if max_samples == 1:
+            return [self._sample(self._length - 1)]
+        step = (self._length - 1) / (max_samples - 1)
+        return [
+            self._sample(round(index * step)) for index in range(max_samples)
+        ]
+
+    def raw_records(self) -> bytes:
+        """Return a copy of the packed records of all samples."""
+        return self._map[
+            HEADER.size : HEADER.size + self._length * RECORD.size
+        ]
+
+    def _time(self, index: int) -> float:
+        (timestamp,) = struct.unpack_from(
+            "<d", self._map, HEADER.size + index * RECORD.size
+        )
+        return float(timestamp)
+
+    def _sample(self, index: int) -> Sample:
+        timestamp, x, y, theta, battery, phase = RECORD.unpack_from(
+            self._map, HEADER.size + index * RECORD.size
+        )
+        return Sample(
+            time=timestamp,
+            x=x,
+            y=y,
+            theta=theta,
+            battery=None if battery == UNKNOWN else battery,
+            phase=None if phase >= len(PHASES) else PHASES[phase],
+        )
+
+
+class MissionRecorder:
+    """Record the missions of Roombas.
+
+    Missions start with the ``New Mission`` state and end with
+    ``Docking - End Mission``. Every mission of a robot is stored in
+    ``<directory>/<blid>/<start in ms>.mission``.
+    """
+
+    def __init__(self, directory: Path | str) -> None:
+        """Initialize the recorder."""
+        self.log = logging.getLogger(__name__)
+        self.directory = Path(directory)
+        self.writers: dict[str, MissionWriter] = {}
+
+    def attach(self, roomba: Roomba) -> None:
+        """Start recording the missions of a Roomba."""
+        blid = roomba.remote_client.blid
+
+        def on_state(_previous: State, state: State) -> None:
+            if state == ROOMBA_STATES["new"]:
+                self.start_mission(blid)
+            elif state == ROOMBA_STATES["dockend"]:
+                self.end_mission(blid)
+
+        def on_change(changes: list[StateChange]) -> None:
+            if (writer := self.writers.get(blid)) is not None and any(
+                change.path in SAMPLED_KEYS for change in changes
+            ):
+                self.record(blid, _sample(roomba, writer.now()))
+
+        roomba.register_on_state_callback(on_state)
+        roomba.register_on_change_callback("*", on_change)
+
+    def start_mission(self, blid: str, start: float | None = None) -> Path:
+        """Start a new mission file, ending the current one."""
+        self.end_mission(blid)
+        start = time.time() if start is None else start
+        robot_directory = self.directory / blid
+        robot_directory.mkdir(parents=True, exist_ok=True)
+        path = robot_directory / f"{int(start * 1000)}{SUFFIX}"
+        self.writers[blid] = MissionWriter(path, start)
+        self.log.debug("Recording mission of %s to %s", blid, path)
+        return path
+
+    def record(self, blid: str, sample: Sample) -> None:
+        """Append a sample to the current mission of a robot.
+
+        Samples have to be recorded in time order, :meth:`MissionLog.between`
+        relies on it.
+        """
+        if (writer := self.writers.get(blid)) is not None:
+            writer.append(sample)
+
+    def end_mission(self, blid: str) -> None:
+        """Close the current mission file of a robot."""
+        if (writer := self.writers.pop(blid, None)) is not None:
+            writer.close()
+
+    def close(self) -> None:
+        """Close all mission files."""
+        for blid in list(self.writers):
+            self.end_mission(blid)
+
+    def missions(self, blid: str) -> list[Path]:
+        """Return the mission files of a robot, oldest first."""
+        return sorted(
+            (self.directory / blid).glob(f"*{SUFFIX}"),
+            key=lambda path: int(path.stem),
+        )
+
+
+def _sample(roomba: Roomba, now: float) -> Sample:
+    state = roomba.state
+    return Sample(
+        time=now,
+        x=state.pose.x or 0,
+        y=state.pose.y or 0,
+        theta=state.pose.theta or 0,
+        battery=state.bat_pct,
+        phase=state.mission.phase,
+    )
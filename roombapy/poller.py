@@ -0,0 +1,212 @@
+"""Poll robots which aren't connected continuously.
+
+A periodic robot is connected only long enough to receive its reported
+state, then disconnected until the next poll, which saves battery and
+radio time on the robot. All periodic robots of a process are scheduled
+by one :class:`Poller` by default, which spreads their polls out and
+limits how many robots are connected at once.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from roombapy.roomba import Roomba
+
+# seconds without messages after which the reported state is complete
+POLL_QUIET = 1.0
+# robots polled at the same time
+MAX_CONCURRENT = 4
+# seconds between the first polls of robots added at once
+STAGGER = 1.0
+
+
+class PollWindow:
+    """Messages received while a robot is polled.
+
+    The robot sends its whole reported state in a burst of messages after
+    connecting. The state is considered complete once a message arrived
+    and no other one followed for ``quiet`` seconds.
+    """
+
+    def __init__(
+        self,
+        quiet: float = POLL_QUIET,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize an empty window."""
+        self.quiet = quiet
+        self.clock = clock
+        self.messages = 0
+        self.cancelled = False
+        self._last_message = 0.0
+        self._condition = threading.Condition()
+
+    def received(self) -> None:
+        """Record a message."""
+        with self._condition:
+            self.messages += 1
+            self._last_message = self.clock()
+            self._condition.notify_all()
+
+    def cancel(self) -> None:
+        """Stop waiting for messages."""
+        with self._condition:
+            self.cancelled = True
+            self._condition.notify_all()
+
+    def wait(self, timeout: float) -> bool:
+        """Wait until the state is complete, at most ``timeout`` seconds.
+
+        Returns whether the state is complete.
+        """
+        deadline = self.clock() + timeout
+        with self._condition:
+            while not self.cancelled:
+                now = self.clock()
+                if self.messages:
+                    quiet_left = self._last_message + self.quiet - now
+                    if quiet_left <= 0:
+                        return True
+                else:
+                    quiet_left = self.quiet
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False
+                self._condition.wait(min(remaining, quiet_left))
+        return False
+
+
+class Poller:
+    """Schedule the polls of periodic robots.
+
+    Polls wait in a heap ordered by their due time. One scheduler thread
+    hands due polls to at most ``max_concurrent`` worker threads, later
+    polls wait for a free worker. Robots added at once are first polled
+    ``stagger`` seconds apart, and every robot is polled again after the
+    number of seconds its :meth:`~roombapy.roomba.Roomba.poll` returned.
+    The threads run while robots are added.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrent: int = MAX_CONCURRENT,
+        stagger: float = STAGGER,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the poller without robots."""
+        self.log = logging.getLogger(__name__)
+        self.max_concurrent = max_concurrent
+        self.stagger = stagger
+        self.clock = clock
+        # (due time, sequence number, robot), outdated entries are skipped
+        self._heap: list[tuple[float, int, Roomba]] = []
+        # sequence number of the current entry of every robot
+        self._entries: dict[Roomba, int] = {}
+        self._sequence = itertools.count()
+        self._running: set[Roomba] = set()
+        self._next_start = 0.0
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def __contains__(self, roomba: Roomba) -> bool:
+        """Return whether a robot is polled."""
+        return roomba in self._entries
+
+    def add(self, roomba: Roomba) -> None:
+        """Start polling a robot, after the robots added before."""
+        with self._condition:
+            if roomba in self._entries:
+                return
+            start = max(self.clock(), self._next_start)
+            self._next_start = start + self.stagger
+            self._push(roomba, start)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="roombapy-poller", daemon=True
+                )
+                self._thread.start()
+
+    def remove(self, roomba: Roomba) -> None:
+        """Stop polling a robot, a running poll is finished."""
+        with self._condition:
+            self._entries.pop(roomba, None)
+            self._condition.notify_all()
+
+    def reschedule(self, roomba: Roomba, delay: float) -> None:
+        """Poll a robot in ``delay`` seconds instead of when it was due.
+
+        A running poll schedules the next one when it is finished.
+        """
+        with self._condition:
+            if roomba in self._entries and roomba not in self._running:
+                self._push(roomba, self.clock() + delay)
+
+    def _push(self, roomba: Roomba, due: float) -> None:
+        sequence = next(self._sequence)
+        self._entries[roomba] = sequence
+        heapq.heappush(self._heap, (due, sequence, roomba))
+        self._condition.notify_all()
+
+    def _run(self) -> None:
+        with ThreadPoolExecutor(
+            max_workers=self.max_concurrent, thread_name_prefix="roombapy-poll"
+        ) as executor:
+            while (roomba := self._next()) is not None:
+                executor.submit(self._poll, roomba)
+
+    def _next(self) -> Roomba | None:
+        """Wait for the next robot due, None once no robot is left."""
+        with self._condition:
+            while self._entries:
+                heap = self._heap
+                while heap and self._entries.get(heap[0][2]) != heap[0][1]:
+                    heapq.heappop(heap)
+                if not heap or len(self._running) >= self.max_concurrent:
+                    # wait for a poll to finish
+                    self._condition.wait()
+                    continue
+                if heap[0][2] in self._running:
+                    # added again while polled, rescheduled when finished
+                    heapq.heappop(heap)
+                    continue
+                wait = heap[0][0] - self.clock()
+                if wait <= 0:
+                    roomba = heapq.heappop(heap)[2]
+                    self._running.add(roomba)
+                    return roomba
+                self._condition.wait(wait)
+            self._heap.clear()
+            self._thread = None
+            return None
+
+    def _poll(self, roomba: Roomba) -> None:
+        try:
+            delay = roomba.poll()
+        except Exception:
+            self.log.exception(
+                "Polling %s failed", roomba.remote_client.address
+            )
+            delay = roomba.delay
+        with self._condition:
+            self._running.discard(roomba)
+            if roomba in self._entries:
+                self._push(roomba, self.clock() + delay)
+            self._condition.notify_all()
+
+
+@cache
+def shared_poller() -> Poller:
+    """Return the poller shared by all periodic robots of the process."""
+    return Poller()
@@ -0,0 +1,185 @@
+"""Schedule reconnections of robots.
+
+All clients of a process share one scheduler by default. It delays the
+attempts of every robot with an exponential backoff and jitter, stops
+trying robots that keep failing (circuit breaker) and limits the rate of
+connection attempts of the whole process. When an access point reboots,
+the reconnections of a fleet are spread out instead of hitting the
+single-session MQTT servers of the robots at the same moment.
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, replace
+from enum import Enum
+from functools import cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from roombapy.const import TransportErrorMessage
+
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 300.0
+# a delay is shortened by up to this fraction at random
+JITTER = 0.5
+# consecutive failures which open the circuit
+FAILURE_THRESHOLD = 5
+# seconds an open circuit waits before a trial attempt
+RESET_TIMEOUT = 300.0
+# connection attempts per second of the whole process
+MAX_ATTEMPT_RATE = 5.0
+
+
+class CircuitState(Enum):
+    """State of the circuit breaker of a robot."""
+
+    CLOSED = "closed"  # attempts are allowed
+    OPEN = "open"  # attempts are refused until the reset timeout
+    HALF_OPEN = "half_open"  # a trial attempt is allowed
+
+
+@dataclass
+class RetryState:
+    """Reconnection state of a robot."""
+
+    attempts: int = 0
+    failures: int = 0  # consecutive failures since the last connection
+    last_error: TransportErrorMessage = None
+    circuit: CircuitState = CircuitState.CLOSED
+    # scheduler clock time before which no attempt is made
+    next_attempt: float = 0.0
+
+
+class ReconnectScheduler:
+    """Backoff, circuit breaker and rate limit for connection attempts.
+
+    Robots are identified by a key, usually their BLID. Clients call
+    :meth:`reserve` before every attempt and report the outcome with
+    :meth:`record_success` or :meth:`record_failure`.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        min_backoff: float = MIN_BACKOFF,
+        max_backoff: float = MAX_BACKOFF,
+        jitter: float = JITTER,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT,
+        max_attempt_rate: float = MAX_ATTEMPT_RATE,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the scheduler."""
+        self.log = logging.getLogger(__name__)
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_attempt_rate = max_attempt_rate
+        self.clock = clock
+        self._states: dict[str, RetryState] = {}
+        self._next_slot = 0.0
+        self._random = random.Random()  # noqa: S311
+        self._lock = threading.Lock()
+
+    def delay(self, key: str) -> float:
+        """Return the seconds until the robot may try to connect again."""
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                return 0.0
+            return max(0.0, state.next_attempt - self.clock())
+
+    def reserve(self, key: str) -> float | None:
+        """Reserve a connection attempt and return the seconds to wait.
+
+        Returns None while the circuit of the robot is open. Otherwise the
+        attempt is counted, and attempts which are due right away get a
+        slot of the process wide rate limit.
+        """
+        with self._lock:
+            now = self.clock()
+            state = self._states.setdefault(key, RetryState())
+            if state.circuit is CircuitState.OPEN:
+                if now < state.next_attempt:
+                    return None
+                state.circuit = CircuitState.HALF_OPEN
+                self.log.debug("Trying to reconnect %s after a pause", key)
+            slot = max(now, state.next_attempt)
+            if slot <= now:
+                # attempts which are due right away share the rate limit,
+                # delayed ones are already spread out by their jitter
+                slot = max(now, self._next_slot)
+                self._next_slot = slot + 1 / self.max_attempt_rate
+            state.attempts += 1
+            state.next_attempt = slot
+            return slot - now
+
+    def record_success(self, key: str) -> None:
+        """Record a connection."""
+        with self._lock:
+            state = self._states.setdefault(key, RetryState())
+            state.failures = 0
+            state.last_error = None
+            state.circuit = CircuitState.CLOSED
+            state.next_attempt = 0.0
+
+    def record_failure(
+        self, key: str, error: TransportErrorMessage = None
+    ) -> None:
+        """Record a failed connection attempt and schedule the next one."""
+        with self._lock:
+            now = self.clock()
+            state = self._states.setdefault(key, RetryState())
+            state.failures += 1
+            state.last_error = error
+            if (
+                state.circuit is CircuitState.HALF_OPEN
+                or state.failures >= self.failure_threshold
+            ):
+                if state.circuit is not CircuitState.OPEN:
+                    self.log.warning(
+                        "Pausing reconnections of %s for %ss after %s "
+                        "failures",
+                        key,
+                        self.reset_timeout,
+                        state.failures,
+                    )
+                state.circuit = CircuitState.OPEN
+                state.next_attempt = now + self.reset_timeout
+                return
+            state.next_attempt = now + self._backoff(state.failures)
+
+    def state(self, key: str) -> RetryState:
+        """Return a copy of the reconnection state of a robot."""
+        with self._lock:
+            return replace(self._states.get(key) or RetryState())
+
+    def states(self) -> dict[str, RetryState]:
+        """Return copies of the reconnection states of all robots."""
+        with self._lock:
+            return {key: replace(state) for key, state in self._states.items()}
+
+    def forget(self, key: str) -> None:
+        """Remove the reconnection state of a robot."""
+        with self._lock:
+            self._states.pop(key, None)
+
+    def _backoff(self, failures: int) -> float:
+        backoff = min(
+            self.max_backoff, self.min_backoff * 2.0 ** (failures - 1)
+        )
+        return backoff * (1 - self.jitter * self._random.random())
+
+
+@cache
+def shared_scheduler() -> ReconnectScheduler:
+    """Return the scheduler shared by all clients of the process."""
+    return ReconnectScheduler()
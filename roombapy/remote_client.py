@@ -2,13 +2,18 @@
 
 import logging
 import ssl
-from collections.abc import Callable
+import time
+from collections.abc import Callable, Iterable
 from functools import cache
 from typing import Any
 
 import paho.mqtt.client as mqtt
 
 from roombapy.const import MQTT_ERROR_MESSAGES, TransportErrorMessage
+from roombapy.metrics import shared_metrics
+from roombapy.reconnect import ReconnectScheduler, shared_scheduler
+from roombapy.timer import shared_timer
+from roombapy.tls import ResumingSSLContext, TimedSSLSocket
 
 MAX_CONNECTION_RETRIES = 3
 
@@ -23,12 +28,13 @@ OnSubscribe = Callable[[mqtt.Client, UserData, int, tuple[int]], object]
 
 
 @cache
-def generate_tls_context() -> ssl.SSLContext:
+def generate_tls_context() -> ResumingSSLContext:
     """Generate TLS context.
 
-    We only want to do this once ever because it's expensive.
+    We only want to do this once ever because it's expensive. The context
+    resumes the last TLS session of every robot, see :mod:`roombapy.tls`.
     """
-    ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS)
+    ssl_context = ResumingSSLContext(ssl.PROTOCOL_TLS)
     ssl_context.verify_mode = ssl.CERT_NONE
     ssl_context.set_ciphers("DEFAULT:!DH")
     ssl_context.load_default_certs()
@@ -46,18 +52,35 @@ class RoombaRemoteClient:
     password: str
     log: logging.Logger
     was_connected: bool = False
+    # seconds the TLS handshake of the last connection took
+    tls_handshake_seconds: float | None = None
+    # whether the last connection resumed a TLS session
+    tls_session_reused: bool = False
     on_connect: ConnectionCallback
     on_disconnect: ConnectionCallback
 
     def __init__(
-        self, address: str, blid: str, password: str, port: int = 8883
+        self,
+        address: str,
+        blid: str,
+        password: str,
+        port: int = 8883,
+        scheduler: ReconnectScheduler | None = None,
     ) -> None:
-        """Initialize the Roomba remote client."""
+        """Initialize the Roomba remote client.
+
+        Without a ``scheduler`` connection attempts are scheduled by the
+        scheduler shared by all clients of the process.
+        """
         self.address = address
         self.blid = blid
         self.password = password
         self.port = port
+        self.scheduler = scheduler or shared_scheduler()
+        self.metrics = shared_metrics().robot(blid)
         self.log = logging.getLogger(__name__)
+        # whether a dropped connection is reconnected, until disconnect()
+        self.keep_connected = False
         self.mqtt_client = self._get_mqtt_client()
 
     def set_on_message(self, on_message: OnMessage) -> None:
@@ -81,37 +104,103 @@ class RoombaRemoteClient:
         self.on_disconnect = on_disconnect
 
     def connect(self) -> bool:
-        """Connect to the Roomba."""
-        attempt = 1
-        while attempt <= MAX_CONNECTION_RETRIES:
+        """Connect to the Roomba.
+
+        Attempts wait for the reconnect scheduler, which backs off after
+        failures. No attempt is made while the robot is paused after
+        repeated failures. Once connected, a dropped connection is
+        reconnected by the shared timer whenever the scheduler allows an
+        attempt, until :meth:`disconnect` is called.
+        """
+        self.keep_connected = True
+        return self._connect()
+
+    def disconnect(self) -> None:
+        """Disconnect from the Roomba."""
+        self.keep_connected = False
+        self.mqtt_client.disconnect()
+
+    def connect_once(self) -> bool:
+        """Make a single connection attempt, if one is due right now.
+
+        Unlike :meth:`connect` this never waits: no attempt is made while
+        the scheduler backs off, while the robot is paused, or when the
+        next free slot of the rate limit is later. ``scheduler.delay()``
+        tells when to try again.
+        """
+        self.keep_connected = True
+        if self.scheduler.delay(self.blid) > 0:
+            return False
+        delay = self.scheduler.reserve(self.blid)
+        if delay is None or delay > 0:
+            return False
+        return self._attempt()
+
+    def _connect(self) -> bool:
+        for attempt in range(1, MAX_CONNECTION_RETRIES + 1):
+            delay = self.scheduler.reserve(self.blid)
+            if delay is None:
+                self.log.debug("Reconnections of %s are paused", self.address)
+                return False
+            time.sleep(delay)
+            if not self.keep_connected:
+                return False
             self.log.info(
                 "Connecting to %s, attempt %s of %s",
                 self.address,
                 attempt,
                 MAX_CONNECTION_RETRIES,
             )
-            try:
-                self._open_mqtt_connection()
-            except OSError:
-                self.log.exception("Can't connect to %s", self.address)
-            else:
+            if self._attempt():
                 return True
-            attempt += 1
 
         self.log.debug("Unable to connect to %s", self.address)
         return False
 
-    def disconnect(self) -> None:
-        """Disconnect from the Roomba."""
-        self.mqtt_client.disconnect()
+    def _attempt(self) -> bool:
+        self.metrics.record_connect_attempt()
+        try:
+            self._open_mqtt_connection()
+        except OSError as error:
+            self.log.exception("Can't connect to %s", self.address)
+            self.metrics.record_connect_failure()
+            self.scheduler.record_failure(self.blid, str(error))
+            return False
+        self._record_handshake()
+        return True
 
-    def subscribe(self, topic: str) -> None:
-        """Subscribe to a topic."""
-        self.mqtt_client.subscribe(topic)
+    def _reconnect_after_drop(self) -> None:
+        # paho doesn't reconnect on its own, attempts are made from the
+        # shared timer when the scheduler allows them
+        shared_timer().call_later(
+            self.scheduler.delay(self.blid), self._reconnect
+        )
 
-    def publish(self, topic: str, payload: str) -> None:
-        """Publish a message to a topic."""
-        self.mqtt_client.publish(topic, payload)
+    def _reconnect(self) -> None:
+        if not self.keep_connected or self.connect_once():
+            return
+        shared_timer().call_later(
+            self.scheduler.delay(self.blid), self._reconnect
+        )
+
+    def subscribe(
+        self, topics: str | Iterable[tuple[str, int]], qos: int = 0
+    ) -> None:
+        """Subscribe to a topic, or to (topic, QoS) pairs at once."""
+        if isinstance(topics, str):
+            self.mqtt_client.subscribe(topics, qos)
+        else:
+            self.mqtt_client.subscribe(list(topics))
+
+    def publish(
+        self, topic: str, payload: str | bytes
+    ) -> mqtt.MQTTMessageInfo:
+        """Publish a message to a topic.
+
+        The returned info tells whether paho queued the message, and its
+        message ID, which is passed to the on publish callback.
+        """
+        return self.mqtt_client.publish(topic, payload)
 
     def _open_mqtt_connection(self) -> None:
         if not self.was_connected:
@@ -122,8 +211,29 @@ class RoombaRemoteClient:
             self.mqtt_client.reconnect()
         self.mqtt_client.loop_start()
 
+    def _record_handshake(self) -> None:
+        sock = self.mqtt_client.socket()
+        if not isinstance(sock, TimedSSLSocket):
+            return
+        if sock.handshake_seconds is None:
+            return
+        self.tls_handshake_seconds = sock.handshake_seconds
+        self.tls_session_reused = sock.resumed
+        self.metrics.record_handshake(
+            sock.handshake_seconds, resumed=self.tls_session_reused
+        )
+        self.log.debug(
+            "TLS handshake with %s took %.3fs, session %s",
+            self.address,
+            sock.handshake_seconds,
+            "resumed" if self.tls_session_reused else "new",
+        )
+
     def _get_mqtt_client(self) -> mqtt.Client:
-        mqtt_client = mqtt.Client(client_id=self.blid)
+        # dropped connections are reconnected through the scheduler
+        mqtt_client = mqtt.Client(
+            client_id=self.blid, reconnect_on_failure=False
+        )
         mqtt_client.username_pw_set(username=self.blid, password=self.password)
         mqtt_client.on_connect = self._internal_on_connect
         mqtt_client.on_disconnect = self._internal_on_disconnect
@@ -156,6 +266,11 @@ class RoombaRemoteClient:
                 reason_code,
             )
             connection_error = "UNKNOWN_ERROR"
+        if connection_error is None:
+            self.scheduler.record_success(self.blid)
+        else:
+            self.metrics.record_connect_failure()
+            self.scheduler.record_failure(self.blid, connection_error)
         if self.on_connect is not None:
             self.on_connect(connection_error)
 
@@ -176,5 +291,8 @@ class RoombaRemoteClient:
                 reason_code,
             )
             connection_error = "UNKNOWN_ERROR"
+        self.metrics.record_disconnect(connection_error)
         if self.on_disconnect is not None:
             self.on_disconnect(connection_error)
+        if reason_code != 0 and self.keep_connected:
+            self._reconnect_after_drop()
@@ -15,15 +15,22 @@ outlines if you don't have OpenCV
 from __future__ import annotations
 
 import logging
-import threading
 import time
-from collections.abc import Callable, Mapping
-from datetime import datetime
+from collections.abc import Callable, Iterable
 from typing import TYPE_CHECKING, Any
 
 import orjson
 
+from roombapy.command_queue import (
+    CommandHandle,
+    CommandQueue,
+    PreparedCommand,
+    call_later_shared,
+    prepare_command,
+)
 from roombapy.const import (
+    COMMAND_PHASES,
+    MISSION_PHASES,
     MQTT_ERROR_MESSAGES,
     ROOMBA_ERROR_MESSAGES,
     ROOMBA_STATES,
@@ -32,9 +39,28 @@ from roombapy.const import (
     State,
     TransportErrorMessage,
 )
+from roombapy.dispatcher import Dispatcher
+from roombapy.poller import POLL_QUIET, PollWindow, shared_poller
+from roombapy.snapshot import MAX_AGE as SNAPSHOT_MAX_AGE
+from roombapy.snapshot import restore_snapshot, save_snapshot
+from roombapy.state import (
+    MISSING,
+    FlatKey,
+    PathMatcher,
+    StateChange,
+    StateIndex,
+    flatten,
+    merge,
+)
+from roombapy.state_machine import TransitionKey, next_state
+from roombapy.state_model import RoombaState
+from roombapy.subscription import ALL_TOPICS, MessageFilter, Subscription
+from roombapy.trace import TRACE_SIZE, MessageTracer
 
 if TYPE_CHECKING:
-    from paho.mqtt.client import Client, MQTTMessage
+    from pathlib import Path
+
+    from paho.mqtt.client import Client, MQTTMessage, MQTTMessageInfo
 
     from roombapy.remote_client import RoombaRemoteClient
 
@@ -43,6 +69,8 @@ MAX_CONNECTION_RETRIES = 3
 RoombaMessage = dict[str, Any]  # For now it's untyped
 MessageCallback = Callable[[RoombaMessage], None]
 ErrorCallback = Callable[[TransportErrorMessage], None]
+ChangeCallback = Callable[[list[StateChange]], None]
+StateCallback = Callable[[State, State], None]
 RobotPreference = (
     str | int | dict[str, int]
 )  # Different settings that robots accept
@@ -79,6 +107,8 @@ class Roomba:
 
         self.remote_client = remote_client
         self._init_remote_client_callbacks()
+        # shared with the remote client
+        self.metrics = remote_client.metrics
         self.continuous = continuous
         if self.continuous:
             self.log.debug("CONTINUOUS connection")
@@ -87,35 +117,89 @@ class Roomba:
 
         self.stop_connection = False
         self.periodic_connection_running = False
-        self.topic = "#"
+        self.topic = ALL_TOPICS
         self.exclude = ""
+        # subscribed on connect, ``topic`` is subscribed without any
+        self.subscriptions: list[Subscription] = []
+        # rejects messages before they are decoded
+        self.message_filter: MessageFilter | None = None
         self.delay = delay
+        # seconds a poll waits at most for the reported state
         self.periodic_connection_duration = 10
+        # seconds without messages after which a poll is complete
+        self.poll_quiet = POLL_QUIET
+        # seconds between polls during a mission, ``delay`` if None
+        self.mission_delay: float | None = None
+        # polls periodic robots, see poll()
+        self.poller = shared_poller()
+        self._poll_window: PollWindow | None = None
+        self._poll_failing = False
         self.roomba_connected = False
-        self.indent = 0
-        self.master_indent = 0
+        # traces the raw messages while debugging, see enable_trace()
+        self.tracer: MessageTracer | None = None
         self.co_ords = {"x": 0, "y": 0, "theta": 180}
         self.cleanMissionStatus_phase = ""
         self.previous_cleanMissionStatus_phase = ""
         self.current_state: State = None
+        self._settled_state: TransitionKey | None = None
         self.bin_full = False
         # all info from roomba stored here
         self.master_state: RoombaMessage = {}
+        # flattened view of master_state, reading the values in place
+        self.state_index = StateIndex(self.master_state)
+        # typed view of the frequently used reported values
+        self.state = RoombaState()
         self.time = time.time()
         self.update_seconds = 300  # update with all values every 5 minutes
-        self._thread = threading.Thread(
-            target=self.periodic_connection, name="roombapy"
-        )
         self.on_message_callbacks: list[MessageCallback] = []
+        # calls the message callbacks, right away by default
+        self.dispatcher = Dispatcher()
+        self.on_connect_callbacks: list[ErrorCallback] = []
         self.on_disconnect_callbacks: list[ErrorCallback] = []
+        self.on_change_callbacks: list[tuple[PathMatcher, ChangeCallback]] = []
+        self.on_state_callbacks: list[StateCallback] = []
+        # commands wait here while the robot is offline
+        self.commands = CommandQueue(
+            self._publish, call_later=self._call_later
+        )
         self.error_code: ErrorCode | None = None
         self.error_message: ErrorMessage | None = None
         self.client_error: str | None = None
 
     def register_on_message_callback(self, callback: MessageCallback) -> None:
-        """Register a function to be called when a message is received."""
+        """Register a function to be called when a message is received.
+
+        The function is called by ``dispatcher``, which calls it right away
+        on the network thread unless another dispatcher is set.
+        """
         self.on_message_callbacks.append(callback)
 
+    def register_on_change_callback(
+        self, path_glob: str, callback: ChangeCallback
+    ) -> None:
+        """Register a function to be called when matching values change.
+
+        ``path_glob`` is matched against the flattened keys of the state,
+        e.g. ``"cleanMissionStatus_*"`` or ``"pose_*"``. The callback gets
+        the list of matching changes once per message.
+        """
+        self.on_change_callbacks.append((PathMatcher(path_glob), callback))
+
+    def register_on_state_callback(self, callback: StateCallback) -> None:
+        """Register a function to be called when the state machine moves.
+
+        The callback gets the previous and the new state, e.g.
+        ``"Charging", "New Mission"``.
+        """
+        self.on_state_callbacks.append(callback)
+
+    def register_on_connect_callback(self, callback: ErrorCallback) -> None:
+        """Register a function to be called when a connection is answered.
+
+        The callback gets the connection error, or None on success.
+        """
+        self.on_connect_callbacks.append(callback)
+
     def register_on_disconnect_callback(self, callback: ErrorCallback) -> None:
         """Register a function to be called when a disconnect occurs."""
         self.on_disconnect_callbacks.append(callback)
@@ -125,6 +209,7 @@ class Roomba:
         self.remote_client.set_on_message(self.on_message)
         self.remote_client.set_on_connect(self.on_connect)
         self.remote_client.set_on_disconnect(self.on_disconnect)
+        self.remote_client.set_on_publish(self.on_publish)
 
     def connect(self) -> None:
         """Connect to the Roomba."""
@@ -134,8 +219,9 @@ class Roomba:
         if self.continuous:
             self._connect()
         else:
-            self._thread.daemon = True
-            self._thread.start()
+            self.stop_connection = False
+            self.periodic_connection_running = True
+            self.poller.add(self)
 
         self.time = time.time()  # save connection time
 
@@ -154,25 +240,80 @@ class Roomba:
             self.remote_client.disconnect()
         else:
             self.stop_connection = True
+            self.poller.remove(self)
+            if (window := self._poll_window) is not None:
+                window.cancel()
+            self.periodic_connection_running = False
 
     def periodic_connection(self) -> None:
-        """Periodic connection to the Roomba."""
-        # only one connection thread at a time!
-        if self.periodic_connection_running:
-            return
-        self.periodic_connection_running = True
+        """Poll the Roomba from the calling thread until disconnected.
+
+        Periodic robots are polled by ``poller`` once connected, this runs
+        the same polls on a thread of the caller instead.
+        """
+        self.stop_connection = False
         while not self.stop_connection:
-            try:
-                self._connect()
-            except RoombaConnectionError as error:
-                self.periodic_connection_running = False
-                self.on_disconnect(MQTT_ERROR_MESSAGES[7])
-                self.log.debug("Periodic connection lost due to %s", error)
-                return
-            time.sleep(self.delay)
+            self._sleep(self.poll())
 
-        self.remote_client.disconnect()
-        self.periodic_connection_running = False
+    def poll(self) -> float:
+        """Connect, wait for the reported state and disconnect again.
+
+        The state is complete once no message arrived for ``poll_quiet``
+        seconds, the connection is closed after
+        ``periodic_connection_duration`` seconds anyway. Returns the
+        seconds until the robot should be polled again; when the
+        connection can't be made, that's when the reconnect scheduler
+        allows the next attempt.
+        """
+        scheduler = self.remote_client.scheduler
+        blid = self.remote_client.blid
+        window = PollWindow(self.poll_quiet)
+        self._poll_window = window
+        try:
+            # a single attempt, the poller retries when the scheduler is
+            # ready instead of blocking a worker
+            if not self.remote_client.connect_once():
+                self.log.debug(
+                    "Can't poll Roomba %s", self.remote_client.address
+                )
+                if scheduler.state(blid).failures and not self._poll_failing:
+                    # report the connection loss once per failure streak
+                    self._poll_failing = True
+                    self.on_disconnect(MQTT_ERROR_MESSAGES[7])
+                return scheduler.delay(blid) or self.poll_interval()
+            self._poll_failing = False
+            if not window.wait(self.periodic_connection_duration):
+                self.log.debug(
+                    "Roomba %s didn't report its state in %ss",
+                    self.remote_client.address,
+                    self.periodic_connection_duration,
+                )
+            self.remote_client.disconnect()
+        finally:
+            self._poll_window = None
+        return self.poll_interval()
+
+    def poll_interval(self) -> float:
+        """Return the seconds between polls in the current phase.
+
+        Robots on a mission are polled every ``mission_delay`` seconds if
+        it is set, and every ``delay`` seconds otherwise.
+        """
+        if (
+            self.mission_delay is not None
+            and self.cleanMissionStatus_phase in MISSION_PHASES
+        ):
+            return self.mission_delay
+        return self.delay
+
+    def _sleep(self, seconds: float) -> None:
+        """Sleep, waking up early when the connection is stopped."""
+        deadline = time.monotonic() + seconds
+        while not self.stop_connection:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 1))
 
     def on_connect(self, error: TransportErrorMessage) -> None:
         """On connect callback."""
@@ -184,15 +325,22 @@ class Roomba:
                 self.remote_client.address,
                 error,
             )
-            return
+        else:
+            self.roomba_connected = True
+            self.remote_client.subscribe(
+                self.subscriptions or [Subscription(self.topic)]
+            )
+            self.commands.resume()
 
-        self.roomba_connected = True
-        self.remote_client.subscribe(self.topic)
+        # call the callback functions
+        for callback in self.on_connect_callbacks:
+            callback(error)
 
     def on_disconnect(self, error: TransportErrorMessage) -> None:
         """On disconnect callback."""
         self.roomba_connected = False
         self.client_error = error
+        self.commands.pause()
         if error is not None:
             self.log.warning(
                 "Unexpectedly disconnected from Roomba %s, code %s",
@@ -210,66 +358,145 @@ class Roomba:
             "Disconnected from Roomba %s", self.remote_client.address
         )
 
+    def enable_trace(
+        self, size: int = TRACE_SIZE, *, log_every: int = 0
+    ) -> MessageTracer:
+        """Keep the last ``size`` raw messages, and log every n-th one.
+
+        Returns the tracer, whose ``dump()`` and ``write()`` return the
+        traced messages.
+        """
+        self.tracer = MessageTracer(size, log_every=log_every, logger=self.log)
+        return self.tracer
+
+    def disable_trace(self) -> None:
+        """Stop tracing messages."""
+        self.tracer = None
+
+    def on_publish(self, _client: Client, _userdata: Any, mid: int) -> None:
+        """On publish callback."""
+        self.commands.on_publish(mid)
+
     def on_message(
         self, _client: Client, _userdata: Any, msg: MQTTMessage
     ) -> None:
         """On message callback."""
-        if self.exclude != "" and self.exclude in msg.topic:
+        topic = msg.topic
+        if self.exclude != "" and self.exclude in topic:
+            return
+        if self.message_filter is not None and not self.message_filter(
+            topic, msg.payload
+        ):
             return
 
-        if self.indent == 0:
-            self.master_indent = max(self.master_indent, len(msg.topic))
+        if self.tracer is not None:
+            self.tracer.record(topic, msg.payload)
 
-        decoded_message = _decode_payload(msg.payload)
         client_ip = self.remote_client.address
-
+        start = time.perf_counter()
+        decoded_message = _decode_payload(msg.payload)
         if decoded_message is None:
+            self.metrics.record_malformed()
             self.log.warning(
                 "Got malformed message from %s: %s", client_ip, msg
             )
             return
+        decoded = time.perf_counter()
+        pose = _pose_delta(decoded_message)
+        changes = (
+            None if pose is None else _merge_pose(self.master_state, pose)
+        )
+        if changes is None:
+            changes = self.dict_merge(self.master_state, decoded_message)
 
-        self.dict_merge(self.master_state, decoded_message)
-        self.log.debug("Received message from %s: %s", client_ip, msg)
-        self.decode_topics(decoded_message)
+        self.apply_changes(changes)
 
         # default every 5 minutes
         if time.time() - self.time > self.update_seconds:
             self.log.debug("Publishing master_state %s", client_ip)
-            self.decode_topics(self.master_state)  # publish all values
+            self._decode_items(self.state_index.items())  # publish all values
             self.time = time.time()
 
-        # call the callback functions
-        for callback in self.on_message_callbacks:
-            callback(decoded_message)
+        self.update_state_machine()
+
+        if self.commands.confirming:
+            self.commands.check_confirmations()
+
+        if changes:
+            for matcher, change_callback in self.on_change_callbacks:
+                if matched := [c for c in changes if matcher(c.path)]:
+                    change_callback(matched)
+
+        merged = time.perf_counter()
+        if self.on_message_callbacks:
+            # call the callback functions
+            for callback in self.on_message_callbacks:
+                self.dispatcher.dispatch(
+                    callback, decoded_message, self.remote_client.blid
+                )
+        self.metrics.record_message(
+            decoded - start, merged - decoded, time.perf_counter() - merged
+        )
+        if self._poll_window is not None:
+            self._poll_window.received()
+
+    def apply_changes(self, changes: list[StateChange]) -> None:
+        """Update the values derived from the state."""
+        self.state.apply(changes)
+        self._decode_items(
+            (change.path, change.new)
+            for change in changes
+            if change.new is not MISSING
+        )
+
+    def save_snapshot(self, path: Path | str) -> None:
+        """Save the state, see :func:`roombapy.snapshot.save_snapshot`."""
+        save_snapshot(self, path)
+
+    def restore_snapshot(
+        self, path: Path | str, *, max_age: float = SNAPSHOT_MAX_AGE
+    ) -> bool:
+        """Restore the state saved by :meth:`save_snapshot`.
+
+        Snapshots older than ``max_age`` seconds are ignored. Returns
+        whether the snapshot was restored.
+        """
+        return restore_snapshot(self, path, max_age=max_age)
 
     def send_command(
         self, command: str, params: dict[str, Any] | None = None
-    ) -> None:
-        """Send a command to the Roomba."""
-        if params is None:
-            params = {}
-
-        self.log.debug("Send command: %s", command)
-        roomba_command = {
-            "command": command,
-            "time": int(datetime.timestamp(datetime.now())),
-            "initiator": "localApp",
-        }
-        roomba_command.update(params)
+    ) -> CommandHandle:
+        """Send a command to the Roomba.
 
-        # params may contain non-string keys, so we need to use the orjson
-        # OPT_NON_STR_KEYS option
-        str_command = orjson.dumps(
-            roomba_command, option=orjson.OPT_NON_STR_KEYS
-        ).decode("utf-8")
-        self.log.debug("Publishing Roomba Command : %s", str_command)
-        self.remote_client.publish("cmd", str_command)
+        Commands are queued while the Roomba is offline and sent no faster
+        than ``commands.max_rate``. The returned handle is confirmed when
+        the Roomba reports the mission phase the command leads to, or for
+        other commands when it reports the command as its last one.
+        """
+        return self.send_prepared(prepare_command(command, params))
+
+    def send_prepared(self, command: PreparedCommand) -> CommandHandle:
+        """Send a command built by :func:`prepare_command`.
+
+        The command is published as it was serialized, see
+        :meth:`send_command`.
+        """
+        self.log.debug("Send command: %s", command.command)
+        return self.commands.put_command(
+            command,
+            CommandHandle(
+                self._command_confirmation(command.command, command.time)
+            ),
+        )
 
     def set_preference(
         self, preference: str, setting: RobotPreference
-    ) -> None:
-        """Set a preference on the Roomba."""
+    ) -> CommandHandle:
+        """Set a preference on the Roomba.
+
+        Preferences set in a burst are merged into a single update. The
+        returned handle is confirmed when the Roomba reports the setting.
+        """
         self.log.debug("Set preference: %s, %s", preference, setting)
         val = setting
         # Parse boolean string
@@ -278,13 +505,49 @@ class Roomba:
                 val = True
             elif setting.lower() == "false":
                 val = False
-        tmp = {preference: val}
-        roomba_command = {"state": tmp}
-        str_command = orjson.dumps(roomba_command).decode("utf-8")
-        self.log.debug("Publishing Roomba Setting : %s", str_command)
-        self.remote_client.publish("delta", str_command)
+        expected = list(flatten({preference: val}))
+        return self.commands.put_preference(
+            preference,
+            val,
+            CommandHandle(
+                lambda: all(
+                    self.state_index.get(key, MISSING) == value
+                    for key, value in expected
+                )
+            ),
+        )
+
+    def _command_confirmation(
+        self, command: str, sent: int
+    ) -> Callable[[], bool]:
+        if (phases := COMMAND_PHASES.get(command)) is not None:
+            return lambda: self.state.mission.phase in phases
+
+        return lambda: (
+            self.state_index.get("lastCommand_command") == command
+            and self.state_index.get("lastCommand_time") == sent
+        )
 
-    def dict_merge(self, dct: RoombaMessage, merge_dct: RoombaMessage) -> None:
+    def _publish(
+        self, topic: str, document: dict[str, Any] | bytes
+    ) -> MQTTMessageInfo:
+        # params may contain non-string keys, so we need to use the orjson
+        # OPT_NON_STR_KEYS option
+        payload = (
+            document
+            if isinstance(document, bytes)
+            else orjson.dumps(document, option=orjson.OPT_NON_STR_KEYS)
+        )
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("Publishing to %s: %s", topic, payload.decode())
+        return self.remote_client.publish(topic, payload)
+
+    def _call_later(self, delay: float, callback: Callable[[], None]) -> None:
+        call_later_shared(delay, callback)
+
+    def dict_merge(
+        self, dct: RoombaMessage, merge_dct: RoombaMessage
+    ) -> list[StateChange]:
         """Recursive dict merge.
 
         Inspired by :meth:``dict.update()``, instead
@@ -292,83 +555,63 @@ class Roomba:
         nested to an arbitrary depth, updating keys. The ``merge_dct`` is
         merged into ``dct``.
 
+        Returns the flattened keys whose values actually changed, see
+        :func:`roombapy.state.merge`.
+
         TODO: Do not mutate arguments!
         """
-        for k in merge_dct:
-            if (
-                k in dct
-                and isinstance(dct[k], dict)
-                and isinstance(merge_dct[k], Mapping)
-            ):
-                self.dict_merge(dct[k], merge_dct[k])
-            else:
-                dct[k] = merge_dct[k]
+        return merge(dct, merge_dct)
 
     def decode_topics(
-        self, state: RoombaMessage, prefix: str | None = None
+        self, state: RoombaMessage | None = None, prefix: str | None = None
     ) -> None:
         """Decode json data dict and publish as individual topics.
 
-        Publish to brokerFeedback/topic the keys are concatenated with _
-        to make one unique topic name strings are expressively converted
-        to strings to avoid unicode representations
+        The keys are concatenated with _ to make one unique topic name.
+        Without ``state`` every value of the flattened state index is
+        published again.
         """
-        for key, value in state.items():
-            mutable_key = key
-            if isinstance(value, dict):
-                if prefix is None:
-                    self.decode_topics(value, key)
-                else:
-                    self.decode_topics(value, prefix + "_" + key)
-            else:
-                mutable_value = value
-                if isinstance(value, list):
-                    newlist = []
-                    for i in value:
-                        if isinstance(i, dict):
-                            for ki, vi in i.items():
-                                newlist.append((str(ki), vi))
-                        else:
-                            val = i
-                            if isinstance(i, str):
-                                val = str(i)
-                            newlist.append(val)
-                    mutable_value = newlist
-                if prefix is not None:
-                    mutable_key = prefix + "_" + key
-                # all data starts with this, so it's redundant
-                mutable_key = mutable_key.replace("state_reported_", "")
-                # save variables for drawing map
-                if mutable_key == "pose_theta":
-                    self.co_ords["theta"] = mutable_value
-                if mutable_key == "pose_point_x":  # x and y are reversed...
-                    self.co_ords["y"] = mutable_value
-                if mutable_key == "pose_point_y":
-                    self.co_ords["x"] = mutable_value
-                if mutable_key == "bin_full":
-                    self.bin_full = mutable_value
-                if mutable_key == "cleanMissionStatus_error":
-                    try:
-                        self.error_code = mutable_value
-                        self.error_message = ROOMBA_ERROR_MESSAGES[
-                            mutable_value
-                        ]
-                    except KeyError as e:
-                        self.log.warning(
-                            "Error looking up Roomba error message: %s", e
-                        )
-                        self.error_message = (
-                            f"Unknown Error number: {mutable_value}"
-                        )
-                if key == "cleanMissionStatus_phase":
-                    self.previous_cleanMissionStatus_phase = (
-                        self.cleanMissionStatus_phase
-                    )
-                    self.cleanMissionStatus_phase = mutable_value
-
+        if state is None:
+            self._decode_items(self.state_index.items())
+        else:
+            self._decode_items(flatten(state, prefix or ""))
         if prefix is None:
             self.update_state_machine()
 
+    def _decode_items(self, items: Iterable[tuple[FlatKey, Any]]) -> None:
+        """Update the tracked values from flattened key/value pairs."""
+        for key, value in items:
+            # save variables for drawing map
+            if key == "pose_theta":
+                self.co_ords["theta"] = value
+            elif key == "pose_point_x":  # x and y are reversed...
+                self.co_ords["y"] = value
+            elif key == "pose_point_y":
+                self.co_ords["x"] = value
+            elif key == "bin_full":
+                self.bin_full = value
+            elif key == "cleanMissionStatus_error":
+                try:
+                    self.error_code = value
+                    self.error_message = ROOMBA_ERROR_MESSAGES[value]
+                except KeyError as e:
+                    self.log.warning(
+                        "Error looking up Roomba error message: %s", e
+                    )
+                    self.error_message = f"Unknown Error number: {value}"
+            elif key == "cleanMissionStatus_phase":
+                self.previous_cleanMissionStatus_phase = (
+                    self.cleanMissionStatus_phase
+                )
+                self.cleanMissionStatus_phase = value
+
+    def reset_state_machine(self) -> None:
+        """Evaluate the state machine again with the next message.
+
+        Call this after setting the state or the phases directly.
+        """
+        self._settled_state = None
+
     def update_state_machine(self, new_state: State = None) -> None:
         """Roomba progresses through states (phases).
 
@@ -385,90 +628,25 @@ class Roomba:
                 stuck - > charge = init map
         Assume hmPostMsn -> charge = end of mission (finalize map)
         Anything else = continue with existing map
-        """
-        current_mission = self.current_state
-
-        try:
-            if (
-                self.master_state["state"]["reported"]["cleanMissionStatus"][
-                    "mssnM"
-                ]
-                == "none"
-                and self.cleanMissionStatus_phase == "charge"
-                and self.current_state
-                in (ROOMBA_STATES["pause"], ROOMBA_STATES["recharge"])
-            ):
-                self.current_state = ROOMBA_STATES["cancelled"]
-        except KeyError:
-            pass
 
-        if (
-            self.current_state == ROOMBA_STATES["charge"]
-            and self.cleanMissionStatus_phase == "run"
-        ):
-            self.current_state = ROOMBA_STATES["new"]
-        elif (
-            self.current_state == ROOMBA_STATES["run"]
-            and self.cleanMissionStatus_phase == "hmMidMsn"
-        ):
-            self.current_state = ROOMBA_STATES["dock"]
-        elif (
-            self.current_state == ROOMBA_STATES["dock"]
-            and self.cleanMissionStatus_phase == "charge"
-        ):
-            self.current_state = ROOMBA_STATES["recharge"]
-        elif (
-            self.current_state == ROOMBA_STATES["recharge"]
-            and self.cleanMissionStatus_phase == "charge"
-            and self.bin_full
-        ):
-            self.current_state = ROOMBA_STATES["pause"]
-        elif (
-            self.current_state == ROOMBA_STATES["run"]
-            and self.cleanMissionStatus_phase == "charge"
-        ):
-            self.current_state = ROOMBA_STATES["recharge"]
-        elif (
-            self.current_state == ROOMBA_STATES["recharge"]
-            and self.cleanMissionStatus_phase == "run"
-        ):
-            self.current_state = ROOMBA_STATES["pause"]
-        elif (
-            self.current_state == ROOMBA_STATES["pause"]
-            and self.cleanMissionStatus_phase == "charge"
-        ):
-            self.current_state = ROOMBA_STATES["pause"]
-            # so that we will draw map and can update recharge time
-            current_mission = None
-        elif (
-            self.current_state == ROOMBA_STATES["charge"]
-            and self.cleanMissionStatus_phase == "charge"
-        ):
-            # so that we will draw map and can update charge status
-            current_mission = None
-        elif (
-            self.current_state
-            in (ROOMBA_STATES["stop"], ROOMBA_STATES["pause"])
-        ) and self.cleanMissionStatus_phase == "hmUsrDock":
-            self.current_state = ROOMBA_STATES["cancelled"]
-        elif (
-            (
-                self.current_state
-                in (ROOMBA_STATES["hmUsrDock"], ROOMBA_STATES["cancelled"])
-            )
-            and self.cleanMissionStatus_phase == "charge"
-        ) or (
-            self.current_state == ROOMBA_STATES["hmPostMsn"]
-            and self.cleanMissionStatus_phase == "charge"
-        ):
-            self.current_state = ROOMBA_STATES["dockend"]
-        elif (
-            self.current_state == ROOMBA_STATES["dockend"]
-            and self.cleanMissionStatus_phase == "charge"
-        ):
-            self.current_state = ROOMBA_STATES["charge"]
+        The transitions are looked up in
+        :data:`roombapy.state_machine.TRANSITIONS`, and nothing is evaluated
+        while the state is settled and none of the inputs changed.
+        """
+        key = (
+            self.current_state,
+            self.cleanMissionStatus_phase,
+            bool(self.bin_full),
+            self.state.mission.mssn_m == "none",
+        )
+        if new_state is None and key == self._settled_state:
+            return
 
-        elif self.cleanMissionStatus_phase not in ROOMBA_STATES:
+        previous_state = self.current_state
+        transition = next_state(
+            key[0], key[1], bin_full=key[2], mission_none=key[3]
+        )
+        if transition is None:
             self.log.error(
                 "Can't find state %s in predefined Roomba states, "
                 "please create a new issue: "
@@ -477,22 +655,32 @@ class Roomba:
             )
             self.current_state = None
         else:
-            self.current_state = ROOMBA_STATES[self.cleanMissionStatus_phase]
+            self.current_state = transition.state
 
         if new_state is not None:
             self.current_state = ROOMBA_STATES[new_state]
             self.log.debug("Current state: %s", self.current_state)
 
-        if self.current_state != current_mission:
+        # the same inputs would lead to the same state again
+        self._settled_state = (
+            key if self.current_state == previous_state else None
+        )
+        if self.current_state != previous_state or (
+            transition is not None and transition.refresh
+        ):
             self.log.debug("State updated to: %s", self.current_state)
 
+        if self.current_state != previous_state:
+            for callback in self.on_state_callbacks:
+                callback(previous_state, self.current_state)
 
-def _decode_payload(raw_payload: bytes) -> RoombaMessage | None:
+
+def _decode_payload(
+    raw_payload: bytes | bytearray | memoryview,
+) -> RoombaMessage | None:
+    # orjson parses the payload buffer directly and validates UTF-8 itself
     try:
-        payload = raw_payload.decode()
-        message = orjson.loads(payload)
-    except UnicodeDecodeError:
-        return None
+        message = orjson.loads(raw_payload)
     except orjson.JSONDecodeError:
         return None
 
@@ -500,3 +688,69 @@ def _decode_payload(raw_payload: bytes) -> RoombaMessage | None:
         return None
 
     return message
+
+
+# pose only deltas arrive several times a second while cleaning, so they
+# are merged in place instead of walking the whole message
+Pose = tuple[int, int, int]  # theta, x, y
+
+
+def _pose_delta(message: RoombaMessage) -> Pose | None:
+    """Return the pose of a message which only reports the pose.
+
+    Other messages are rejected by the keys of their first levels, before
+    any of their values are looked at.
+    """
+    state = message.get("state")
+    if type(state) is not dict or len(message) != 1 or len(state) != 1:
+        return None
+    reported = state.get("reported")
+    if type(reported) is not dict or len(reported) != 1:
+        return None
+    pose = reported.get("pose")
+    if type(pose) is not dict or len(pose) != 2:
+        return None
+    try:
+        point = pose["point"]
+        theta, x, y = pose["theta"], point["x"], point["y"]
+    except (KeyError, TypeError):
+        return None
+    if (
+        len(point) == 2
+        and type(theta) is int
+        and type(x) is int
+        and type(y) is int
+    ):
+        return theta, x, y
+    return None
+
+
+def _merge_pose(state: RoombaMessage, pose: Pose) -> list[StateChange] | None:
+    """Merge a pose delta like :func:`merge` does.
+
+    Returns ``None`` without changing anything, if the state doesn't have
+    a pose of the usual shape yet.
+    """
+    try:
+        current = state["state"]["reported"]["pose"]
+        point = current["point"]
+    except (KeyError, TypeError):
+        return None
+    if not isinstance(current, dict) or not isinstance(point, dict):
+        return None
+    leaves = (
+        (current, "theta", "pose_theta"),
+        (point, "x", "pose_point_x"),
+        (point, "y", "pose_point_y"),
+    )
+    if any(isinstance(parent.get(key), dict) for parent, key, _ in leaves):
+        return None
+
+    changes = []
+    for (parent, key, path), value in zip(leaves, pose, strict=True):
+        old = parent.get(key, MISSING)
+        if type(old) is int and old == value:
+            continue
+        changes.append(StateChange(path, old, value))
+        parent[key] = value
+    return changes
@@ -1,29 +1,61 @@
 """Factory class to create Roomba class to control your robot."""
 
-from roombapy import Roomba
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from roombapy.async_remote_client import AsyncRoombaRemoteClient
+from roombapy.async_roomba import AsyncRoomba
 from roombapy.remote_client import RoombaRemoteClient
+from roombapy.roomba import Roomba
+
+if TYPE_CHECKING:
+    from roombapy.reconnect import ReconnectScheduler
 
 
 class RoombaFactory:
     """Allows you to create Roomba class to control your robot."""
 
     @staticmethod
-    def create_roomba(
+    def create_roomba(  # noqa: PLR0913
         address: str,
         blid: str,
         password: str,
         *,
         continuous: bool = True,
         delay: int = 1,
+        scheduler: ReconnectScheduler | None = None,
     ) -> Roomba:
         """Create a Roomba instance."""
-        remote_client = _create_remote_client(address, blid, password)
+        remote_client = _create_remote_client(
+            address, blid, password, scheduler
+        )
         return Roomba(remote_client, continuous=continuous, delay=delay)
 
+    @staticmethod
+    def create_async_roomba(
+        address: str,
+        blid: str,
+        password: str,
+        *,
+        scheduler: ReconnectScheduler | None = None,
+    ) -> AsyncRoomba:
+        """Create an AsyncRoomba instance."""
+        remote_client = AsyncRoombaRemoteClient(
+            address=address,
+            blid=blid,
+            password=password,
+            scheduler=scheduler,
+        )
+        return AsyncRoomba(remote_client)
+
 
 def _create_remote_client(
     address: str,
     blid: str,
     password: str,
+    scheduler: ReconnectScheduler | None,
 ) -> RoombaRemoteClient:
-    return RoombaRemoteClient(address=address, blid=blid, password=password)
+    return RoombaRemoteClient(
+        address=address, blid=blid, password=password, scheduler=scheduler
+    )
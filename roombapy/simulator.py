@@ -0,0 +1,577 @@
+"""Simulated Roombas for load testing without real robots.
+
+The simulator speaks the local dialect of the robots:
+
+* MQTT 3.1.1 over TLS on port 8883, with the BLID as username and client id.
+  The robot publishes its reported state on ``$aws/things/<blid>/shadow/*``
+  topics and takes commands on ``cmd`` and preferences on ``delta``. Like a
+  real robot it only accepts a single MQTT session at a time.
+* The ``f005efcc3b2900`` password request on the same port.
+* The ``irobotmcs`` discovery probe on UDP port 5678.
+
+Every robot listens on its own address, so a fleet can be simulated on
+consecutive loopback addresses (``127.0.1.1``, ``127.0.1.2``, ...) of a
+single Linux box.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import ipaddress
+import logging
+import ssl
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, cast
+
+import orjson
+
+# typing.Self needs Python 3.11
+from typing_extensions import Self  # noqa: UP035
+
+from roombapy.getpassword import PASSWORD_REQUEST
+from roombapy.state import merge
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from roombapy.roomba import RoombaMessage
+
+DISCOVERY_MESSAGE = b"irobotmcs"
+DISCOVERY_PORT = 5678
+MQTT_PORT = 8883
+
+# MQTT control packet types
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+CONNACK_ACCEPTED = 0
+CONNACK_SERVER_UNAVAILABLE = 3
+CONNACK_BAD_CREDENTIALS = 4
+
+# phase a simulated robot reports first after a command, one of the
+# phases confirming the command in roombapy.const.COMMAND_PHASES
+SIMULATED_PHASES = {
+    "start": "run",
+    "clean": "run",
+    "resume": "run",
+    "pause": "stop",
+    "stop": "stop",
+    "dock": "hmUsrDock",
+    "evac": "evac",
+}
+
+
+@dataclass
+class SimulatedRoomba:
+    """A single simulated robot."""
+
+    blid: str
+    password: str
+    ip: str = "127.0.0.1"
+    port: int = MQTT_PORT
+    name: str = "Roomba"
+    mac: str = "f0:03:8c:00:00:00"
+    # pose updates per second while cleaning
+    pose_rate: float = 2.0
+    # seconds between status updates (battery, signal) while connected
+    status_interval: float = 30.0
+    # seconds it takes to reach the dock after a dock command
+    dock_time: float = 5.0
+    # whether the robot hands out its password, like after holding HOME
+    password_mode: bool = True
+    reported: RoombaMessage = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        """Fill in the initial reported state."""
+        self.log = logging.getLogger(__name__)
+        if not self.reported:
+            self.reported = _initial_state(self.name, self.mac)
+        self._server: asyncio.Server | None = None
+        self._session: asyncio.StreamWriter | None = None
+        self._subscriptions: set[str] = set()
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._status_task: asyncio.Task[None] | None = None
+        self._mission_start = 0.0
+
+    @property
+    def hostname(self) -> str:
+        """Return the hostname announced in discovery answers."""
+        return f"Roomba-{self.blid}"
+
+    @property
+    def connected(self) -> bool:
+        """Return whether a client has an MQTT session."""
+        return self._session is not None
+
+    def discovery_info(self) -> bytes:
+        """Return the answer to a discovery probe."""
+        return orjson.dumps(
+            {
+                "ver": "3",
+                "hostname": self.hostname,
+                "robotname": self.name,
+                "ip": self.ip,
+                "mac": self.mac,
+                "sw": self.reported["softwareVer"],
+                "sku": self.reported["sku"],
+                "nc": 0,
+                "proto": "mqtt",
+                "cap": self.reported["cap"],
+            }
+        )
+
+    async def start(self, ssl_context: ssl.SSLContext) -> None:
+        """Start listening for connections."""
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.ip, self.port, ssl=ssl_context
+        )
+
+    async def stop(self) -> None:
+        """Stop listening and close the session."""
+        for task in self._tasks:
+            task.cancel()
+        if self._session is not None:
+            self._session.close()
+            self._end_session()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def report(self, reported: RoombaMessage) -> None:
+        """Change the reported state and publish the change."""
+        merge(self.reported, reported)
+        self._publish(
+            f"$aws/things/{self.blid}/shadow/update",
+            {"state": {"reported": reported}},
+        )
+
+    def handle_command(self, command: RoombaMessage) -> None:
+        """Handle a command published on the ``cmd`` topic."""
+        name = command.get("command")
+        reported: RoombaMessage = {
+            "lastCommand": {
+                "command": name,
+                "time": command.get("time"),
+                "initiator": command.get("initiator"),
+            }
+        }
+        if (phase := SIMULATED_PHASES.get(str(name))) is not None:
+            status: dict[str, Any] = {"phase": phase}
+            if name in ("start", "clean"):
+                self._mission_start = time.monotonic()
+                status.update(
+                    cycle="clean",
+                    mssnM=0,
+                    nMssn=self.reported["cleanMissionStatus"]["nMssn"] + 1,
+                )
+            reported["cleanMissionStatus"] = status
+        self.report(reported)
+        if phase == "run":
+            self._spawn(self._clean())
+        elif phase in ("hmUsrDock", "evac"):
+            self._spawn(self._charge(phase))
+
+    def handle_delta(self, delta: RoombaMessage) -> None:
+        """Handle a preference change published on the ``delta`` topic."""
+        if isinstance(preferences := delta.get("state"), dict):
+            self.report(preferences)
+
+    @property
+    def _phase(self) -> str:
+        return str(self.reported["cleanMissionStatus"]["phase"])
+
+    async def _clean(self) -> None:
+        interval = 1 / self.pose_rate
+        step = 0
+        while self._phase == "run":
+            step += 1
+            minutes = int((time.monotonic() - self._mission_start) / 60)
+            self.report(
+                {
+                    "pose": {
+                        "theta": (step * 7) % 360 - 180,
+                        "point": {"x": step % 400, "y": (step * 3) % 300},
+                    },
+                    "cleanMissionStatus": {"mssnM": minutes},
+                }
+            )
+            await asyncio.sleep(interval)
+
+    async def _charge(self, phase: str) -> None:
+        # docking and emptying the bin take dock_time seconds
+        await asyncio.sleep(self.dock_time)
+        if self._phase == phase:
+            self.report(
+                {"cleanMissionStatus": {"cycle": "none", "phase": "charge"}}
+            )
+
+    async def _status(self) -> None:
+        while True:
+            await asyncio.sleep(self.status_interval)
+            battery = self.reported["batPct"]
+            if self._phase == "run":
+                battery = max(battery - 1, 0)
+            elif self._phase == "charge":
+                battery = min(battery + 1, 100)
+            self.report({"batPct": battery, "signal": self.reported["signal"]})
+
+    def _spawn(self, coroutine: Any) -> None:
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            header = await reader.readexactly(1)
+            if header == PASSWORD_REQUEST[:1]:
+                await self._handle_password_request(reader, writer)
+            elif header[0] >> 4 == CONNECT:
+                await self._handle_session(header[0], reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            if self._session is writer:
+                self._end_session()
+            writer.close()
+            with contextlib.suppress(ConnectionError, ssl.SSLError):
+                await writer.wait_closed()
+
+    async def _handle_password_request(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        request = PASSWORD_REQUEST[:1] + await reader.readexactly(
+            len(PASSWORD_REQUEST) - 1
+        )
+        if request != PASSWORD_REQUEST or not self.password_mode:
+            return
+        body = PASSWORD_REQUEST[2:6] + b"\x00" + self.password.encode()
+        body += b"\x00"
+        writer.write(PASSWORD_REQUEST[:1] + bytes([len(body)]) + body)
+        await writer.drain()
+
+    async def _handle_session(
+        self,
+        header: int,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        body = await _read_body(reader)
+        username, password = _parse_connect(body)
+        if self._session is not None:
+            # robots only accept a single connection
+            writer.write(_connack(CONNACK_SERVER_UNAVAILABLE))
+            return
+        if username != self.blid or password != self.password:
+            writer.write(_connack(CONNACK_BAD_CREDENTIALS))
+            return
+
+        self._session = writer
+        self._subscriptions = set()
+        writer.write(_connack(CONNACK_ACCEPTED))
+        self._status_task = asyncio.get_running_loop().create_task(
+            self._status()
+        )
+
+        while True:
+            header = (await reader.readexactly(1))[0]
+            body = await _read_body(reader)
+            packet_type = header >> 4
+            if packet_type == PUBLISH:
+                self._handle_publish(header, body)
+            elif packet_type == SUBSCRIBE:
+                self._handle_subscribe(body)
+            elif packet_type == UNSUBSCRIBE:
+                for topic in _parse_topics(body[2:], with_qos=False):
+                    self._subscriptions.discard(topic)
+                writer.write(bytes([UNSUBACK << 4, 2]) + body[:2])
+            elif packet_type == PINGREQ:
+                writer.write(bytes([PINGRESP << 4, 0]))
+            elif packet_type == DISCONNECT:
+                return
+            await writer.drain()
+
+    def _end_session(self) -> None:
+        self._session = None
+        self._subscriptions = set()
+        if self._status_task is not None:
+            self._status_task.cancel()
+            self._status_task = None
+
+    def _handle_subscribe(self, body: bytes) -> None:
+        topics = _parse_topics(body[2:], with_qos=True)
+        self._subscriptions.update(topics)
+        if self._session is None:
+            return
+        granted = bytes(0 for _ in topics)
+        self._session.write(
+            bytes([SUBACK << 4 | 0, 2 + len(granted)]) + body[:2] + granted
+        )
+        # like the robot, send the whole shadow after subscribing
+        for key, value in self.reported.items():
+            self._publish(
+                f"$aws/things/{self.blid}/shadow/update",
+                {"state": {"reported": {key: value}}},
+            )
+
+    def _handle_publish(self, header: int, body: bytes) -> None:
+        (topic_length,) = struct.unpack("!H", body[:2])
+        topic = body[2 : 2 + topic_length].decode()
+        offset = 2 + topic_length
+        qos = (header >> 1) & 0x03
+        if qos > 0:
+            packet_id = body[offset : offset + 2]
+            offset += 2
+            if self._session is not None:
+                self._session.write(bytes([PUBACK << 4, 2]) + packet_id)
+        try:
+            message = orjson.loads(body[offset:])
+        except orjson.JSONDecodeError:
+            self.log.warning("Malformed message on %s: %s", topic, body)
+            return
+        if not isinstance(message, dict):
+            return
+        if topic == "cmd":
+            self.handle_command(message)
+        elif topic == "delta":
+            self.handle_delta(message)
+
+    def _publish(self, topic: str, message: RoombaMessage) -> None:
+        if self._session is None or not any(
+            _topic_matches(subscription, topic)
+            for subscription in self._subscriptions
+        ):
+            return
+        encoded_topic = topic.encode()
+        variable = struct.pack("!H", len(encoded_topic)) + encoded_topic
+        payload = orjson.dumps(message)
+        self._session.write(
+            bytes([PUBLISH << 4])
+            + _encode_length(len(variable) + len(payload))
+            + variable
+            + payload
+        )
+
+
+class RoombaSimulator:
+    """A fleet of simulated robots and their discovery responder."""
+
+    def __init__(
+        self,
+        robots: Iterable[SimulatedRoomba],
+        *,
+        certfile: str,
+        keyfile: str,
+        discovery_address: str = "0.0.0.0",  # noqa: S104
+        discovery_port: int | None = DISCOVERY_PORT,
+    ) -> None:
+        """Initialize the simulator.
+
+        ``certfile`` and ``keyfile`` are used for the TLS server of every
+        robot. Use ``discovery_port=None`` to not answer discovery probes.
+        """
+        self.robots = list(robots)
+        self.discovery_address = discovery_address
+        self.discovery_port = discovery_port
+        self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.ssl_context.load_cert_chain(certfile, keyfile)
+        self._transport: asyncio.DatagramTransport | None = None
+
+    @classmethod
+    def fleet(
+        cls,
+        count: int,
+        *,
+        first_address: str = "127.0.1.1",
+        port: int = MQTT_PORT,
+        password: str = "password",  # noqa: S107
+        **kwargs: Any,
+    ) -> RoombaSimulator:
+        """Create a fleet of robots on consecutive addresses."""
+        first = ipaddress.ip_address(first_address)
+        robots = [
+            SimulatedRoomba(
+                blid=f"{index:016d}",
+                password=password,
+                ip=str(first + index),
+                port=port,
+                name=f"Roomba {index}",
+                mac=_mac(index),
+            )
+            for index in range(count)
+        ]
+        return cls(robots, **kwargs)
+
+    async def start(self) -> None:
+        """Start all robots and the discovery responder."""
+        await asyncio.gather(
+            *(robot.start(self.ssl_context) for robot in self.robots)
+        )
+        if self.discovery_port is not None:
+            loop = asyncio.get_running_loop()
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: _DiscoveryResponder(self.robots),
+                local_addr=(self.discovery_address, self.discovery_port),
+            )
+
+    async def stop(self) -> None:
+        """Stop all robots and the discovery responder."""
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        await asyncio.gather(*(robot.stop() for robot in self.robots))
+
+    async def __aenter__(self) -> Self:
+        """Start the simulator."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_exc_info: object) -> None:
+        """Stop the simulator."""
+        await self.stop()
+
+
+class _DiscoveryResponder(asyncio.DatagramProtocol):
+    """Answer discovery probes for all simulated robots."""
+
+    def __init__(self, robots: list[SimulatedRoomba]) -> None:
+        self.robots = robots
+        self.transport: asyncio.DatagramTransport | None = None
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = cast("asyncio.DatagramTransport", transport)
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        if data != DISCOVERY_MESSAGE or self.transport is None:
+            return
+        for robot in self.robots:
+            self.transport.sendto(robot.discovery_info(), addr)
+
+
+def _initial_state(name: str, mac: str) -> RoombaMessage:
+    return {
+        "name": name,
+        "mac": mac,
+        "sku": "R980020",
+        "softwareVer": "v2.4.16-126",
+        "batteryType": "lith",
+        "batPct": 100,
+        "dock": {"known": True},
+        "bin": {"present": True, "full": False},
+        "signal": {"rssi": -45, "snr": 18, "noise": -63},
+        "pose": {"theta": 0, "point": {"x": 0, "y": 0}},
+        "cleanMissionStatus": {
+            "cycle": "none",
+            "phase": "charge",
+            "expireM": 0,
+            "rechrgM": 0,
+            "error": 0,
+            "notReady": 0,
+            "mssnM": 0,
+            "sqft": 0,
+            "initiator": "",
+            "nMssn": 0,
+        },
+        "cap": {
+            "pose": 1,
+            "ota": 2,
+            "multiPass": 2,
+            "pp": 1,
+            "binFullDetect": 1,
+        },
+    }
+
+
+def _mac(index: int) -> str:
+    return "f0:03:8c:" + ":".join(
+        f"{byte:02x}" for byte in index.to_bytes(3, "big")
+    )
+
+
+async def _read_body(reader: asyncio.StreamReader) -> bytes:
+    length = 0
+    multiplier = 1
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            break
+        multiplier *= 128
+    return await reader.readexactly(length)
+
+
+def _encode_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        encoded.append(byte)
+        if not length:
+            return bytes(encoded)
+
+
+def _read_string(data: bytes, offset: int) -> tuple[str, int]:
+    (length,) = struct.unpack("!H", data[offset : offset + 2])
+    end = offset + 2 + length
+    return data[offset + 2 : end].decode(), end
+
+
+def _parse_connect(body: bytes) -> tuple[str | None, str | None]:
+    _, offset = _read_string(body, 0)  # protocol name
+    flags = body[offset + 1]
+    offset += 4  # protocol level, flags and keep alive
+    _, offset = _read_string(body, offset)  # client id
+    if flags & 0x04:  # will topic and message
+        _, offset = _read_string(body, offset)
+        _, offset = _read_string(body, offset)
+    username = password = None
+    if flags & 0x80:
+        username, offset = _read_string(body, offset)
+    if flags & 0x40:
+        password, offset = _read_string(body, offset)
+    return username, password
+
+
+def _parse_topics(data: bytes, *, with_qos: bool) -> list[str]:
+    topics = []
+    offset = 0
+    while offset < len(data):
+        topic, offset = _read_string(data, offset)
+        topics.append(topic)
+        if with_qos:
+            offset += 1
+    return topics
+
+
+def _connack(return_code: int) -> bytes:
+    return bytes([CONNACK << 4, 2, 0, return_code])
+
+
+def _topic_matches(subscription: str, topic: str) -> bool:
+    # unlike regular brokers, the robots also send their $aws topics to "#"
+    filter_levels = subscription.split("/")
+    topic_levels = topic.split("/")
+    for index, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level not in ("+", topic_levels[index]):
+            return False
+    return len(filter_levels) == len(topic_levels)
@@ -0,0 +1,112 @@
+"""Save the state of a robot and restore it after a restart.
+
+A snapshot holds the merged state reported by the robot and the values
+derived from it, so a restarted process knows the state of its robots
+before they send their whole state again. Snapshots older than a maximum
+age are ignored, the robot may have done anything in the meantime.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import orjson
+
+if TYPE_CHECKING:
+    from roombapy.roomba import Roomba
+
+SNAPSHOT_VERSION = 1
+# seconds after which a snapshot is too old to be restored
+MAX_AGE = 3600.0
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def save_snapshot(roomba: Roomba, path: Path | str) -> None:
+    """Write a snapshot of the state of a Roomba.
+
+    The snapshot is written to a temporary file first, so a crash never
+    leaves a partial snapshot behind.
+    """
+    path = Path(path)
+    data = orjson.dumps(
+        {
+            "version": SNAPSHOT_VERSION,
+            "blid": roomba.remote_client.blid,
+            "saved": time.time(),
+            "master_state": roomba.master_state,
+            "current_state": roomba.current_state,
+            "phase": roomba.cleanMissionStatus_phase,
+            "previous_phase": roomba.previous_cleanMissionStatus_phase,
+            "error_code": roomba.error_code,
+            "error_message": roomba.error_message,
+            "bin_full": roomba.bin_full,
+        },
+        option=orjson.OPT_NON_STR_KEYS,
+    )
+    temporary = path.with_name(f".{path.name}.tmp")
+    temporary.write_bytes(data)
+    temporary.replace(path)
+
+
+def restore_snapshot(
+    roomba: Roomba, path: Path | str, *, max_age: float = MAX_AGE
+) -> bool:
+    """Restore the state of a Roomba from a snapshot.
+
+    Returns whether the snapshot was restored. Missing, damaged and stale
+    snapshots, or snapshots of another robot, are ignored. The snapshot is
+    merged into the current state, so restore it before connecting.
+    Restoring doesn't call any callbacks.
+    """
+    path = Path(path)
+    try:
+        snapshot = orjson.loads(path.read_bytes())
+    except FileNotFoundError:
+        return False
+    except (OSError, orjson.JSONDecodeError) as error:
+        _LOGGER.warning("Can't read snapshot %s: %s", path, error)
+        return False
+    if not _usable(snapshot, roomba.remote_client.blid, max_age, path):
+        return False
+
+    roomba.apply_changes(
+        roomba.dict_merge(roomba.master_state, snapshot["master_state"])
+    )
+    roomba.current_state = snapshot.get("current_state")
+    roomba.cleanMissionStatus_phase = snapshot.get("phase") or ""
+    roomba.previous_cleanMissionStatus_phase = (
+        snapshot.get("previous_phase") or ""
+    )
+    roomba.error_code = snapshot.get("error_code")
+    roomba.error_message = snapshot.get("error_message")
+    roomba.bin_full = bool(snapshot.get("bin_full"))
+    roomba.reset_state_machine()
+    _LOGGER.debug("Restored snapshot %s", path)
+    return True
+
+
+def _usable(snapshot: Any, blid: str, max_age: float, path: Path) -> bool:
+    if not isinstance(snapshot, dict) or not isinstance(
+        snapshot.get("master_state"), dict
+    ):
+        _LOGGER.warning("Ignoring damaged snapshot %s", path)
+        return False
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        _LOGGER.info(
+            "Ignoring snapshot %s of version %s",
+            path,
+            snapshot.get("version"),
+        )
+        return False
+    if snapshot.get("blid") != blid:
+        _LOGGER.warning("Ignoring snapshot %s of another robot", path)
+        return False
+    saved = snapshot.get("saved")
+    if not isinstance(saved, (int, float)) or time.time() - saved > max_age:
+        _LOGGER.info("Ignoring stale snapshot %s", path)
+        return False
+    return True
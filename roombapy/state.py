@@ -0,0 +1,193 @@
+"""Flattened view of the Roomba state."""
+
+from __future__ import annotations
+
+import fnmatch
+import re
+from collections.abc import Mapping
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Final, NamedTuple
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+FlatKey = str
+
+# all data starts with this, so it's redundant
+REPORTED_PREFIX: FlatKey = "state_reported"
+
+
+def flatten(
+    message: Mapping[str, Any], prefix: FlatKey = ""
+) -> Iterator[tuple[FlatKey, Any]]:
+    """Yield the leaves of a nested message as flat key/value pairs.
+
+    Nested keys are concatenated with ``_`` and the redundant
+    ``state_reported`` prefix is dropped, so
+    ``{"state": {"reported": {"bin": {"full": False}}}}`` yields
+    ``("bin_full", False)``.
+    """
+    for key, value in message.items():
+        path = f"{prefix}_{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, "" if path == REPORTED_PREFIX else path)
+        else:
+            yield path, value
+
+
+class _Missing(Enum):
+    MISSING = "MISSING"
+
+
+# marks a flat key that is absent before or after a change
+MISSING: Final = _Missing.MISSING
+
+
+class StateChange(NamedTuple):
+    """Change of a single flat key."""
+
+    path: FlatKey
+    old: Any
+    new: Any
+
+
+def merge(
+    dct: dict[str, Any], merge_dct: Mapping[str, Any], prefix: FlatKey = ""
+) -> list[StateChange]:
+    """Merge ``merge_dct`` into ``dct`` and return the changed flat keys.
+
+    Leaves holding the same value are skipped, so repeating a value that
+    did not change produces no change at all. When a subtree is replaced by
+    a plain value (or the other way round) the old leaves are reported with
+    ``MISSING`` as their new value.
+    """
+    changes: list[StateChange] = []
+    _merge(dct, merge_dct, prefix, changes)
+    return changes
+
+
+def _merge(
+    dct: dict[str, Any],
+    merge_dct: Mapping[str, Any],
+    prefix: FlatKey,
+    changes: list[StateChange],
+) -> None:
+    for key, value in merge_dct.items():
+        path = f"{prefix}_{key}" if prefix else key
+        old = dct.get(key, MISSING)
+        child_prefix = "" if path == REPORTED_PREFIX else path
+        if isinstance(value, Mapping):
+            if isinstance(old, dict):
+                _merge(old, value, child_prefix, changes)
+                continue
+            if old is not MISSING:
+                changes.append(StateChange(path, old, MISSING))
+            changes.extend(
+                StateChange(leaf, MISSING, leaf_value)
+                for leaf, leaf_value in flatten(value, child_prefix)
+            )
+        elif isinstance(old, dict):
+            changes.extend(
+                StateChange(leaf, leaf_value, MISSING)
+                for leaf, leaf_value in flatten(old, child_prefix)
+            )
+            changes.append(StateChange(path, MISSING, value))
+        elif type(old) is type(value) and old == value:
+            continue
+        else:
+            changes.append(StateChange(path, old, value))
+        # later deltas update subtrees in place, so don't keep references to
+        # the message
+        dct[key] = _copy_tree(value) if isinstance(value, Mapping) else value
+
+
+def _copy_tree(tree: Mapping[str, Any]) -> dict[str, Any]:
+    return {
+        key: _copy_tree(value) if isinstance(value, Mapping) else value
+        for key, value in tree.items()
+    }
+
+
+class PathMatcher:
+    """Match flat keys against a glob pattern.
+
+    The result is cached per key, as robots only ever report a bounded set
+    of keys.
+    """
+
+    def __init__(self, pattern: str) -> None:
+        """Compile the glob pattern."""
+        self.pattern = pattern
+        self._match = re.compile(fnmatch.translate(pattern)).match
+        self._cache: dict[FlatKey, bool] = {}
+
+    def __call__(self, path: FlatKey) -> bool:
+        """Return whether the flat key matches the pattern."""
+        try:
+            return self._cache[path]
+        except KeyError:
+            matched = self._cache[path] = self._match(path) is not None
+            return matched
+
+
+class StateIndex:
+    """Flat key view of the nested Roomba state.
+
+    Values are looked up in the state itself, so every value is stored
+    only once. A flat key is resolved level by level, trying every ``_``
+    separated prefix of the key as a key of the current level.
+    """
+
+    def __init__(self, state: dict[str, Any] | None = None) -> None:
+        """Initialize a view of ``state``, by default of an empty state."""
+        self.state: dict[str, Any] = {} if state is None else state
+
+    def items(self) -> list[tuple[FlatKey, Any]]:
+        """Return all flat key/value pairs."""
+        return list(flatten(self.state))
+
+    def get(self, key: FlatKey, default: Any = None) -> Any:
+        """Return the value for a flat key."""
+        value = self._lookup(key)
+        return default if value is MISSING else value
+
+    def __getitem__(self, key: FlatKey) -> Any:
+        """Return the value for a flat key."""
+        if (value := self._lookup(key)) is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        """Return whether the flat key is present."""
+        return isinstance(key, str) and self._lookup(key) is not MISSING
+
+    def __len__(self) -> int:
+        """Return the number of leaves."""
+        return sum(1 for _ in flatten(self.state))
+
+    def _lookup(self, key: FlatKey) -> Any:
+        # most keys are reported ones, which are flattened without prefix
+        reported = self.state.get("state")
+        if isinstance(reported, dict):
+            reported = reported.get("reported")
+        if isinstance(reported, dict) and (
+            (value := _find(reported, key)) is not MISSING
+        ):
+            return value
+        return _find(self.state, key)
+
+
+def _find(tree: dict[str, Any], key: FlatKey) -> Any:
+    """Return the leaf of ``tree`` at a flat key, MISSING if there is none."""
+    value = tree.get(key, MISSING)
+    if value is not MISSING and not isinstance(value, dict):
+        return value
+    split = key.find("_")
+    while split != -1:
+        child = tree.get(key[:split])
+        if isinstance(child, dict) and (
+            (value := _find(child, key[split + 1 :])) is not MISSING
+        ):
+            return value
+        split = key.find("_", split + 1)
+    return MISSING
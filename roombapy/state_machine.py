@@ -0,0 +1,104 @@
+"""Transition table of the Roomba mission state machine.
+
+The state of a robot is derived from its previous state and the reported
+mission phase, bin status and mission minutes. Every combination of known
+states and phases is evaluated once when the module is imported, so a
+transition is a single dictionary lookup.
+"""
+
+from __future__ import annotations
+
+from itertools import product
+from types import MappingProxyType
+from typing import TYPE_CHECKING, NamedTuple
+
+from roombapy.const import ROOMBA_STATES, State
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+# previous state, mission phase, bin full, no mission minutes reported
+TransitionKey = tuple[State, str, bool, bool]
+
+
+class Transition(NamedTuple):
+    """Result of a state machine transition."""
+
+    state: State
+    # refresh listeners, even though the state stays the same
+    refresh: bool = False
+
+
+def _evaluate(key: TransitionKey) -> Transition:  # noqa: PLR0911
+    """Evaluate the transition rules for a known phase."""
+    state, phase, bin_full, mission_none = key
+    if (
+        mission_none
+        and phase == "charge"
+        and state in (ROOMBA_STATES["pause"], ROOMBA_STATES["recharge"])
+    ):
+        state = ROOMBA_STATES["cancelled"]
+
+    if state == ROOMBA_STATES["charge"] and phase == "run":
+        return Transition(ROOMBA_STATES["new"])
+    if state == ROOMBA_STATES["run"] and phase == "hmMidMsn":
+        return Transition(ROOMBA_STATES["dock"])
+    if state == ROOMBA_STATES["dock"] and phase == "charge":
+        return Transition(ROOMBA_STATES["recharge"])
+    if state == ROOMBA_STATES["recharge"] and phase == "charge" and bin_full:
+        return Transition(ROOMBA_STATES["pause"])
+    if state == ROOMBA_STATES["run"] and phase == "charge":
+        return Transition(ROOMBA_STATES["recharge"])
+    if state == ROOMBA_STATES["recharge"] and phase == "run":
+        return Transition(ROOMBA_STATES["pause"])
+    if state == ROOMBA_STATES["pause"] and phase == "charge":
+        # so that we will draw map and can update recharge time
+        return Transition(ROOMBA_STATES["pause"], refresh=True)
+    if state == ROOMBA_STATES["charge"] and phase == "charge":
+        # so that we will draw map and can update charge status
+        return Transition(state, refresh=True)
+    if (
+        state in (ROOMBA_STATES["stop"], ROOMBA_STATES["pause"])
+        and phase == "hmUsrDock"
+    ):
+        return Transition(ROOMBA_STATES["cancelled"])
+    if (
+        state
+        in (
+            ROOMBA_STATES["hmUsrDock"],
+            ROOMBA_STATES["cancelled"],
+            ROOMBA_STATES["hmPostMsn"],
+        )
+        and phase == "charge"
+    ):
+        return Transition(ROOMBA_STATES["dockend"])
+    if state == ROOMBA_STATES["dockend"] and phase == "charge":
+        return Transition(ROOMBA_STATES["charge"])
+    return Transition(ROOMBA_STATES[phase])
+
+
+TRANSITIONS: Mapping[TransitionKey, Transition] = MappingProxyType(
+    {
+        key: _evaluate(key)
+        for key in product(
+            dict.fromkeys(ROOMBA_STATES.values()),
+            ROOMBA_STATES,
+            (False, True),
+            (False, True),
+        )
+    }
+)
+
+
+def next_state(
+    state: State, phase: str, *, bin_full: bool, mission_none: bool
+) -> Transition | None:
+    """Return the transition for the inputs or None for unknown phases."""
+    key = (state, phase, bin_full, mission_none)
+    try:
+        return TRANSITIONS[key]
+    except KeyError:
+        if phase not in ROOMBA_STATES:
+            return None
+        # a state set from outside the state machine
+        return _evaluate(key)
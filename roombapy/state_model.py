@@ -0,0 +1,103 @@
+"""Typed model of the values reported by a Roomba."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from roombapy.state import MISSING, FlatKey
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from roombapy.state import StateChange
+
+
+@dataclass(slots=True)
+class Pose:
+    """Position of the robot."""
+
+    theta: int | None = None
+    x: int | None = None
+    y: int | None = None
+
+
+@dataclass(slots=True)
+class Bin:
+    """Dust bin status."""
+
+    present: bool | None = None
+    full: bool | None = None
+
+
+@dataclass(slots=True)
+class MissionStatus:
+    """Status of the current cleaning mission."""
+
+    cycle: str | None = None
+    phase: str | None = None
+    error: int | None = None
+    not_ready: int | None = None
+    mssn_m: int | str | None = None
+    expire_m: int | None = None
+    rechrg_m: int | None = None
+    sqft: int | None = None
+    initiator: str | None = None
+    n_mssn: int | None = None
+    mssn_strt_tm: int | None = None
+
+
+@dataclass(slots=True)
+class RoombaState:
+    """Typed view of the reported state.
+
+    The frequently used reported fields are plain attributes, all other
+    values are looked up by their flattened key in
+    :attr:`~roombapy.roomba.Roomba.state_index`.
+    """
+
+    name: str | None = None
+    bat_pct: int | None = None
+    battery_type: str | None = None
+    dock_known: bool | None = None
+    pose: Pose = field(default_factory=Pose)
+    bin: Bin = field(default_factory=Bin)
+    mission: MissionStatus = field(default_factory=MissionStatus)
+
+    def apply(self, changes: Iterable[StateChange]) -> None:
+        """Update the model from merge changes."""
+        for path, _, new in changes:
+            target = _FIELDS.get(path)
+            if target is None:
+                continue
+            component, attribute = target
+            setattr(
+                self if component is None else getattr(self, component),
+                attribute,
+                None if new is MISSING else new,
+            )
+
+
+# flattened key -> (component attribute or None for the model, attribute)
+_FIELDS: dict[FlatKey, tuple[str | None, str]] = {
+    "name": (None, "name"),
+    "batPct": (None, "bat_pct"),
+    "batteryType": (None, "battery_type"),
+    "dock_known": (None, "dock_known"),
+    "pose_theta": ("pose", "theta"),
+    "pose_point_x": ("pose", "x"),
+    "pose_point_y": ("pose", "y"),
+    "bin_present": ("bin", "present"),
+    "bin_full": ("bin", "full"),
+    "cleanMissionStatus_cycle": ("mission", "cycle"),
+    "cleanMissionStatus_phase": ("mission", "phase"),
+    "cleanMissionStatus_error": ("mission", "error"),
+    "cleanMissionStatus_notReady": ("mission", "not_ready"),
+    "cleanMissionStatus_mssnM": ("mission", "mssn_m"),
+    "cleanMissionStatus_expireM": ("mission", "expire_m"),
+    "cleanMissionStatus_rechrgM": ("mission", "rechrg_m"),
+    "cleanMissionStatus_sqft": ("mission", "sqft"),
+    "cleanMissionStatus_initiator": ("mission", "initiator"),
+    "cleanMissionStatus_nMssn": ("mission", "n_mssn"),
+    "cleanMissionStatus_mssnStrtTm": ("mission", "mssn_strt_tm"),
+}
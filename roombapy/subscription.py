@@ -0,0 +1,68 @@
+"""Choose which messages of a robot are received and decoded.
+
+Subscriptions are sent to the robot when the connection is established,
+so topics nobody is interested in are never sent by the robot. A
+:class:`MessageFilter` rejects the remaining unwanted messages by topic or
+with cheap checks of the raw payload, before any JSON is parsed.
+"""
+
+from __future__ import annotations
+
+from typing import NamedTuple
+
+from paho.mqtt.client import topic_matches_sub
+
+# all topics of the robot
+ALL_TOPICS = "#"
+
+
+class Subscription(NamedTuple):
+    """MQTT topic filter to subscribe to."""
+
+    topic: str
+    qos: int = 0
+
+
+class MessageFilter:
+    """Reject messages before their payload is decoded.
+
+    A message is accepted when its topic matches one of ``topics`` (all
+    topics without any) and none of ``exclude_topics``, and its payload
+    starts with one of ``prefixes`` or mentions one of the reported
+    ``keys``. Without prefixes and keys every payload is accepted. Topic
+    filters follow MQTT, so ``#`` doesn't match the ``$aws/...`` topics
+    the robot reports its state on, use ``$aws/things/+/shadow/#``.
+
+    The payload checks are byte comparisons, so ``keys`` may accept
+    messages which only mention a key in a value, but never rejects a
+    message reporting the key.
+    """
+
+    def __init__(
+        self,
+        *,
+        topics: tuple[str, ...] = (),
+        exclude_topics: tuple[str, ...] = (),
+        prefixes: tuple[bytes, ...] = (),
+        keys: tuple[str, ...] = (),
+    ) -> None:
+        """Initialize the filter."""
+        self.topics = topics
+        self.exclude_topics = exclude_topics
+        self.prefixes = prefixes
+        self.keys = keys
+        self._quoted_keys = tuple(f'"{key}"'.encode() for key in keys)
+
+    def __call__(self, topic: str, payload: bytes | bytearray) -> bool:
+        """Return whether a message should be decoded."""
+        if self.topics and not any(
+            topic_matches_sub(sub, topic) for sub in self.topics
+        ):
+            return False
+        if any(topic_matches_sub(sub, topic) for sub in self.exclude_topics):
+            return False
+        if not (self.prefixes or self._quoted_keys):
+            return True
+        return bool(
+            self.prefixes and payload.startswith(self.prefixes)
+        ) or any(key in payload for key in self._quoted_keys)
@@ -0,0 +1,97 @@
+"""Call functions after a delay, without a thread per call.
+
+Rate limited command flushes, confirmation timeouts and reconnections of
+all robots of a process wait in the heap of one :class:`Timer` by
+default. Its thread hands due calls to a few worker threads, so a slow
+call doesn't hold up the others.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+# calls running at the same time
+MAX_WORKERS = 4
+
+
+class Timer:
+    """Call functions after a delay from a few shared threads.
+
+    Calls wait in a heap ordered by their due time, one scheduler thread
+    hands due calls to at most ``max_workers`` worker threads. The threads
+    run while calls are waiting.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_workers: int = MAX_WORKERS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the timer without calls."""
+        self.log = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.clock = clock
+        # (due time, sequence number, function)
+        self._heap: list[tuple[float, int, Callable[[], None]]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def __len__(self) -> int:
+        """Return the number of waiting calls."""
+        return len(self._heap)
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> None:
+        """Call a function after ``delay`` seconds."""
+        with self._condition:
+            heapq.heappush(
+                self._heap,
+                (self.clock() + delay, next(self._sequence), callback),
+            )
+            self._condition.notify_all()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="roombapy-timer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="roombapy-timer"
+        ) as executor:
+            while (callback := self._next()) is not None:
+                executor.submit(self._call, callback)
+
+    def _next(self) -> Callable[[], None] | None:
+        """Wait for the next call due, None once no call is left."""
+        with self._condition:
+            while self._heap:
+                wait = self._heap[0][0] - self.clock()
+                if wait <= 0:
+                    return heapq.heappop(self._heap)[2]
+                self._condition.wait(wait)
+            self._thread = None
+            return None
+
+    def _call(self, callback: Callable[[], None]) -> None:
+        try:
+            callback()
+        except Exception:
+            self.log.exception("Timer call %r failed", callback)
+
+
+@cache
+def shared_timer() -> Timer:
+    """Return the timer shared by all robots of the process."""
+    return Timer()
@@ -0,0 +1,147 @@
+"""TLS contexts resuming the sessions of robots.
+
+A full TLS handshake is expensive for the weak CPU of a robot, and adds
+up when a fleet reconnects at once or a robot is polled periodically.
+:class:`ResumingSSLContext` remembers the last session of every address
+and offers it on the next connection, so the robot can resume it with an
+abbreviated handshake. Sockets wrapped by the context time their
+handshake.
+"""
+
+from __future__ import annotations
+
+import ssl
+import threading
+import time
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import socket
+
+
+class TimedSSLSocket(ssl.SSLSocket):
+    """TLS socket timing its handshake and saving its session."""
+
+    # seconds the last handshake took, None before the handshake
+    handshake_seconds: float | None = None
+    # whether the handshake resumed a session
+    resumed = False
+
+    def do_handshake(self, block: bool = False) -> None:  # noqa: FBT001
+        """Perform the TLS handshake and save the session."""
+        start = time.perf_counter()
+        try:
+            super().do_handshake(block)
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            raise
+        except OSError:
+            # don't offer a session the robot may have choked on
+            self._sessions().forget(self.server_hostname)
+            raise
+        self.handshake_seconds = time.perf_counter() - start
+        self.resumed = bool(self.session_reused)
+        self._save_session()
+
+    def shutdown(self, how: int) -> None:
+        """Save the session, then shut down the connection."""
+        self._save_session()
+        super().shutdown(how)
+
+    def close(self) -> None:
+        """Save the session, then close the socket."""
+        self._save_session()
+        super().close()
+
+    def _save_session(self) -> None:
+        # TLS 1.3 tickets arrive after the handshake, so the session is
+        # saved again before the connection goes away
+        if (
+            self.handshake_seconds is None
+            or getattr(self, "_sslobj", None) is None
+        ):
+            return
+        session = self.session
+        if session is not None:
+            self._sessions().save(self.server_hostname, session)
+
+    def _sessions(self) -> SessionCache:
+        context = self.context
+        if isinstance(context, ResumingSSLContext):
+            return context.sessions
+        return _NO_SESSIONS
+
+
+class SessionCache:
+    """Last TLS session of every address."""
+
+    def __init__(self) -> None:
+        """Initialize an empty cache."""
+        self._sessions: dict[str, ssl.SSLSession] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of cached sessions."""
+        return len(self._sessions)
+
+    def get(self, address: str | None) -> ssl.SSLSession | None:
+        """Return the session of an address."""
+        if address is None:
+            return None
+        with self._lock:
+            return self._sessions.get(address)
+
+    def save(self, address: str | None, session: ssl.SSLSession) -> None:
+        """Remember the session of an address."""
+        if address is None:
+            return
+        with self._lock:
+            self._sessions[address] = session
+
+    def forget(self, address: str | None) -> None:
+        """Drop the session of an address."""
+        with self._lock:
+            self._sessions.pop(address or "", None)
+
+    def clear(self) -> None:
+        """Drop all sessions."""
+        with self._lock:
+            self._sessions.clear()
+
+
+_NO_SESSIONS = SessionCache()
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """Client TLS context resuming the last session of an address.
+
+    Sessions are looked up by the ``server_hostname`` sockets are wrapped
+    with, which is the address of the robot.
+    """
+
+    sslsocket_class = TimedSSLSocket
+
+    def __init__(self, *_args: Any, **_kwargs: Any) -> None:
+        """Initialize the context with an empty session cache."""
+        super().__init__()
+        self.sessions = SessionCache()
+
+    def wrap_socket(  # noqa: PLR0913, PLR0917
+        self,
+        sock: socket.socket,
+        server_side: bool = False,  # noqa: FBT001
+        do_handshake_on_connect: bool = True,  # noqa: FBT001
+        suppress_ragged_eofs: bool = True,  # noqa: FBT001
+        server_hostname: str | bytes | None = None,
+        session: ssl.SSLSession | None = None,
+    ) -> ssl.SSLSocket:
+        """Wrap a socket, offering the cached session of its address."""
+        if session is None and isinstance(server_hostname, str):
+            session = self.sessions.get(server_hostname)
+        return super().wrap_socket(
+            sock,
+            server_side=server_side,
+            do_handshake_on_connect=do_handshake_on_connect,
+            suppress_ragged_eofs=suppress_ragged_eofs,
+            server_hostname=server_hostname,
+            session=session,
+        )
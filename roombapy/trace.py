@@ -0,0 +1,89 @@
+"""Trace the raw messages of a robot for debugging.
+
+A :class:`MessageTracer` keeps the last messages of a robot in a ring
+buffer and logs a sample of their payloads. Robots only trace while a
+tracer is enabled, otherwise no per-message work is done.
+"""
+
+from __future__ import annotations
+
+import base64
+import logging
+import time
+from collections import deque
+from typing import TYPE_CHECKING, NamedTuple
+
+import orjson
+
+if TYPE_CHECKING:
+    from typing import TextIO
+
+# messages kept per robot
+TRACE_SIZE = 1000
+
+
+class TracedMessage(NamedTuple):
+    """Raw message received from a robot."""
+
+    time: float
+    topic: str
+    payload: bytes
+
+
+class MessageTracer:
+    """Ring buffer of the last raw messages of a robot.
+
+    With ``log_every`` every n-th payload is logged at debug level, 1 logs
+    all of them.
+    """
+
+    def __init__(
+        self,
+        size: int = TRACE_SIZE,
+        *,
+        log_every: int = 0,
+        logger: logging.Logger | None = None,
+    ) -> None:
+        """Initialize an empty trace."""
+        self.log = logger or logging.getLogger(__name__)
+        self.log_every = log_every
+        self.messages: deque[TracedMessage] = deque(maxlen=size)
+        self.received = 0
+
+    def record(self, topic: str, payload: bytes | bytearray) -> None:
+        """Add a message, dropping the oldest one when the trace is full."""
+        self.messages.append(TracedMessage(time.time(), topic, bytes(payload)))
+        self.received += 1
+        if (
+            self.log_every
+            and self.received % self.log_every == 0
+            and self.log.isEnabledFor(logging.DEBUG)
+        ):
+            self.log.debug("Received message on %s: %r", topic, payload)
+
+    def dump(self) -> list[TracedMessage]:
+        """Return the traced messages, oldest first."""
+        return list(self.messages)
+
+    def write(self, target: TextIO) -> None:
+        """Write the traced messages as JSON lines.
+
+        Payloads which aren't valid UTF-8 are written base64 encoded.
+        """
+        for message in self.dump():
+            try:
+                payload = {"payload": message.payload.decode()}
+            except UnicodeDecodeError:
+                payload = {
+                    "payload_base64": base64.b64encode(
+                        message.payload
+                    ).decode()
+                }
+            line = orjson.dumps(
+                {"time": message.time, "topic": message.topic, **payload}
+            )
+            target.write(line.decode() + "\n")
+
+    def clear(self) -> None:
+        """Remove all traced messages."""
+        self.messages.clear()
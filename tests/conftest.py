@@ -5,6 +5,11 @@ from dataclasses import dataclass
 import paho.mqtt.client as mqtt
 import pytest
 from roombapy import Roomba, RoombaFactory
+from roombapy.metrics import shared_metrics
+from roombapy.poller import shared_poller
+from roombapy.reconnect import shared_scheduler
+from roombapy.remote_client import generate_tls_context
+from roombapy.timer import shared_timer
 
 ROOMBA_HOST = "127.0.0.1"
 ROOMBA_USERNAME = "test"
@@ -30,6 +35,25 @@ def as_message(payload: bytes, *, topic: bytes = b"test") -> mqtt.MQTTMessage:
     return message
 
 
+def as_message_info(
+    mid: int, rc: int = mqtt.MQTT_ERR_SUCCESS
+) -> mqtt.MQTTMessageInfo:
+    """Craft the info paho returns for a published message."""
+    info = mqtt.MQTTMessageInfo(mid)
+    info.rc = rc
+    return info
+
+
+@pytest.fixture(autouse=True)
+def _reset_shared_state() -> None:
+    """Don't share pollers, timers, reconnections, metrics and TLS sessions."""
+    shared_poller.cache_clear()
+    shared_timer.cache_clear()
+    shared_scheduler.cache_clear()
+    shared_metrics.cache_clear()
+    generate_tls_context().sessions.clear()
+
+
 @pytest.fixture
 def roomba() -> Roomba:
     """Mock for robot."""
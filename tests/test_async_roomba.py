@@ -0,0 +1,49 @@
+"""Test the asyncio Roomba client."""
+
+import asyncio
+
+import pytest
+from roombapy import AsyncRoomba, RoombaFactory, RoombaMessage
+
+from tests.conftest import (
+    ROOMBA_HOST,
+    ROOMBA_PASSWORD,
+    ROOMBA_USERNAME,
+    as_message,
+)
+
+
+@pytest.fixture
+def async_roomba() -> AsyncRoomba:
+    """Mock for asyncio robot."""
+    return RoombaFactory.create_async_roomba(
+        address=ROOMBA_HOST,
+        blid=ROOMBA_USERNAME,
+        password=ROOMBA_PASSWORD,
+    )
+
+
+@pytest.mark.asyncio
+async def test_messages_until_disconnect(async_roomba: AsyncRoomba) -> None:
+    """Iterate over decoded messages until the connection is closed."""
+
+    async def consume() -> list[RoombaMessage]:
+        return [message async for message in async_roomba.messages()]
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0)
+    client = async_roomba.remote_client.mqtt_client
+    async_roomba.on_message(client, None, as_message(b'{"batPct": 50}'))
+    async_roomba.on_message(client, None, as_message(b"garbage"))
+    async_roomba.on_disconnect(None)
+    received = await asyncio.wait_for(task, 1)
+
+    assert received == [{"batPct": 50}]
+    assert async_roomba.master_state == {"batPct": 50}
+    assert not async_roomba._message_queues
+
+
+@pytest.mark.asyncio
+async def test_drain_without_connection(async_roomba: AsyncRoomba) -> None:
+    """Sending without a connection doesn't wait forever."""
+    await asyncio.wait_for(async_roomba.async_send_command("start"), 1)
@@ -0,0 +1,301 @@
+"""Test the outgoing command queue."""
+
+from collections.abc import Callable
+from typing import Any
+
+import orjson
+import paho.mqtt.client as mqtt
+import pytest
+from roombapy import Roomba
+from roombapy.command_queue import CommandError, CommandHandle, CommandQueue
+
+from tests.conftest import as_message, as_message_info
+
+Published = list[tuple[str, dict[str, Any]]]
+
+
+class FakeTimer:
+    """Clock and timer which only move when told to."""
+
+    def __init__(self) -> None:
+        """Start at zero without pending calls."""
+        self.now = 0.0
+        self.calls: list[tuple[float, Callable[[], None]]] = []
+
+    def clock(self) -> float:
+        """Return the current time."""
+        return self.now
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> None:
+        """Remember a call."""
+        self.calls.append((self.now + delay, callback))
+
+    def advance(self, seconds: float) -> None:
+        """Move the clock and run the calls which are due."""
+        self.now += seconds
+        due = [call for call in self.calls if call[0] <= self.now]
+        self.calls = [call for call in self.calls if call[0] > self.now]
+        for _, callback in due:
+            callback()
+
+
+@pytest.fixture
+def timer() -> FakeTimer:
+    """Fake clock and timer for the queue."""
+    return FakeTimer()
+
+
+@pytest.fixture
+def published() -> Published:
+    """Documents published by the queue."""
+    return []
+
+
+@pytest.fixture
+def queue(timer: FakeTimer, published: Published) -> CommandQueue:
+    """Queue publishing a document per second."""
+
+    def publish(
+        topic: str, document: dict[str, Any] | bytes
+    ) -> mqtt.MQTTMessageInfo:
+        assert isinstance(document, dict)
+        published.append((topic, document))
+        return as_message_info(len(published))
+
+    return CommandQueue(
+        publish,
+        max_rate=1,
+        clock=timer.clock,
+        call_later=timer.call_later,
+    )
+
+
+def test_buffers_while_offline(
+    queue: CommandQueue, published: Published
+) -> None:
+    """Nothing is published before the queue is resumed."""
+    queue.put_command({"command": "start"})
+    assert not published
+    assert len(queue) == 1
+
+    queue.resume()
+
+    assert published == [("cmd", {"command": "start"})]
+    queue.pause()
+    queue.put_command({"command": "dock"})
+    assert len(published) == 1
+
+
+def test_merges_preferences(queue: CommandQueue, published: Published) -> None:
+    """Consecutive preferences are merged, commands keep their order."""
+    queue.put_preference("binPause", True)  # noqa: FBT003
+    queue.put_preference("carpetBoost", False)  # noqa: FBT003
+    queue.put_preference("binPause", False)  # noqa: FBT003
+    queue.put_command({"command": "start"})
+    queue.put_preference("openOnly", True)  # noqa: FBT003
+    queue.put_preference("schedule", {"cycle": ["none"]})
+    queue.put_preference("schedule", {"cycle": ["start"]})
+
+    assert [queued.document for queued in queue.pending] == [
+        {"state": {"binPause": False, "carpetBoost": False}},
+        {"command": "start"},
+        {"state": {"openOnly": True, "schedule": {"cycle": ["none"]}}},
+        {"state": {"schedule": {"cycle": ["start"]}}},
+    ]
+    assert not published
+
+
+def test_rate_limit(
+    queue: CommandQueue, timer: FakeTimer, published: Published
+) -> None:
+    """Documents are spread out to the maximum rate."""
+    queue.resume()
+    for command in ["start", "pause", "resume"]:
+        queue.put_command({"command": command})
+
+    assert len(published) == 1
+    assert len(timer.calls) == 1
+    timer.advance(1)
+    assert len(published) == 2
+    timer.advance(0.5)
+    assert len(published) == 2
+    timer.advance(0.5)
+    assert [document["command"] for _, document in published] == [
+        "start",
+        "pause",
+        "resume",
+    ]
+    assert not timer.calls
+
+
+def test_drops_oldest_documents(timer: FakeTimer) -> None:
+    """At most max_size documents are buffered."""
+    queue = CommandQueue(
+        lambda _topic, _document: as_message_info(1),
+        max_size=2,
+        clock=timer.clock,
+        call_later=timer.call_later,
+    )
+    handles = [
+        queue.put_command({"command": command})
+        for command in ["start", "pause", "dock"]
+    ]
+
+    assert [queued.document["command"] for queued in queue.pending] == [
+        "pause",
+        "dock",
+    ]
+    with pytest.raises(CommandError):
+        handles[0].wait_published(0)
+
+
+def test_handles_follow_publishing(
+    queue: CommandQueue, timer: FakeTimer
+) -> None:
+    """Handles are published when paho reports their message ID."""
+    first = queue.put_preference("binPause", True)  # noqa: FBT003
+    second = queue.put_preference("openOnly", True)  # noqa: FBT003
+    queue.resume()
+    assert not first.published.done()
+
+    queue.on_publish(1)
+
+    assert first.published.done()
+    assert second.published.done()
+    # without a confirmation function handles are confirmed on publish
+    assert first.confirmed.done()
+    # paho may report a message before publish() returned
+    queue.on_publish(2)
+    timer.advance(1)
+    assert queue.put_command({"command": "stop"}).published.done()
+
+
+def test_failed_publish(timer: FakeTimer) -> None:
+    """Handles of messages paho refused fail."""
+    queue = CommandQueue(
+        lambda _topic, _document: as_message_info(1, mqtt.MQTT_ERR_NO_CONN),
+        clock=timer.clock,
+        call_later=timer.call_later,
+    )
+    queue.resume()
+
+    handle = queue.put_command({"command": "start"})
+
+    with pytest.raises(CommandError):
+        handle.wait_confirmed(0)
+
+
+def test_flush_after_publish_error(timer: FakeTimer) -> None:
+    """An error while publishing doesn't stop later flushes."""
+    errors = [RuntimeError("publish failed")]
+
+    def publish(
+        _topic: str, _document: dict[str, Any] | bytes
+    ) -> mqtt.MQTTMessageInfo:
+        if errors:
+            raise errors.pop()
+        return as_message_info(1)
+
+    queue = CommandQueue(
+        publish, clock=timer.clock, call_later=timer.call_later
+    )
+    queue.resume()
+
+    with pytest.raises(RuntimeError):
+        queue.put_command({"command": "start"})
+    handle = queue.put_command({"command": "stop"})
+    timer.advance(1)
+    queue.on_publish(1)
+
+    assert handle.published.done()
+    assert not queue.pending
+
+
+def test_unreported_commands_time_out(
+    queue: CommandQueue, timer: FakeTimer
+) -> None:
+    """Handles time out without further messages from the robot."""
+    queue.resume()
+    handle = queue.put_command(
+        {"command": "start"}, CommandHandle(lambda: False, timeout=10)
+    )
+    queue.on_publish(1)
+    assert queue.confirming == [handle]
+
+    timer.advance(9)
+    assert not handle.confirmed.done()
+    timer.advance(1)
+
+    with pytest.raises(TimeoutError):
+        handle.wait_confirmed(0)
+    assert not queue.confirming
+    assert not timer.calls
+
+
+def test_roomba_sends_queued_commands_on_connect(
+    roomba: Roomba, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Commands sent while disconnected are published on connect."""
+    published: list[tuple[str, bytes]] = []
+
+    def publish(topic: str, payload: bytes) -> mqtt.MQTTMessageInfo:
+        published.append((topic, payload))
+        return as_message_info(len(published))
+
+    monkeypatch.setattr(roomba.remote_client, "publish", publish)
+    monkeypatch.setattr(roomba.remote_client, "subscribe", lambda _topic: None)
+    roomba.set_preference("binPause", "true")
+    roomba.set_preference("carpetBoost", "false")
+    assert not published
+
+    roomba.on_connect(None)
+
+    assert published == [
+        ("delta", b'{"state":{"binPause":true,"carpetBoost":false}}')
+    ]
+    roomba.on_disconnect(None)
+    roomba.send_command("start")
+    assert len(published) == 1
+    assert roomba.commands.pending[0].document["command"] == "start"
+
+
+def test_roomba_confirms_commands(
+    roomba: Roomba,
+    empty_mqtt_client: mqtt.Client,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Handles are confirmed by the reported state of the Roomba."""
+    monkeypatch.setattr(
+        roomba.remote_client,
+        "publish",
+        lambda _topic, _payload: as_message_info(1),
+    )
+    monkeypatch.setattr(roomba.remote_client, "subscribe", lambda _topic: None)
+    roomba.commands.max_rate = float("inf")
+    roomba.on_connect(None)
+
+    def report(reported: dict[str, Any]) -> None:
+        payload = orjson.dumps({"state": {"reported": reported}})
+        roomba.on_message(empty_mqtt_client, None, as_message(payload))
+
+    start = roomba.send_command("start")
+    roomba.on_publish(empty_mqtt_client, None, 1)
+    report({"cleanMissionStatus": {"phase": "charge"}})
+    assert start.published.done()
+    assert not start.confirmed.done()
+    report({"cleanMissionStatus": {"phase": "run"}})
+    start.wait_confirmed(0)
+
+    preference = roomba.set_preference("binPause", "true")
+    roomba.on_publish(empty_mqtt_client, None, 1)
+    report({"binPause": True})
+    preference.wait_confirmed(0)
+
+    find = roomba.send_command("find")
+    roomba.on_publish(empty_mqtt_client, None, 1)
+    assert find.deadline is not None
+    monkeypatch.setattr(roomba.commands, "clock", lambda: find.deadline)
+    report({"batPct": 90})
+    with pytest.raises(TimeoutError):
+        find.wait_confirmed(0)
+    assert not roomba.commands.confirming
@@ -0,0 +1,125 @@
+"""Test the coverage maps."""
+
+import struct
+import zlib
+from pathlib import Path
+
+import numpy as np
+from roombapy.coverage_map import RECORD_DTYPE, CoverageMap
+from roombapy.mission_recorder import (
+    RECORD,
+    MissionLog,
+    MissionWriter,
+    Sample,
+)
+
+
+def _covered(coverage_map: CoverageMap) -> set[tuple[int, int]]:
+    rows, columns = np.nonzero(coverage_map.to_array())
+    origin_x, origin_y = coverage_map.origin
+    return {
+        (int(column) + origin_x, int(row) + origin_y)
+        for row, column in zip(rows, columns, strict=True)
+    }
+
+
+def _counts(coverage_map: CoverageMap) -> dict[tuple[int, int], int]:
+    grid = coverage_map.to_array()
+    origin_x, origin_y = coverage_map.origin
+    return {
+        (column + origin_x, row + origin_y): int(grid[row, column])
+        for row, column in zip(*map(list, np.nonzero(grid)), strict=True)
+    }
+
+
+def test_rasterizes_the_path_between_poses() -> None:
+    """The whole path is covered, not only the poses."""
+    coverage_map = CoverageMap(resolution=1.0, brush_radius=0.0)
+    coverage_map.add_poses([0, 10], [0, 0])
+
+    grid = coverage_map.to_array()
+
+    assert coverage_map.origin == (0, 0)
+    assert grid[0, :11].all()
+    assert np.count_nonzero(grid) == 11
+    assert coverage_map.covered_area == 11.0
+
+
+def test_incremental_poses_match_a_batch() -> None:
+    """Single poses continue the path like one batch of poses."""
+    xs = [0, 30, 30, -40, -40]
+    ys = [0, 0, 25, 25, -60]
+    batch = CoverageMap()
+    batch.add_poses(xs, ys)
+    incremental = CoverageMap(batch_size=2)
+    for x, y in zip(xs, ys, strict=True):
+        incremental.add_pose(x, y)
+
+    assert _covered(incremental) == _covered(batch)
+    # footprint radius of 3.4 cells around the cells (-8, y) and (x, -12)
+    assert min(x for x, _ in _covered(batch)) == -11
+    assert min(y for _, y in _covered(batch)) == -15
+
+
+def test_counts_dont_depend_on_batches() -> None:
+    """Revisited cells are counted the same for any batch size."""
+    xs = [0, 30, 30, 0, 0, 30, 31, 31]
+    ys = [0, 0, 25, 25, 0, 0, 1, 1]
+    batch = CoverageMap(brush_radius=0.0)
+    batch.add_poses(xs, ys)
+    single = CoverageMap(brush_radius=0.0, batch_size=1)
+    pending = CoverageMap(brush_radius=0.0)
+    for x, y in zip(xs, ys, strict=True):
+        single.add_pose(x, y)
+        pending.add_pose(x, y)
+
+    assert _counts(single) == _counts(batch)
+    assert _counts(pending) == _counts(batch)
+    # the start was passed on the way out and on the way back, poses
+    # within the same cell don't count again
+    assert _counts(batch)[0, 0] == 2
+    assert _counts(batch)[6, 0] == 2
+
+
+def test_footprint() -> None:
+    """The footprint of the robot is stamped around the path."""
+    coverage_map = CoverageMap(resolution=1.0, brush_radius=2.0)
+    coverage_map.add_pose(0, 0)
+
+    assert np.count_nonzero(coverage_map.to_array()) == 13
+
+
+def test_from_mission(tmp_path: Path) -> None:
+    """Recorded missions are rasterized from the mission file."""
+    assert RECORD_DTYPE.itemsize == RECORD.size
+    path = tmp_path / "1.mission"
+    writer = MissionWriter(path, start=0.0)
+    for x in range(0, 100, 10):
+        writer.append(Sample(float(x), x, 5, 0, 100, "run"))
+    writer.close()
+
+    with MissionLog(path) as log:
+        recorded = CoverageMap.from_mission(log)
+    live = CoverageMap()
+    live.add_poses(range(0, 100, 10), [5] * 10)
+
+    assert np.array_equal(recorded.to_array(), live.to_array())
+
+
+def test_png(tmp_path: Path) -> None:
+    """The map is saved as a grayscale PNG."""
+    coverage_map = CoverageMap()
+    coverage_map.add_poses([0, 100], [0, 50])
+    path = tmp_path / "map.png"
+
+    coverage_map.save_png(path)
+
+    data = path.read_bytes()
+    assert data.startswith(b"\x89PNG\r\n\x1a\n")
+    width, height = struct.unpack(">II", data[16:24])
+    rows, columns = coverage_map.to_array().shape
+    assert (width, height) == (columns, rows)
+    (length,) = struct.unpack(">I", data[33:37])
+    assert data[37:41] == b"IDAT"
+    pixels = zlib.decompress(data[41 : 41 + length])
+    assert len(pixels) == rows * (columns + 1)
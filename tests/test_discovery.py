@@ -1,6 +1,18 @@
 """Test for the discovery module."""
 
-from roombapy.discovery import RoombaDiscovery
+import pytest
+from roombapy import RoombaInfo
+from roombapy.discovery import RoombaDiscovery, _FoundRobots
+
+from tests.test_decode import TEST_ROOMBA_INFO
+
+
+def _robot(mac: str) -> RoombaInfo:
+    return RoombaInfo.from_json(
+        TEST_ROOMBA_INFO.replace(
+            "hostname_placeholder", "Roomba-test"
+        ).replace("aa:bb:cc:dd:ee:ff", mac)
+    )
 
 
 def test_discovery_with_wrong_msg() -> None:
@@ -10,3 +22,53 @@ def test_discovery_with_wrong_msg() -> None:
     response = discovery.get_all()
 
     assert not response
+
+
+def test_discovery_deadline() -> None:
+    """Stop streaming discovery after the deadline."""
+    discovery = RoombaDiscovery()
+    discovery.roomba_message = "test"
+
+    assert not list(discovery.iter_all(deadline=0.1))
+
+
+@pytest.mark.asyncio
+async def test_async_discovery_deadline() -> None:
+    """Stop asynchronous discovery after the deadline."""
+    discovery = RoombaDiscovery()
+    discovery.roomba_message = "test"
+
+    assert not [robot async for robot in discovery.async_iter_all(0.1)]
+
+
+def test_broadcast_addresses() -> None:
+    """Networks are broadcast to on their broadcast address."""
+    discovery = RoombaDiscovery(["192.168.1.0/24", "10.0.0.255"])
+
+    assert discovery.broadcast_addresses == ["192.168.1.255", "10.0.0.255"]
+    assert RoombaDiscovery().broadcast_addresses == ["<broadcast>"]
+
+
+def test_found_robots_skips_repeated_answers() -> None:
+    """Robots answer every broadcast, but are only yielded once."""
+    found = _FoundRobots(expected=None, macs=None)
+
+    assert found.add(_robot("aa:aa:aa:aa:aa:aa"))
+    assert not found.add(_robot("aa:aa:aa:aa:aa:aa"))
+    assert not found.done
+
+
+def test_found_robots_early_exit() -> None:
+    """Stop once the expected robots answered."""
+    by_count = _FoundRobots(expected=2, macs=None)
+    by_mac = _FoundRobots(expected=None, macs=["AA:AA:AA:AA:AA:AA"])
+
+    by_count.add(_robot("aa:aa:aa:aa:aa:aa"))
+    by_mac.add(_robot("bb:bb:bb:bb:bb:bb"))
+    assert not by_count.done
+    assert not by_mac.done
+
+    by_count.add(_robot("bb:bb:bb:bb:bb:bb"))
+    by_mac.add(_robot("aa:aa:aa:aa:aa:aa"))
+    assert by_count.done
+    assert by_mac.done
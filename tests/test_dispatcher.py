@@ -0,0 +1,189 @@
+"""Test the message callback dispatchers."""
+
+import asyncio
+import threading
+from collections.abc import Callable, Iterator
+from typing import Any
+
+import paho.mqtt.client as mqtt
+import pytest
+from roombapy import Roomba
+from roombapy.dispatcher import (
+    AsyncioDispatcher,
+    Dispatcher,
+    OverflowPolicy,
+    ThreadPoolDispatcher,
+)
+
+from tests.conftest import as_message
+
+TIMEOUT = 5
+
+
+class BlockingCallback:
+    """Callback which blocks until it is released."""
+
+    def __init__(self) -> None:
+        """Start blocked."""
+        self.started = threading.Event()
+        self.released = threading.Event()
+        self.received: list[dict[str, Any]] = []
+
+    def __call__(self, message: dict[str, Any]) -> None:
+        """Record the message, then wait for the release."""
+        self.started.set()
+        self.released.wait(TIMEOUT)
+        self.received.append(message)
+
+
+@pytest.fixture
+def callback() -> Iterator[BlockingCallback]:
+    """Blocking callback, released after the test."""
+    callback = BlockingCallback()
+    yield callback
+    callback.released.set()
+
+
+def _pool(overflow: OverflowPolicy) -> ThreadPoolDispatcher:
+    return ThreadPoolDispatcher(workers=1, max_queue=2, overflow=overflow)
+
+
+def _wait_for(condition: Callable[[], bool]) -> None:
+    event = threading.Event()
+    for _ in range(TIMEOUT * 100):
+        if condition():
+            return
+        event.wait(0.01)
+    pytest.fail("condition not met")
+
+
+def test_inline_dispatcher() -> None:
+    """Callbacks are called right away and measured."""
+    received: list[dict[str, Any]] = []
+    dispatcher = Dispatcher()
+
+    dispatcher.dispatch(received.append, {"batPct": 1})
+
+    assert received == [{"batPct": 1}]
+    [stats] = dispatcher.stats.values()
+    assert stats.calls == 1
+    assert stats.mean_run >= 0
+    assert stats.name == "list.append"
+
+
+def test_stats_per_callback() -> None:
+    """Callbacks with the same name are measured apart."""
+    first: list[dict[str, Any]] = []
+    second: list[dict[str, Any]] = []
+    dispatcher = Dispatcher()
+
+    dispatcher.dispatch(first.append, {"batPct": 1})
+    dispatcher.dispatch(first.append, {"batPct": 2})
+    dispatcher.dispatch(second.append, {"batPct": 1})
+    dispatcher.dispatch(lambda _message: None, {"batPct": 1})
+    dispatcher.dispatch(lambda _message: None, {"batPct": 1})
+
+    assert dispatcher.stats[first.append].calls == 2
+    assert dispatcher.stats[second.append].calls == 1
+    assert len(dispatcher.stats) == 4
+
+
+def test_drop_oldest(callback: BlockingCallback) -> None:
+    """The oldest waiting call is dropped when the queue is full."""
+    dispatcher = _pool(OverflowPolicy.DROP_OLDEST)
+    dispatcher.dispatch(callback, {"batPct": 1})
+    assert callback.started.wait(TIMEOUT)
+    for percent in range(2, 5):
+        dispatcher.dispatch(callback, {"batPct": percent})
+
+    callback.released.set()
+    _wait_for(lambda: len(callback.received) == 3)
+    dispatcher.close()
+
+    assert callback.received == [{"batPct": 1}, {"batPct": 3}, {"batPct": 4}]
+    [stats] = dispatcher.stats.values()
+    assert stats.dropped == 1
+    assert stats.max_wait > 0
+
+
+def test_coalesce(callback: BlockingCallback) -> None:
+    """Deltas of a robot are merged when the queue is full."""
+    dispatcher = _pool(OverflowPolicy.COALESCE)
+    dispatcher.dispatch(callback, {"batPct": 1}, "first")
+    assert callback.started.wait(TIMEOUT)
+    dispatcher.dispatch(callback, {"bin": {"full": False}}, "first")
+    dispatcher.dispatch(callback, {"batPct": 2}, "second")
+    dispatcher.dispatch(callback, {"bin": {"present": True}}, "first")
+
+    callback.released.set()
+    _wait_for(lambda: len(callback.received) == 3)
+    dispatcher.close()
+
+    assert callback.received == [
+        {"batPct": 1},
+        {"bin": {"full": False, "present": True}},
+        {"batPct": 2},
+    ]
+    [stats] = dispatcher.stats.values()
+    assert stats.coalesced == 1
+
+
+def test_block(callback: BlockingCallback) -> None:
+    """The receiving thread waits for room in the queue."""
+    dispatcher = _pool(OverflowPolicy.BLOCK)
+    dispatcher.dispatch(callback, {"batPct": 1})
+    assert callback.started.wait(TIMEOUT)
+    dispatcher.dispatch(callback, {"batPct": 2})
+    dispatcher.dispatch(callback, {"batPct": 3})
+    sender = threading.Thread(
+        target=dispatcher.dispatch, args=(callback, {"batPct": 4})
+    )
+    sender.start()
+    sender.join(0.1)
+    assert sender.is_alive()
+
+    callback.released.set()
+    sender.join(TIMEOUT)
+    _wait_for(lambda: len(callback.received) == 4)
+    dispatcher.close()
+
+    assert [message["batPct"] for message in callback.received] == [1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_asyncio_dispatcher() -> None:
+    """Callbacks are called on the event loop."""
+    loop = asyncio.get_running_loop()
+    dispatcher = AsyncioDispatcher(loop)
+    received: asyncio.Queue[tuple[dict[str, Any], bool]] = asyncio.Queue()
+
+    def callback(message: dict[str, Any]) -> None:
+        received.put_nowait((message, asyncio.get_running_loop() is loop))
+
+    await loop.run_in_executor(
+        None, dispatcher.dispatch, callback, {"batPct": 1}
+    )
+
+    assert await asyncio.wait_for(received.get(), TIMEOUT) == (
+        {"batPct": 1},
+        True,
+    )
+
+
+def test_roomba_doesnt_wait_for_callbacks(
+    roomba: Roomba,
+    empty_mqtt_client: mqtt.Client,
+    callback: BlockingCallback,
+) -> None:
+    """Slow callbacks don't block the network thread."""
+    roomba.dispatcher = ThreadPoolDispatcher(workers=1)
+    roomba.register_on_message_callback(callback)
+
+    roomba.on_message(empty_mqtt_client, None, as_message(b'{"batPct": 1}'))
+    roomba.on_message(empty_mqtt_client, None, as_message(b'{"batPct": 2}'))
+
+    assert roomba.master_state == {"batPct": 2}
+    callback.released.set()
+    _wait_for(lambda: len(callback.received) == 2)
+    roomba.dispatcher.close()
+    assert callback.received == [{"batPct": 1}, {"batPct": 2}]
@@ -0,0 +1,98 @@
+"""Test sending commands to many robots."""
+
+import orjson
+import paho.mqtt.client as mqtt
+import pytest
+from roombapy import Roomba, RoombaFactory
+from roombapy.command_queue import CommandError, prepare_command
+from roombapy.fanout import fan_out
+
+from tests.conftest import ROOMBA_HOST, ROOMBA_PASSWORD, as_message_info
+
+BLIDS = ["first", "second", "third"]
+
+PublishedByBlid = dict[str, list[bytes]]
+
+
+@pytest.fixture
+def published() -> PublishedByBlid:
+    """Payloads published per BLID."""
+    return {blid: [] for blid in BLIDS}
+
+
+@pytest.fixture
+def roombas(
+    published: PublishedByBlid, monkeypatch: pytest.MonkeyPatch
+) -> list[Roomba]:
+    """Create connected robots recording their published payloads."""
+    roombas = []
+    for blid in BLIDS:
+        roomba = RoombaFactory.create_roomba(
+            ROOMBA_HOST, blid, ROOMBA_PASSWORD
+        )
+
+        def publish(
+            _topic: str, payload: bytes, blid: str = blid
+        ) -> mqtt.MQTTMessageInfo:
+            published[blid].append(payload)
+            return as_message_info(
+                len(published[blid]), rc=int(blid == "third")
+            )
+
+        monkeypatch.setattr(roomba.remote_client, "publish", publish)
+        monkeypatch.setattr(
+            roomba.remote_client, "subscribe", lambda _topics: None
+        )
+        roomba.on_connect(None)
+        roombas.append(roomba)
+    return roombas
+
+
+def test_prepare_command() -> None:
+    """Commands are serialized once, parameters can be added later."""
+    command = prepare_command("start", {"ordered": 1}, sent=1700000000)
+
+    assert orjson.loads(command.payload) == {
+        "command": "start",
+        "time": 1700000000,
+        "initiator": "localApp",
+        "ordered": 1,
+    }
+    with_regions = command.with_params({"regions": [{"region_id": "3"}]})
+    assert orjson.loads(with_regions.payload) == with_regions.document
+    assert with_regions.document["regions"] == [{"region_id": "3"}]
+    assert command.with_params({}) is command
+    with pytest.raises(ValueError, match="ordered"):
+        command.with_params({"ordered": 0})
+
+
+def test_fan_out(
+    roombas: list[Roomba],
+    published: PublishedByBlid,
+    empty_mqtt_client: mqtt.Client,
+) -> None:
+    """Every robot gets the command, with its own parameters."""
+    result = fan_out(roombas, "start", per_robot={"second": {"pmap_id": "x"}})
+    roombas[0].on_publish(empty_mqtt_client, None, 1)
+
+    first, second = published["first"][0], published["second"][0]
+    assert orjson.loads(second) == {**orjson.loads(first), "pmap_id": "x"}
+    outcome = result.wait_published(0)
+    assert outcome["first"] is None
+    assert isinstance(outcome["second"], TimeoutError)
+    assert isinstance(outcome["third"], CommandError)
+
+
+@pytest.mark.asyncio
+async def test_async_fan_out(
+    roombas: list[Roomba], empty_mqtt_client: mqtt.Client
+) -> None:
+    """The outcome of all robots can be awaited."""
+    result = fan_out(roombas[:2], "dock")
+    for roomba in roombas[:2]:
+        roomba.on_publish(empty_mqtt_client, None, 1)
+
+    assert await result.async_wait_published() == {
+        "first": None,
+        "second": None,
+    }
@@ -0,0 +1,65 @@
+"""Test the Roomba fleet."""
+
+import asyncio
+
+import pytest
+from roombapy.fleet import RoombaFleet
+from roombapy.reconnect import ReconnectScheduler
+
+from tests.conftest import ROOMBA_HOST, ROOMBA_PASSWORD, as_message
+
+BLIDS = ["first", "second", "third"]
+
+
+@pytest.fixture
+def fleet(unused_tcp_port: int) -> RoombaFleet:
+    """Mock for a fleet of robots without a server to connect to."""
+    fleet = RoombaFleet(
+        [(ROOMBA_HOST, blid, ROOMBA_PASSWORD) for blid in BLIDS],
+        scheduler=ReconnectScheduler(min_backoff=10, jitter=0.5),
+    )
+    for roomba in fleet.roombas.values():
+        roomba.remote_client.port = unused_tcp_port
+    return fleet
+
+
+def test_fleet_message_callbacks(fleet: RoombaFleet) -> None:
+    """Fleet callbacks get the BLID with every message."""
+    received = []
+    fleet.register_on_message_callback(
+        lambda blid, message: received.append((blid, message))
+    )
+    roomba = fleet.roombas["second"]
+    roomba.on_message(
+        roomba.remote_client.mqtt_client, None, as_message(b'{"batPct": 1}')
+    )
+
+    assert received == [("second", {"batPct": 1})]
+
+
+def test_fleet_sends_to_connected_robots(fleet: RoombaFleet) -> None:
+    """Commands are only sent to connected robots."""
+    fleet.status["first"].connected = True
+    fleet.status["third"].connected = True
+
+    assert fleet.send_command("start") == ["first", "third"]
+    assert fleet.send_command("start", blids={"second", "third"}) == ["third"]
+    assert list(fleet.fan_out("dock").handles) == ["first", "third"]
+
+
+@pytest.mark.asyncio
+async def test_fleet_backoff(fleet: RoombaFleet) -> None:
+    """Failed connections are retried with a backoff."""
+    await fleet.async_connect()
+    # the first attempts are spread by the rate limit of the scheduler
+    await asyncio.sleep(0.8)
+    now = fleet.scheduler.clock()
+    await fleet.async_disconnect()
+
+    for blid, status in fleet.status.items():
+        retry_state = fleet.retry_state(blid)
+        assert not status.connected
+        # the second attempt is waiting for the backoff
+        assert retry_state.attempts == 2
+        assert retry_state.failures == 1
+        assert retry_state.next_attempt > now + 4
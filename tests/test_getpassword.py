@@ -0,0 +1,29 @@
+"""Test getting passwords from robots."""
+
+import pytest
+from roombapy.getpassword import RoombaPassword, get_passwords
+
+
+def test_get_passwords(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Results and errors are returned per IP."""
+
+    def get_password(self: RoombaPassword) -> str | None:
+        if self.roomba_ip == "192.168.0.3":
+            raise TimeoutError
+        if self.roomba_ip == "192.168.0.4":
+            return None
+        return f"password-{self.roomba_ip}"
+
+    monkeypatch.setattr(RoombaPassword, "get_password", get_password)
+    results = get_passwords(
+        ["192.168.0.2", "192.168.0.3", "192.168.0.4", "192.168.0.2"],
+        concurrency=2,
+    )
+
+    assert list(results) == ["192.168.0.2", "192.168.0.3", "192.168.0.4"]
+    assert results["192.168.0.2"].password == "password-192.168.0.2"
+    assert results["192.168.0.2"].error is None
+    assert results["192.168.0.3"].password is None
+    assert isinstance(results["192.168.0.3"].error, TimeoutError)
+    assert results["192.168.0.4"].password is None
+    assert results["192.168.0.4"].error is None
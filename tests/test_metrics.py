@@ -0,0 +1,94 @@
+"""Test the metrics."""
+
+import urllib.request
+
+import paho.mqtt.client as mqtt
+from roombapy import Roomba
+from roombapy.metrics import (
+    Histogram,
+    Metrics,
+    MetricsExporter,
+    RateMeter,
+    shared_metrics,
+)
+
+from tests.conftest import ROOMBA_USERNAME, as_message
+
+POSE = b'{"state":{"reported":{"pose":{"theta":1,"point":{"x":2,"y":3}}}}}'
+
+
+def test_histogram() -> None:
+    """Values are counted in the first bucket they fit into."""
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float("inf"), 4)]
+    assert histogram.sum == 5.65
+
+
+def test_rate_meter() -> None:
+    """Events are averaged over the window."""
+    meter = RateMeter(window=2)
+    for now in (10.0, 10.5, 11.0):
+        meter.add(now)
+
+    assert meter.rate(11.5) == 1.5
+    assert meter.rate(12.0) == 0.5
+    assert meter.rate(20.0) == 0
+
+
+def test_roomba_records_messages(
+    roomba: Roomba, empty_mqtt_client: mqtt.Client
+) -> None:
+    """Messages, malformed payloads and disconnects are counted."""
+    roomba.on_message(empty_mqtt_client, None, as_message(b'{"batPct": 1}'))
+    roomba.on_message(empty_mqtt_client, None, as_message(POSE))
+    roomba.on_message(empty_mqtt_client, None, as_message(POSE))
+    roomba.on_message(empty_mqtt_client, None, as_message(b"garbage"))
+    roomba.remote_client._internal_on_disconnect(empty_mqtt_client, None, 7)
+
+    snapshot = shared_metrics().snapshot()[ROOMBA_USERNAME]
+
+    assert snapshot["messages"] == 3
+    assert snapshot["messages_per_second"] > 0
+    assert snapshot["malformed"] == 1
+    assert snapshot["disconnects"] == {"The connection was lost": 1}
+    for stage in ("decode", "merge", "dispatch"):
+        assert snapshot["latency"][stage]["count"] == 3
+
+
+def test_prometheus_exporter() -> None:
+    """Metrics are served in the Prometheus text format."""
+    metrics = Metrics()
+    robot = metrics.robot("robot")
+    robot.record_connect_attempt()
+    robot.record_connect_failure()
+    robot.record_disconnect('Say "hi"')
+    robot.record_message(0.001, 0.002, 0.003)
+    robot.record_handshake(0.2, resumed=False)
+    robot.record_handshake(0.02, resumed=True)
+    exporter = MetricsExporter(metrics, port=0)
+    exporter.start()
+    try:
+        url = f"http://{exporter.host}:{exporter.port}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            text = response.read().decode()
+    finally:
+        exporter.stop()
+
+    lines = text.splitlines()
+    assert "# TYPE roombapy_messages_total counter" in lines
+    assert 'roombapy_connect_failures_total{blid="robot"} 1' in lines
+    assert (
+        'roombapy_disconnects_total{blid="robot",reason="Say \\"hi\\""} 1'
+        in lines
+    )
+    assert 'roombapy_merge_seconds_bucket{blid="robot",le="+Inf"} 1' in lines
+    assert 'roombapy_decode_seconds_count{blid="robot"} 1' in lines
+    assert 'roombapy_tls_resumptions_total{blid="robot"} 1' in lines
+    assert (
+        'roombapy_tls_handshake_seconds_bucket{blid="robot",le="0.025"} 1'
+        in lines
+    )
+    assert 'roombapy_tls_handshake_seconds_count{blid="robot"} 2' in lines
@@ -0,0 +1,141 @@
+"""Test the mission recorder."""
+
+import time
+from pathlib import Path
+
+import orjson
+import paho.mqtt.client as mqtt
+import pytest
+from roombapy import Roomba, RoombaMessage
+from roombapy.mission_recorder import (
+    HEADER,
+    RECORD,
+    MissionLog,
+    MissionRecorder,
+    MissionWriter,
+    Sample,
+)
+
+from tests.conftest import ROOMBA_USERNAME, as_message
+
+
+def _send(
+    roomba: Roomba, client: mqtt.Client, reported: RoombaMessage
+) -> None:
+    payload = orjson.dumps({"state": {"reported": reported}})
+    roomba.on_message(client, None, as_message(payload))
+
+
+def _pose(x: int, y: int) -> RoombaMessage:
+    return {"pose": {"theta": 0, "point": {"x": x, "y": y}}}
+
+
+def test_records_a_mission(
+    roomba: Roomba, empty_mqtt_client: mqtt.Client, tmp_path: Path
+) -> None:
+    """Samples between a new mission and its end are recorded."""
+    recorder = MissionRecorder(tmp_path)
+    recorder.attach(roomba)
+
+    _send(
+        roomba, empty_mqtt_client, {"cleanMissionStatus": {"phase": "charge"}}
+    )
+    _send(roomba, empty_mqtt_client, _pose(1, 1))
+    _send(roomba, empty_mqtt_client, {"cleanMissionStatus": {"phase": "run"}})
+    assert roomba.current_state == "New Mission"
+    _send(roomba, empty_mqtt_client, {**_pose(2, 3), "batPct": 90})
+    _send(roomba, empty_mqtt_client, _pose(4, 5))
+    _send(
+        roomba,
+        empty_mqtt_client,
+        {"cleanMissionStatus": {"phase": "hmPostMsn"}},
+    )
+    _send(
+        roomba, empty_mqtt_client, {"cleanMissionStatus": {"phase": "charge"}}
+    )
+    assert roomba.current_state == "Docking - End Mission"
+    _send(roomba, empty_mqtt_client, _pose(6, 7))
+
+    [path] = recorder.missions(ROOMBA_USERNAME)
+    with MissionLog(path) as log:
+        samples = list(log)
+
+    assert [(sample.x, sample.y) for sample in samples] == [
+        (1, 1),
+        (2, 3),
+        (4, 5),
+        (4, 5),
+    ]
+    assert [sample.phase for sample in samples] == [
+        "run",
+        "run",
+        "run",
+        "hmPostMsn",
+    ]
+    assert samples[0].battery is None
+    assert samples[1].battery == 90
+
+
+def test_sample_times_ignore_clock_steps(
+    roomba: Roomba,
+    empty_mqtt_client: mqtt.Client,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Setting the wall clock back doesn't reorder the samples."""
+    recorder = MissionRecorder(tmp_path)
+    recorder.attach(roomba)
+    path = recorder.start_mission(ROOMBA_USERNAME, start=1000.0)
+    _send(roomba, empty_mqtt_client, _pose(1, 1))
+    monkeypatch.setattr(time, "time", lambda: 0.0)
+    _send(roomba, empty_mqtt_client, _pose(2, 2))
+    recorder.close()
+
+    with MissionLog(path) as log:
+        times = [sample.time for sample in log]
+        assert times == sorted(times)
+        assert times[0] >= 1000.0
+        assert len(log.between(1000.0, times[-1] + 1)) == 2
+
+
+@pytest.fixture
+def mission(tmp_path: Path) -> Path:
+    """Write a mission with a sample every second."""
+    path = tmp_path / "1.mission"
+    writer = MissionWriter(path, start=100.0)
+    for second in range(10):
+        writer.append(
+            Sample(100.0 + second, second, -second, 90, 100 - second, "run")
+        )
+    writer.close()
+    return path
+
+
+def test_mission_log_queries(mission: Path) -> None:
+    """Samples are read back by index, time and downsampled."""
+    with MissionLog(mission) as log:
+        assert len(log) == 10
+        assert log.start == 100.0
+        assert log.duration == 9.0
+        assert log[-1] == Sample(109.0, 9, -9, 90, 91, "run")
+        assert [sample.x for sample in log.between(102.0, 105.0)] == [2, 3, 4]
+        assert [sample.x for sample in log.downsample(4)] == [0, 3, 6, 9]
+        assert len(log.downsample(20)) == 10
+
+
+def test_mission_log_ignores_partial_sample(mission: Path) -> None:
+    """A sample which was only partially written is skipped."""
+    with mission.open("ab") as file:
+        file.write(b"\x00" * (RECORD.size // 2))
+
+    with MissionLog(mission) as log:
+        assert len(log) == 10
+
+
+def test_mission_log_rejects_other_files(tmp_path: Path) -> None:
+    """Only mission files can be read."""
+    path = tmp_path / "other.mission"
+    path.write_bytes(b"\x00" * HEADER.size)
+
+    with pytest.raises(ValueError, match="Not a mission file"):
+        MissionLog(path)
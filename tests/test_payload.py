@@ -1,6 +1,6 @@
 """Test the decoding of the Roomba messages."""
 
-from roombapy.roomba import _decode_payload
+from roombapy.roomba import _decode_payload, _pose_delta
 
 
 def test_skip_garbage() -> None:
@@ -36,3 +36,22 @@ def test_allow_valid_json() -> None:
         }
     }
     assert _decode_payload(payload) == decoded
+
+
+def test_pose_delta() -> None:
+    """Recognize pose deltas, but nothing else."""
+    payload = (
+        b'{"state":{"reported":{"pose":{"theta":-90,"point":{"x":3,"y":-4}}}}}'
+    )
+    with_battery = payload.replace(b"}}}}}", b'}},"batPct":90}}}')
+
+    def pose_delta(payload: bytes) -> tuple[int, int, int] | None:
+        message = _decode_payload(payload)
+        assert message is not None
+        return _pose_delta(message)
+
+    assert pose_delta(payload) == (-90, 3, -4)
+    assert pose_delta(payload.replace(b"-4", b"-4.5")) is None
+    assert pose_delta(payload.replace(b"-90", b"true")) is None
+    assert pose_delta(with_battery) is None
+    assert pose_delta(b'{"state":{"reported":{"pose":1}}}') is None
@@ -0,0 +1,241 @@
+"""Test polling periodic robots."""
+
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+import pytest
+from roombapy import Roomba, RoombaFactory
+from roombapy.poller import Poller, PollWindow
+
+from tests.conftest import as_message
+
+BATTERY = b'{"state":{"reported":{"batPct":50}}}'
+
+
+def test_window_completes_when_quiet() -> None:
+    """The state is complete once the messages stop."""
+    window = PollWindow(quiet=0.05)
+    timer = threading.Timer(0.01, window.received)
+    timer.start()
+
+    assert window.wait(5)
+    assert window.messages == 1
+    timer.join()
+
+
+def test_window_times_out() -> None:
+    """Without messages the state is never complete."""
+    window = PollWindow(quiet=0.01)
+
+    assert not window.wait(0.05)
+
+
+def test_window_cancel() -> None:
+    """Cancelling stops waiting right away."""
+    window = PollWindow(quiet=0.01)
+    window.cancel()
+
+    assert not window.wait(5)
+
+
+def test_poll_receives_state(
+    roomba: Roomba,
+    empty_mqtt_client: mqtt.Client,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A poll connects, waits for the state and disconnects."""
+    calls: list[str] = []
+
+    def connect() -> bool:
+        calls.append("connect")
+        roomba.on_message(empty_mqtt_client, None, as_message(BATTERY))
+        return True
+
+    monkeypatch.setattr(roomba.remote_client, "connect_once", connect)
+    monkeypatch.setattr(
+        roomba.remote_client, "disconnect", lambda: calls.append("disconnect")
+    )
+    roomba.poll_quiet = 0.01
+    roomba.delay = 30
+
+    assert roomba.poll() == 30
+    assert calls == ["connect", "disconnect"]
+    assert roomba.state.bat_pct == 50
+
+
+def test_poll_failures_reported_once(
+    roomba: Roomba, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A failed poll makes one attempt and returns the backoff."""
+    errors: list[str | None] = []
+    attempts: list[None] = []
+    roomba.register_on_disconnect_callback(errors.append)
+
+    def refuse() -> None:
+        attempts.append(None)
+        raise ConnectionRefusedError
+
+    monkeypatch.setattr(roomba.remote_client, "_open_mqtt_connection", refuse)
+    scheduler = roomba.remote_client.scheduler
+    roomba.delay = 0
+    start = time.monotonic()
+
+    delay = roomba.poll()
+
+    assert len(attempts) == 1
+    assert time.monotonic() - start < 1
+    assert delay >= scheduler.delay(roomba.remote_client.blid) > 0
+    # backing off, no further attempt until the delay passed
+    assert roomba.poll() > 0
+    assert len(attempts) == 1
+    assert errors == ["The connection was lost"]
+
+
+def test_poller_polls_repeatedly(
+    roomba: Roomba, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Robots are polled again after the delay their poll returned."""
+    polled = threading.Semaphore(0)
+
+    def poll() -> float:
+        polled.release()
+        return 0.01
+
+    monkeypatch.setattr(roomba, "poll", poll)
+    poller = Poller()
+    poller.add(roomba)
+    try:
+        for _ in range(3):
+            assert polled.acquire(timeout=5)
+    finally:
+        poller.remove(roomba)
+    assert roomba not in poller
+
+
+def test_periodic_connect_uses_poller(
+    roomba: Roomba, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Periodic robots are polled once connected."""
+    poller = Poller()
+    monkeypatch.setattr(roomba, "poll", lambda: 60.0)
+    roomba.continuous = False
+    roomba.poller = poller
+
+    roomba.connect()
+    assert roomba in poller
+    roomba.disconnect()
+    assert roomba not in poller
+
+
+def _robots(count: int) -> list[Roomba]:
+    return [
+        RoombaFactory.create_roomba(
+            address=f"192.168.0.{number}",
+            blid=f"robot-{number}",
+            password="password",
+            continuous=False,
+        )
+        for number in range(count)
+    ]
+
+
+def test_poller_limits_concurrent_polls(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """No more than max_concurrent robots are polled at once."""
+    running: list[Roomba] = []
+    most = 0
+    polled = threading.Semaphore(0)
+    lock = threading.Lock()
+
+    def polling(roomba: Roomba) -> float:
+        nonlocal most
+        with lock:
+            running.append(roomba)
+            most = max(most, len(running))
+        time.sleep(0.02)
+        with lock:
+            running.remove(roomba)
+        polled.release()
+        return 60.0
+
+    robots = _robots(5)
+    for robot in robots:
+        monkeypatch.setattr(robot, "poll", lambda robot=robot: polling(robot))
+    poller = Poller(max_concurrent=2, stagger=0)
+    for robot in robots:
+        poller.add(robot)
+    try:
+        for _ in robots:
+            assert polled.acquire(timeout=5)
+    finally:
+        for robot in robots:
+            poller.remove(robot)
+
+    assert most == 2
+
+
+def test_poller_staggers_first_polls(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Robots added at once aren't polled at the same moment."""
+    started: dict[str, float] = {}
+    polled = threading.Semaphore(0)
+    robots = _robots(3)
+    for robot in robots:
+
+        def poll(robot: Roomba = robot) -> float:
+            started[robot.remote_client.blid] = time.monotonic()
+            polled.release()
+            return 60.0
+
+        monkeypatch.setattr(robot, "poll", poll)
+    poller = Poller(stagger=0.05)
+    for robot in robots:
+        poller.add(robot)
+    try:
+        for _ in robots:
+            assert polled.acquire(timeout=5)
+    finally:
+        for robot in robots:
+            poller.remove(robot)
+
+    times = [started[robot.remote_client.blid] for robot in robots]
+    assert times == sorted(times)
+    assert times[2] - times[0] >= 0.09
+
+
+def test_poller_reschedule(
+    roomba: Roomba, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A robot can be polled earlier than it was due."""
+    polled = threading.Semaphore(0)
+
+    def poll() -> float:
+        polled.release()
+        return 60.0
+
+    monkeypatch.setattr(roomba, "poll", poll)
+    poller = Poller()
+    poller.add(roomba)
+    try:
+        assert polled.acquire(timeout=5)
+        assert not polled.acquire(timeout=0.05)
+        poller.reschedule(roomba, 0)
+        assert polled.acquire(timeout=5)
+    finally:
+        poller.remove(roomba)
+
+
+def test_poll_interval_follows_mission(roomba: Roomba) -> None:
+    """Robots on a mission are polled more often."""
+    roomba.delay = 600
+    roomba.mission_delay = 30
+
+    roomba.cleanMissionStatus_phase = "charge"
+    assert roomba.poll_interval() == 600
+    roomba.cleanMissionStatus_phase = "run"
+    assert roomba.poll_interval() == 30
+    roomba.mission_delay = None
+    assert roomba.poll_interval() == 600
@@ -0,0 +1,135 @@
+"""Test the reconnect scheduler."""
+
+import threading
+
+import paho.mqtt.client as mqtt
+import pytest
+from roombapy.reconnect import CircuitState, ReconnectScheduler
+from roombapy.remote_client import RoombaRemoteClient
+
+
+class FakeClock:
+    """Clock which only moves when told to."""
+
+    def __init__(self) -> None:
+        """Start at zero."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    """Fake clock for the scheduler."""
+    return FakeClock()
+
+
+def test_backoff_with_jitter(clock: FakeClock) -> None:
+    """Delays double with every failure, shortened by the jitter."""
+    scheduler = ReconnectScheduler(
+        min_backoff=1, max_backoff=8, failure_threshold=100, clock=clock
+    )
+    for failures, backoff in enumerate([1, 2, 4, 8, 8, 8], start=1):
+        assert scheduler.reserve("robot") is not None
+        scheduler.record_failure("robot", "refused")
+        assert backoff * 0.5 <= scheduler.delay("robot") <= backoff
+        assert scheduler.state("robot").failures == failures
+    assert scheduler.state("robot").last_error == "refused"
+
+
+def test_success_resets_backoff(clock: FakeClock) -> None:
+    """A connection resets the failures of a robot."""
+    scheduler = ReconnectScheduler(clock=clock)
+    scheduler.record_failure("robot")
+    scheduler.record_success("robot")
+
+    assert scheduler.delay("robot") == 0
+    assert scheduler.reserve("robot") == 0
+    assert scheduler.state("robot").failures == 0
+
+
+def test_circuit_breaker(clock: FakeClock) -> None:
+    """Robots failing repeatedly are paused, then tried once."""
+    scheduler = ReconnectScheduler(
+        failure_threshold=3, reset_timeout=60, clock=clock
+    )
+    for _ in range(3):
+        scheduler.record_failure("robot")
+
+    assert scheduler.state("robot").circuit is CircuitState.OPEN
+    assert scheduler.reserve("robot") is None
+    assert scheduler.delay("robot") == 60
+
+    clock.now = 60
+    assert scheduler.reserve("robot") == 0
+    assert scheduler.state("robot").circuit is CircuitState.HALF_OPEN
+    # a failing trial pauses the robot again
+    scheduler.record_failure("robot")
+    assert scheduler.reserve("robot") is None
+
+    clock.now = 120
+    assert scheduler.reserve("robot") == 0
+    scheduler.record_success("robot")
+    assert scheduler.state("robot").circuit is CircuitState.CLOSED
+
+
+def test_rate_limit_spreads_attempts(clock: FakeClock) -> None:
+    """Robots reconnecting at once get slots of the process rate limit."""
+    scheduler = ReconnectScheduler(max_attempt_rate=4, clock=clock)
+
+    delays = [scheduler.reserve(f"robot{index}") for index in range(5)]
+
+    assert delays == [0, 0.25, 0.5, 0.75, 1.0]
+    assert set(scheduler.states()) == {f"robot{index}" for index in range(5)}
+    clock.now = 10
+    assert scheduler.reserve("robot0") == 0
+
+
+def test_dropped_client_reconnects_through_scheduler(
+    clock: FakeClock, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A dropped connection is reconnected after reserving an attempt."""
+    scheduler = ReconnectScheduler(clock=clock)
+    client = RoombaRemoteClient(
+        "127.0.0.1", "robot", "password", 8883, scheduler
+    )
+    client.set_on_connect(lambda _error: None)
+    client.set_on_disconnect(lambda _error: None)
+    calls: list[str] = []
+    reconnected = threading.Event()
+
+    def reserve(key: str) -> float | None:
+        calls.append("reserve")
+        return ReconnectScheduler.reserve(scheduler, key)
+
+    def open_connection() -> None:
+        calls.append("open")
+        if calls.count("open") == 2:
+            reconnected.set()
+
+    monkeypatch.setattr(scheduler, "reserve", reserve)
+    monkeypatch.setattr(client, "_open_mqtt_connection", open_connection)
+    monkeypatch.setattr(client, "_record_handshake", lambda: None)
+    assert client.connect()
+
+    client._internal_on_disconnect(
+        client.mqtt_client, None, mqtt.MQTT_ERR_CONN_LOST
+    )
+
+    # the rate limit has no slot before 0.2s
+    assert not reconnected.wait(0.5)
+    assert calls == ["reserve", "open", "reserve"]
+    clock.now = 1
+    assert reconnected.wait(5)
+    assert calls == ["reserve", "open", "reserve", "reserve", "open"]
+    assert not any(
+        thread.name.startswith("roombapy-reconnect")
+        for thread in threading.enumerate()
+    )
+
+    # a requested disconnect isn't reconnected
+    client.disconnect()
+    client._internal_on_disconnect(client.mqtt_client, None, 0)
+    assert calls.count("open") == 2
@@ -1,7 +1,9 @@
 """Test the Roomba class."""
 
+import orjson
 import paho.mqtt.client as mqtt
-from roombapy import Roomba
+from roombapy import Roomba, RoombaMessage
+from roombapy.state import MISSING, StateChange
 
 from tests.conftest import as_message
 
@@ -39,3 +41,67 @@ def test_roomba_with_data(
     assert state["state"]["reported"]["bin"]["present"]
     assert not state["state"]["reported"]["bin"]["full"]
     assert state["state"]["reported"]["batPct"] == 100
+    assert roomba.state.bat_pct == 100
+    assert roomba.state.mission.mssn_m == 108
+    assert roomba.state_index["signal_snr"] == 52
+
+
+def test_roomba_tracks_reported_values(
+    roomba: Roomba, empty_mqtt_client: mqtt.Client
+) -> None:
+    """Test Roomba tracks values from the flattened state."""
+    roomba.on_message(
+        empty_mqtt_client,
+        None,
+        as_message(
+            b'{"state":{"reported":{"cleanMissionStatus":{"phase":"run",'
+            b'"error":17},"bin":{"full":true},"pose":{"theta":90,'
+            b'"point":{"x":10,"y":-20}}}}}',
+        ),
+    )
+
+    assert roomba.state_index["cleanMissionStatus_phase"] == "run"
+    assert roomba.cleanMissionStatus_phase == "run"
+    assert roomba.bin_full
+    assert roomba.error_code == 17
+    assert roomba.error_message == "Path blocked"
+    assert roomba.co_ords == {"x": -20, "y": 10, "theta": 90}
+
+
+def test_roomba_change_callbacks(
+    roomba: Roomba, empty_mqtt_client: mqtt.Client
+) -> None:
+    """Test change callbacks only get matching changed values."""
+    received: list[list[StateChange]] = []
+    roomba.register_on_change_callback("bin_*", received.append)
+    payload = b'{"state":{"reported":{"bin":{"full":false},"batPct":90}}}'
+
+    roomba.on_message(empty_mqtt_client, None, as_message(payload))
+    roomba.on_message(empty_mqtt_client, None, as_message(payload))
+
+    assert received == [[StateChange("bin_full", old=MISSING, new=False)]]
+
+
+def test_roomba_pose_fast_path(
+    roomba: Roomba, empty_mqtt_client: mqtt.Client
+) -> None:
+    """Test pose deltas end up like any other message."""
+    received: list[RoombaMessage] = []
+    changes: list[list[StateChange]] = []
+    roomba.register_on_message_callback(received.append)
+    roomba.register_on_change_callback("pose_*", changes.append)
+    first = (
+        b'{"state":{"reported":{"pose":{"theta":90,"point":{"x":10,"y":0}}}}}'
+    )
+    second = (
+        b'{"state":{"reported":{"pose":{"theta":90,"point":{"x":12,"y":0}}}}}'
+    )
+
+    roomba.on_message(empty_mqtt_client, None, as_message(first))
+    roomba.on_message(empty_mqtt_client, None, as_message(second))
+
+    assert received == [orjson.loads(first), orjson.loads(second)]
+    assert changes[-1] == [StateChange("pose_point_x", old=10, new=12)]
+    assert roomba.master_state == orjson.loads(second)
+    assert roomba.co_ords == {"x": 0, "y": 12, "theta": 90}
+    assert roomba.state.pose.y == 0
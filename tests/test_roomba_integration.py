@@ -4,7 +4,9 @@ import asyncio
 from asyncio import BaseEventLoop
 
 import pytest
-from roombapy import Roomba
+from roombapy import Roomba, RoombaFactory
+
+from tests.conftest import ROOMBA_HOST, ROOMBA_PASSWORD, ROOMBA_USERNAME
 
 
 @pytest.mark.asyncio
@@ -26,6 +28,20 @@ async def test_roomba_connect_error(
     assert not is_connected
 
 
+@pytest.mark.asyncio
+async def test_async_roomba_connect() -> None:
+    """Connect to the Roomba from the event loop."""
+    roomba = RoombaFactory.create_async_roomba(
+        address=ROOMBA_HOST, blid=ROOMBA_USERNAME, password=ROOMBA_PASSWORD
+    )
+    await roomba.async_connect()
+    await asyncio.sleep(1)
+    is_connected = roomba.roomba_connected
+    await roomba.async_disconnect()
+    assert is_connected
+    assert not roomba.roomba_connected
+
+
 async def roomba_connect(robot: Roomba, loop: BaseEventLoop) -> bool:
     """Connect to the Roomba."""
     await loop.run_in_executor(None, robot.connect)
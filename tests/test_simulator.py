@@ -0,0 +1,170 @@
+"""Test the simulated robots against the real clients."""
+
+import asyncio
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from roombapy import AsyncRoomba, RoombaFactory, RoombaPassword
+from roombapy.const import COMMAND_PHASES
+from roombapy.discovery import RoombaDiscovery
+from roombapy.roomba import RoombaConnectionError
+from roombapy.simulator import (
+    SIMULATED_PHASES,
+    RoombaSimulator,
+    SimulatedRoomba,
+)
+
+CERTIFICATES = (
+    Path(__file__).parent.parent
+    / ".github"
+    / "workflows"
+    / "mosquitto"
+    / "tls-certificates"
+)
+BLID = "0123456789ABCDEF"
+PASSWORD = "simulated-password"
+
+
+@pytest.fixture
+def robot(unused_tcp_port: int) -> SimulatedRoomba:
+    """Create a simulated robot on a free port."""
+    return SimulatedRoomba(
+        blid=BLID, password=PASSWORD, port=unused_tcp_port, dock_time=0.1
+    )
+
+
+@pytest_asyncio.fixture
+async def simulator(
+    robot: SimulatedRoomba, unused_udp_port: int
+) -> AsyncIterator[RoombaSimulator]:
+    """Run a simulator with a single robot."""
+    async with RoombaSimulator(
+        [robot],
+        certfile=str(CERTIFICATES / "test.crt"),
+        keyfile=str(CERTIFICATES / "test.key"),
+        discovery_address="127.0.0.1",
+        discovery_port=unused_udp_port,
+    ) as simulator:
+        yield simulator
+
+
+def _connect(robot: SimulatedRoomba, password: str = PASSWORD) -> AsyncRoomba:
+    roomba = RoombaFactory.create_async_roomba(robot.ip, robot.blid, password)
+    roomba.remote_client.port = robot.port
+    return roomba
+
+
+async def _wait_for_phase(roomba: AsyncRoomba, phase: str) -> None:
+    while roomba.state.mission.phase != phase:  # noqa: ASYNC110
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("simulator")
+async def test_password(robot: SimulatedRoomba) -> None:
+    """The robot hands out its password."""
+    getter = RoombaPassword(robot.ip)
+    getter.roomba_port = robot.port
+    loop = asyncio.get_running_loop()
+
+    assert await loop.run_in_executor(None, getter.get_password) == PASSWORD
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("simulator")
+async def test_command(robot: SimulatedRoomba) -> None:
+    """Commands change the reported phase."""
+    roomba = _connect(robot)
+    await roomba.async_connect()
+    try:
+        await asyncio.wait_for(_wait_for_phase(roomba, "charge"), 5)
+        assert roomba.state.name == robot.name
+        assert robot.connected
+
+        handle = await roomba.async_send_command("start")
+        await asyncio.wait_for(handle.async_wait_confirmed(), 5)
+        assert handle.published.done()
+        assert roomba.current_state == "Running"
+
+        await roomba.async_send_command("dock")
+        await asyncio.wait_for(_wait_for_phase(roomba, "charge"), 5)
+    finally:
+        await roomba.async_disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("simulator")
+async def test_bad_password(robot: SimulatedRoomba) -> None:
+    """Connections with a wrong password are refused."""
+    roomba = _connect(robot, password="wrong")
+    errors: asyncio.Queue[str | None] = asyncio.Queue()
+    roomba.register_on_connect_callback(errors.put_nowait)
+    await roomba.async_connect()
+    try:
+        assert await asyncio.wait_for(errors.get(), 5) is not None
+        assert not robot.connected
+    finally:
+        await roomba.async_disconnect()
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("simulator")
+async def test_single_session(robot: SimulatedRoomba) -> None:
+    """Like a real robot, only one client can be connected at a time."""
+    first = _connect(robot)
+    second = _connect(robot)
+    errors: asyncio.Queue[str | None] = asyncio.Queue()
+    first.register_on_connect_callback(errors.put_nowait)
+    second.register_on_connect_callback(errors.put_nowait)
+    try:
+        await first.async_connect()
+        assert await asyncio.wait_for(errors.get(), 5) is None
+        await second.async_connect()
+        assert await asyncio.wait_for(errors.get(), 5) is not None
+    except RoombaConnectionError:
+        pytest.fail("connection failed")
+    finally:
+        await first.async_disconnect()
+        await second.async_disconnect()
+
+
+@pytest.mark.asyncio
+async def test_discovery(
+    simulator: RoombaSimulator, robot: SimulatedRoomba
+) -> None:
+    """The simulator answers discovery probes."""
+    assert simulator.discovery_port is not None
+    discovery = RoombaDiscovery(["127.0.0.1"])
+    discovery.udp_bind_address = "127.0.0.3"
+    discovery.udp_port = simulator.discovery_port
+
+    found = [robot async for robot in discovery.async_iter_all(5, expected=1)]
+
+    assert [(info.blid, info.ip) for info in found] == [(BLID, robot.ip)]
+
+
+def test_fleet_addresses() -> None:
+    """Fleet robots get consecutive addresses and distinct identities."""
+    simulator = RoombaSimulator.fleet(
+        3,
+        first_address="127.0.1.250",
+        certfile=str(CERTIFICATES / "test.crt"),
+        keyfile=str(CERTIFICATES / "test.key"),
+    )
+
+    assert [robot.ip for robot in simulator.robots] == [
+        "127.0.1.250",
+        "127.0.1.251",
+        "127.0.1.252",
+    ]
+    assert len({robot.blid for robot in simulator.robots}) == 3
+    assert len({robot.mac for robot in simulator.robots}) == 3
+
+
+def test_simulated_phases_confirm_commands() -> None:
+    """Every simulated command reports a phase confirming it."""
+    assert SIMULATED_PHASES.keys() == COMMAND_PHASES.keys()
+    for command, phase in SIMULATED_PHASES.items():
+        assert phase in COMMAND_PHASES[command]
@@ -0,0 +1,89 @@
+"""Test saving and restoring the state of robots."""
+
+import time
+from pathlib import Path
+
+import orjson
+import paho.mqtt.client as mqtt
+import pytest
+from roombapy import Roomba
+from roombapy.snapshot import MAX_AGE, SNAPSHOT_VERSION
+
+from tests.conftest import as_message
+
+REPORTED = (
+    b'{"state":{"reported":{"cleanMissionStatus":{"cycle":"clean",'
+    b'"phase":"run","error":17,"mssnM":5},"bin":{"full":false},'
+    b'"batPct":80,"pose":{"theta":90,"point":{"x":10,"y":-20}}}}}'
+)
+
+
+@pytest.fixture
+def snapshot(
+    roomba: Roomba, empty_mqtt_client: mqtt.Client, tmp_path: Path
+) -> Path:
+    """Snapshot of a cleaning robot."""
+    roomba.on_message(empty_mqtt_client, None, as_message(REPORTED))
+    path = tmp_path / "roomba.json"
+    roomba.save_snapshot(path)
+    return path
+
+
+def test_restores_state(roomba: Roomba, snapshot: Path) -> None:
+    """The state is restored without calling any callbacks."""
+    restored = Roomba(roomba.remote_client)
+    changes: list[object] = []
+    restored.register_on_change_callback("*", changes.append)
+
+    assert restored.restore_snapshot(snapshot)
+
+    assert restored.master_state == roomba.master_state
+    assert restored.state_index["batPct"] == 80
+    assert restored.state.bat_pct == 80
+    assert restored.current_state == roomba.current_state
+    assert restored.cleanMissionStatus_phase == "run"
+    assert restored.error_code == 17
+    assert restored.error_message == "Path blocked"
+    assert restored.co_ords == {"x": -20, "y": 10, "theta": 90}
+    assert not changes
+
+
+def test_ignores_stale_snapshot(roomba: Roomba, snapshot: Path) -> None:
+    """Snapshots older than the maximum age aren't restored."""
+    restored = Roomba(roomba.remote_client)
+    data = orjson.loads(snapshot.read_bytes())
+    data["saved"] = time.time() - MAX_AGE - 1
+    snapshot.write_bytes(orjson.dumps(data))
+
+    assert not restored.restore_snapshot(snapshot)
+    assert restored.restore_snapshot(snapshot, max_age=2 * MAX_AGE)
+
+
+@pytest.mark.parametrize(
+    ("key", "value"),
+    [("version", SNAPSHOT_VERSION + 1), ("blid", "other"), ("saved", None)],
+)
+def test_ignores_foreign_snapshot(
+    roomba: Roomba, snapshot: Path, key: str, value: object
+) -> None:
+    """Snapshots of other versions or robots aren't restored."""
+    restored = Roomba(roomba.remote_client)
+    data = orjson.loads(snapshot.read_bytes())
+    data[key] = value
+    snapshot.write_bytes(orjson.dumps(data))
+
+    assert not restored.restore_snapshot(snapshot)
+    assert restored.master_state == {}
+
+
+@pytest.mark.parametrize("content", [b"", b"{", b"[]", b'{"version":1}'])
+def test_ignores_damaged_snapshot(
+    roomba: Roomba, tmp_path: Path, content: bytes
+) -> None:
+    """Damaged and missing snapshots aren't restored."""
+    path = tmp_path / "roomba.json"
+    assert not roomba.restore_snapshot(path)
+
+    path.write_bytes(content)
+    assert not roomba.restore_snapshot(path)
+    assert roomba.master_state == {}
@@ -0,0 +1,113 @@
+"""Test the flattened Roomba state."""
+
+from typing import Any
+
+from roombapy.state import (
+    MISSING,
+    PathMatcher,
+    StateChange,
+    StateIndex,
+    flatten,
+    merge,
+)
+
+
+def test_flatten_drops_reported_prefix() -> None:
+    """Flatten nested keys and drop the redundant reported prefix."""
+    message = {
+        "state": {
+            "reported": {"bin": {"full": False}, "batPct": 100},
+            "desired": {"name": "Roomba"},
+        }
+    }
+    assert dict(flatten(message)) == {
+        "bin_full": False,
+        "batPct": 100,
+        "state_desired_name": "Roomba",
+    }
+
+
+def test_merge_returns_changes() -> None:
+    """Only values that actually changed are returned."""
+    state: dict[str, Any] = {}
+    merge(state, {"state": {"reported": {"bin": {"full": False}}}})
+    changes = merge(
+        state,
+        {
+            "state": {
+                "reported": {
+                    "bin": {"full": False},
+                    "pose": {"point": {"x": 1, "y": 2}},
+                }
+            }
+        },
+    )
+
+    assert changes == [
+        StateChange("pose_point_x", MISSING, 1),
+        StateChange("pose_point_y", MISSING, 2),
+    ]
+    assert merge(state, {"state": {"reported": {"bin": {"full": 0}}}}) == [
+        StateChange("bin_full", old=False, new=0)
+    ]
+
+
+def test_merge_replaces_subtrees() -> None:
+    """Report removed leaves when a subtree is replaced by a plain value."""
+    state: dict[str, Any] = {"state": {"reported": {"dock": {"known": True}}}}
+
+    assert merge(state, {"state": {"reported": {"dock": None}}}) == [
+        StateChange("dock_known", old=True, new=MISSING),
+        StateChange("dock", MISSING, None),
+    ]
+    assert merge(state, {"state": {"reported": {"dock": {"known": 1}}}}) == [
+        StateChange("dock", None, MISSING),
+        StateChange("dock_known", MISSING, 1),
+    ]
+    assert state == {"state": {"reported": {"dock": {"known": 1}}}}
+
+
+def test_index_reads_the_state() -> None:
+    """The index follows the merged state without a copy of it."""
+    state: dict[str, Any] = {}
+    index = StateIndex(state)
+    merge(state, {"a": {"b": 1, "c": 2}})
+    assert dict(index.items()) == {"a_b": 1, "a_c": 2}
+    merge(state, {"a": 3})
+
+    assert dict(index.items()) == {"a": 3}
+    assert len(index) == 1
+
+
+def test_index_resolves_flat_keys() -> None:
+    """Flat keys are found whatever underscores the nested keys contain."""
+    state: dict[str, Any] = {
+        "state": {
+            "reported": {
+                "bin": {"full": False},
+                "bin_x": {"full": True},
+                "lastCommand": {"command": "start", "time": None},
+            },
+            "desired": {"binPause": True},
+        }
+    }
+    index = StateIndex(state)
+
+    assert index["bin_full"] is False
+    assert index["bin_x_full"] is True
+    assert index["lastCommand_command"] == "start"
+    assert "lastCommand_time" in index
+    assert index.get("lastCommand_time", 0) is None
+    assert index["state_desired_binPause"] is True
+    assert "bin" not in index
+    assert index.get("lastCommand_initiator") is None
+    assert dict(index.items()) == dict(flatten(state))
+
+
+def test_path_matcher() -> None:
+    """Match flat keys against glob patterns."""
+    matcher = PathMatcher("cleanMissionStatus_*")
+
+    assert matcher("cleanMissionStatus_phase")
+    assert matcher("cleanMissionStatus_phase")
+    assert not matcher("pose_theta")
@@ -0,0 +1,92 @@
+"""Test the mission state machine."""
+
+import pytest
+from roombapy import Roomba
+from roombapy.const import ROOMBA_STATES, State
+from roombapy.state_machine import TRANSITIONS, Transition, next_state
+
+
+def _run(phases: list[str], *, mission_none: bool = False) -> list[State]:
+    states = []
+    state = ROOMBA_STATES["charge"]
+    for phase in phases:
+        transition = next_state(
+            state, phase, bin_full=False, mission_none=mission_none
+        )
+        assert transition is not None
+        state = transition.state
+        states.append(state)
+    return states
+
+
+def test_normal_mission() -> None:
+    """A mission starts with a new mission and ends at the dock."""
+    assert _run(["run", "run", "hmPostMsn", "charge", "charge"]) == [
+        "New Mission",
+        "Running",
+        "End Mission",
+        "Docking - End Mission",
+        "Charging",
+    ]
+
+
+def test_mid_mission_recharge() -> None:
+    """Recharging during a mission pauses it on a full bin."""
+    assert _run(["run", "run", "hmMidMsn", "charge", "run"]) == [
+        "New Mission",
+        "Running",
+        "Docking",
+        "Recharging",
+        "Paused",
+    ]
+    assert next_state(
+        "Recharging", "charge", bin_full=True, mission_none=False
+    ) == Transition("Paused")
+
+
+def test_cancelled_mission() -> None:
+    """A paused mission without mission minutes was cancelled."""
+    assert next_state(
+        "Paused", "charge", bin_full=False, mission_none=True
+    ) == Transition("Docking - End Mission")
+    assert next_state(
+        "Paused", "charge", bin_full=False, mission_none=False
+    ) == Transition("Paused", refresh=True)
+
+
+def test_table_covers_all_known_inputs() -> None:
+    """Every known state and phase has a precomputed transition."""
+    states = set(ROOMBA_STATES.values())
+    assert len(TRANSITIONS) == len(states) * len(ROOMBA_STATES) * 4
+    assert (
+        next_state("Running", "weird", bin_full=False, mission_none=False)
+        is None
+    )
+    assert next_state(
+        "Custom", "run", bin_full=False, mission_none=False
+    ) == Transition("Running")
+
+
+def test_roomba_skips_settled_state(
+    roomba: Roomba, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Nothing is evaluated while the inputs of a settled state are kept."""
+    calls = []
+
+    def counting_next_state(*args: object, **kwargs: bool) -> object:
+        calls.append(args)
+        return next_state(*args, **kwargs)  # type: ignore[arg-type]
+
+    monkeypatch.setattr("roombapy.roomba.next_state", counting_next_state)
+    roomba.current_state = ROOMBA_STATES["charge"]
+    roomba.cleanMissionStatus_phase = "run"
+    for _ in range(5):
+        roomba.update_state_machine()
+
+    # charge -> new mission -> running, then it's settled
+    assert roomba.current_state == "Running"
+    assert len(calls) == 3
+
+    roomba.bin_full = True
+    roomba.update_state_machine()
+    assert len(calls) == 4
@@ -0,0 +1,45 @@
+"""Test the typed Roomba state model."""
+
+from typing import Any
+
+from roombapy.state import merge
+from roombapy.state_model import RoombaState
+
+
+def test_state_model_from_deltas() -> None:
+    """Known fields become attributes."""
+    master_state: dict[str, Any] = {}
+    state = RoombaState()
+    state.apply(
+        merge(
+            master_state,
+            {
+                "state": {
+                    "reported": {
+                        "batPct": 87,
+                        "bin": {"present": True, "full": False},
+                        "cleanMissionStatus": {"phase": "run", "mssnM": 3},
+                        "pose": {"theta": -90, "point": {"x": 12, "y": 34}},
+                        "signal": {"rssi": -45},
+                    }
+                }
+            },
+        )
+    )
+
+    assert state.bat_pct == 87
+    assert state.bin.present
+    assert state.bin.full is False
+    assert state.mission.phase == "run"
+    assert state.mission.mssn_m == 3
+    assert (state.pose.theta, state.pose.x, state.pose.y) == (-90, 12, 34)
+
+
+def test_state_model_removed_fields() -> None:
+    """Removed values are reset."""
+    master_state: dict[str, Any] = {}
+    state = RoombaState()
+    state.apply(merge(master_state, {"bin": {"full": True}, "a": {"b": 1}}))
+    state.apply(merge(master_state, {"bin": None, "a": 2}))
+
+    assert state.bin.full is None
@@ -0,0 +1,79 @@
+"""Test subscriptions and message filters."""
+
+import paho.mqtt.client as mqtt
+import pytest
+from roombapy import Roomba
+from roombapy.subscription import MessageFilter, Subscription
+
+from tests.conftest import as_message
+
+SHADOW_TOPIC = "$aws/things/test/shadow/update"
+MISSION = b'{"state":{"reported":{"cleanMissionStatus":{"phase":"run"}}}}'
+BATTERY = b'{"state":{"reported":{"batPct":90}}}'
+
+
+def test_filter_by_topic() -> None:
+    """Topics are matched with MQTT topic filters."""
+    message_filter = MessageFilter(
+        topics=("$aws/things/+/shadow/#",),
+        exclude_topics=("$aws/things/+/shadow/update/delta",),
+    )
+
+    assert message_filter(SHADOW_TOPIC, BATTERY)
+    assert not message_filter(f"{SHADOW_TOPIC}/delta", BATTERY)
+    assert not message_filter("wifistat", BATTERY)
+
+
+def test_filter_by_payload() -> None:
+    """Payloads are checked by prefix or by the keys they mention."""
+    by_key = MessageFilter(keys=("cleanMissionStatus",))
+    by_prefix = MessageFilter(prefixes=(b'{"state":{"reported":{"batPct"',))
+
+    assert by_key(SHADOW_TOPIC, MISSION)
+    assert not by_key(SHADOW_TOPIC, BATTERY)
+    assert by_prefix(SHADOW_TOPIC, BATTERY)
+    assert not by_prefix(SHADOW_TOPIC, MISSION)
+    assert MessageFilter()(SHADOW_TOPIC, b"garbage")
+
+
+def test_roomba_skips_filtered_messages(
+    roomba: Roomba, empty_mqtt_client: mqtt.Client
+) -> None:
+    """Rejected messages are neither decoded nor merged."""
+    roomba.message_filter = MessageFilter(keys=("cleanMissionStatus",))
+    topic = SHADOW_TOPIC.encode()
+
+    roomba.on_message(
+        empty_mqtt_client, None, as_message(BATTERY, topic=topic)
+    )
+    roomba.on_message(
+        empty_mqtt_client, None, as_message(MISSION, topic=topic)
+    )
+
+    assert roomba.master_state == {
+        "state": {"reported": {"cleanMissionStatus": {"phase": "run"}}}
+    }
+
+
+def test_roomba_subscribes_on_connect(
+    roomba: Roomba, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """All subscriptions are sent at once when the robot connects."""
+    subscribed: list[object] = []
+    monkeypatch.setattr(
+        roomba.remote_client.mqtt_client,
+        "subscribe",
+        lambda *args: subscribed.append(args),
+    )
+
+    roomba.on_connect(None)
+    roomba.subscriptions = [
+        Subscription("$aws/things/+/shadow/#", qos=1),
+        Subscription("wifistat"),
+    ]
+    roomba.on_connect(None)
+
+    assert subscribed == [
+        ([("#", 0)],),
+        ([("$aws/things/+/shadow/#", 1), ("wifistat", 0)],),
+    ]
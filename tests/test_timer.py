@@ -0,0 +1,52 @@
+"""Test the shared timer."""
+
+import threading
+
+from roombapy.command_queue import call_later_shared
+from roombapy.timer import Timer, shared_timer
+
+TIMEOUT = 5
+
+
+def test_calls_in_due_order() -> None:
+    """Calls run after their delay, the earliest first."""
+    timer = Timer(max_workers=1)
+    called: list[str] = []
+    done = threading.Event()
+
+    timer.call_later(0.05, lambda: called.append("late"))
+    timer.call_later(0.06, done.set)
+    timer.call_later(0.01, lambda: called.append("early"))
+
+    assert done.wait(TIMEOUT)
+    assert called == ["early", "late"]
+    assert not timer
+
+
+def test_failing_call_is_logged() -> None:
+    """A failing call doesn't stop the other calls."""
+    timer = Timer()
+    done = threading.Event()
+
+    def fail() -> None:
+        raise RuntimeError
+
+    timer.call_later(0, fail)
+    timer.call_later(0.01, done.set)
+
+    assert done.wait(TIMEOUT)
+
+
+def test_many_calls_share_threads() -> None:
+    """Waiting calls don't start a thread each."""
+    before = threading.active_count()
+    done = threading.Event()
+
+    for _ in range(50):
+        call_later_shared(60, lambda: None)
+    call_later_shared(0, done.set)
+
+    assert done.wait(TIMEOUT)
+    assert len(shared_timer()) == 50
+    # the scheduler thread and one worker
+    assert threading.active_count() <= before + 2
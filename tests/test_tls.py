@@ -0,0 +1,99 @@
+"""Test resuming TLS sessions."""
+
+import socket
+import ssl
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from roombapy.remote_client import generate_tls_context
+from roombapy.tls import ResumingSSLContext, TimedSSLSocket
+
+CERTIFICATES = (
+    Path(__file__).parent.parent
+    / ".github"
+    / "workflows"
+    / "mosquitto"
+    / "tls-certificates"
+)
+ADDRESS = "127.0.0.1"
+
+
+@pytest.fixture(params=[ssl.TLSVersion.TLSv1_2, ssl.TLSVersion.TLSv1_3])
+def server(request: pytest.FixtureRequest) -> Iterator[int]:
+    """Run a TLS server greeting every client, return its port."""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(
+        CERTIFICATES / "test.crt", CERTIFICATES / "test.key"
+    )
+    context.maximum_version = request.param
+    listener = socket.create_server((ADDRESS, 0))
+
+    def serve() -> None:
+        while True:
+            try:
+                connection, _ = listener.accept()
+            except OSError:
+                return
+            try:
+                with context.wrap_socket(connection, server_side=True) as tls:
+                    tls.sendall(b"hello")
+                    tls.recv(1)
+            except OSError:
+                pass
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield listener.getsockname()[1]
+    # wakes up the accepting thread
+    listener.shutdown(socket.SHUT_RDWR)
+    listener.close()
+    thread.join()
+
+
+def _context() -> ResumingSSLContext:
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def _connect(context: ssl.SSLContext, port: int) -> TimedSSLSocket:
+    sock = context.wrap_socket(
+        socket.create_connection((ADDRESS, port)), server_hostname=ADDRESS
+    )
+    assert isinstance(sock, TimedSSLSocket)
+    with sock:
+        assert sock.recv(5) == b"hello"
+    return sock
+
+
+def test_resumes_session(server: int) -> None:
+    """The next connection to an address resumes the last session."""
+    context = _context()
+
+    first = _connect(context, server)
+    second = _connect(context, server)
+
+    assert not first.resumed
+    assert second.resumed
+    assert first.handshake_seconds is not None
+    assert second.handshake_seconds is not None
+    assert len(context.sessions) == 1
+
+
+def test_forgets_failed_session(server: int) -> None:
+    """A failed handshake drops the session of the address."""
+    context = _context()
+    _connect(context, server)
+    context.maximum_version = ssl.TLSVersion.TLSv1_1
+
+    with pytest.raises(ssl.SSLError):
+        _connect(context, server)
+    assert len(context.sessions) == 0
+
+
+def test_shared_context_resumes() -> None:
+    """The context of all robots resumes sessions."""
+    assert isinstance(generate_tls_context(), ResumingSSLContext)
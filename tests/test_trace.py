@@ -0,0 +1,69 @@
+"""Test the message tracer."""
+
+import io
+import logging
+
+import orjson
+import paho.mqtt.client as mqtt
+import pytest
+from roombapy import Roomba
+from roombapy.trace import MessageTracer
+
+from tests.conftest import as_message
+
+
+def test_keeps_last_messages() -> None:
+    """The oldest messages are dropped when the trace is full."""
+    tracer = MessageTracer(2)
+    for percent in range(3):
+        tracer.record("topic", b'{"batPct": %d}' % percent)
+
+    assert [message.payload for message in tracer.dump()] == [
+        b'{"batPct": 1}',
+        b'{"batPct": 2}',
+    ]
+    assert tracer.received == 3
+
+
+def test_samples_logged_payloads(caplog: pytest.LogCaptureFixture) -> None:
+    """Only every n-th payload is logged."""
+    tracer = MessageTracer(log_every=2)
+    with caplog.at_level(logging.DEBUG, logger="roombapy.trace"):
+        for percent in range(4):
+            tracer.record("topic", b"%d" % percent)
+
+    assert [record.args for record in caplog.records] == [
+        ("topic", b"1"),
+        ("topic", b"3"),
+    ]
+
+
+def test_write_json_lines() -> None:
+    """Traces are written as JSON lines, binary payloads base64 encoded."""
+    tracer = MessageTracer()
+    tracer.record("text", b"{}")
+    tracer.record("binary", b"\xff")
+    target = io.StringIO()
+
+    tracer.write(target)
+
+    first, second = map(orjson.loads, target.getvalue().splitlines())
+    assert (first["topic"], first["payload"]) == ("text", "{}")
+    assert (second["topic"], second["payload_base64"]) == ("binary", "/w==")
+
+
+def test_roomba_traces_only_when_enabled(
+    roomba: Roomba, empty_mqtt_client: mqtt.Client
+) -> None:
+    """Messages are traced between enabling and disabling the trace."""
+    roomba.on_message(empty_mqtt_client, None, as_message(b'{"batPct": 1}'))
+    tracer = roomba.enable_trace(10)
+    roomba.on_message(empty_mqtt_client, None, as_message(b'{"batPct": 2}'))
+    roomba.on_message(empty_mqtt_client, None, as_message(b"garbage"))
+    roomba.disable_trace()
+    roomba.on_message(empty_mqtt_client, None, as_message(b'{"batPct": 3}'))
+
+    assert [message.payload for message in tracer.dump()] == [
+        b'{"batPct": 2}',
+        b"garbage",
+    ]